@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the collect pipeline
+"""
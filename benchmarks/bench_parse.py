@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of parsing the example response
+(`tests/data/example_weather.json`) with the single-pass column extractor
+against the previous executor, which built several temporary lists per point.
+
+Run it with::
+
+    $ python benchmarks/bench_parse.py
+"""
+
+import json
+import math
+import os
+import timeit
+import tracemalloc
+
+from weather_collector.caller import WeatherObjects, execute_plan
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+MY_DIR = os.path.dirname(os.path.abspath(__file__))
+RESPONSE = os.path.join(MY_DIR, "..", "tests", "data", "example_weather.json")
+DATA = {
+    "current": "OpenWeather Weather Object",
+    "hourly": "OpenWeather Weather Object",
+    "daily": "OpenWeather Weather Object",
+}
+
+
+def previous_execute_plan(plan, data, key):
+    """Previous executor (kept for comparison)"""
+    data = data if isinstance(data, list) else [data]
+    fmt_data = {}
+    if len(data) == 0:
+        return fmt_data
+
+    if plan.points is None or not any(isinstance(d, dict) for d in data):
+        fmt_data[key] = data
+        return fmt_data
+
+    for pnt in plan.points:
+        dat = [d.get(pnt.key, float("nan")) for d in data]
+        if not pnt.optional and any([d == float("nan") for d in dat]):
+            raise ValueError(f"Type {plan.obj_type} is missing data")
+
+        if pnt.optional and all([math.isnan(d) for d in dat]):
+            continue
+
+        new_key = key + "." + pnt.name if key != "" else pnt.name
+        fmt_data.update(previous_execute_plan(pnt.plan(dat), dat, new_key))
+    return fmt_data
+
+
+def parse_previous(objs, response):
+    """Parse the response as before (copying each sub-tree first)"""
+    for attr, obj_type in DATA.items():
+        previous_execute_plan(
+            objs.plans[obj_type], response[attr].copy(), obj_type
+        )
+
+
+def parse(objs, response):
+    """Parse the response with the single-pass extractor"""
+    for attr, obj_type in DATA.items():
+        execute_plan(objs.plans[obj_type], response[attr], obj_type)
+
+
+def measure(function, objs, response, number=200):
+    """Measure the time and allocations of a parse function
+
+    Args:
+        function: Parse function
+        objs (:obj:`WeatherObjects`): Weather objects
+        response (dict): Response
+        number (int): Number of runs
+
+    Returns:
+        tuple: Microseconds per run and peak allocated KiB
+    """
+    seconds = min(timeit.repeat(
+        lambda: function(objs, response), number=number, repeat=5
+    ))
+    tracemalloc.start()
+    function(objs, response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / number * 1e6, peak / 1024
+
+
+def main():
+    """Run the benchmark"""
+    objs = WeatherObjects.get_obj()
+    with open(RESPONSE, "r") as json_file:
+        response = json.load(json_file)
+    print(f"{'':<12}{'us/run':>10}{'peak KiB':>10}")
+    for name, function in [("previous", parse_previous),
+                           ("single-pass", parse)]:
+        usec, peak = measure(function, objs, response)
+        print(f"{name:<12}{usec:>10.1f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures of the benchmarks. The benchmarks run offline against the recorded
+response `tests/data/example_weather.json`, scaled up synthetically.
+"""
+
+import copy
+import os
+
+import pytest
+
+from weather_collector.config import load_json
+from tests.helpers import get_example_response
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+MY_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(
+    MY_DIR, "..", "src", "weather_collector", "open_weather"
+)
+SCALES = [1, 100]
+
+
+def scale_response(response, scale):
+    """Scale a response up by repeating its forecasts
+
+    Args:
+        response (dict): Response
+        scale (int): Number of times the hourly and daily forecasts are
+            repeated (the times are shifted so that they stay unique)
+
+    Returns:
+        dict: Scaled response
+    """
+    response = copy.deepcopy(response)
+    for key in ["hourly", "daily"]:
+        forecasts = response[key]
+        span = forecasts[-1]["dt"] - forecasts[0]["dt"] + (
+            forecasts[1]["dt"] - forecasts[0]["dt"]
+        )
+        scaled = []
+        for i in range(scale):
+            for forecast in forecasts:
+                forecast = dict(forecast, dt=forecast["dt"] + i * span)
+                scaled.append(forecast)
+        response[key] = scaled
+    return response
+
+
+@pytest.fixture(scope="session")
+def units():
+    """Units of the example response"""
+    return load_json(os.path.join(CONFIG_DIR, "units.json"))
+
+
+@pytest.fixture(scope="session", params=SCALES, ids=lambda s: f"x{s}")
+def response(request):
+    """Example response scaled up"""
+    return scale_response(get_example_response(), request.param)
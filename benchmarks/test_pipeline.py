@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of each stage of the collect pipeline. Run them (and keep the
+results to compare commits) with::
+
+    $ pytest benchmarks --no-cov --benchmark-autosave \
+        --benchmark-storage=benchmarks/results --benchmark-compare
+"""
+
+import datetime as dt
+import os
+
+import pytest
+import pytz
+
+from weather_collector import caller
+from weather_collector.caller import (
+    Collector,
+    WeatherObjects,
+    format_data,
+)
+from weather_collector.writers import Table, close_all
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+OBJ_TYPE = "OpenWeather Weather Object"
+CALL_TIME = dt.datetime(2020, 11, 9, 21, 4, 29, tzinfo=pytz.utc)
+
+
+def get_table(objs, response, units):
+    """Parse and format the hourly forecast into a table
+
+    Args:
+        objs (:obj:`WeatherObjects`): Weather objects
+        response (dict): Response
+        units (dict): Units
+
+    Returns:
+        :obj:`Table`: Table
+    """
+    data = format_data(
+        objs.parse_object_type(response["hourly"], OBJ_TYPE), units,
+        objs=objs,
+    )
+    data["Collection Time"] = CALL_TIME
+    index = data.pop("Date/Time")
+    return Table(index, data)
+
+
+@pytest.fixture(name="objs", scope="session")
+def fixture_objs():
+    """Weather objects"""
+    return WeatherObjects.get_obj()
+
+
+@pytest.fixture(name="collector")
+def fixture_collector():
+    """Collector (closing the appended files afterwards)"""
+    yield Collector(config={"Name": "Benchmark", "URL": "http://localhost"})
+    close_all()
+
+
+def test_schema_load(benchmark):
+    """Load the weather types (i.e., a cold `WeatherTypes.json`)"""
+    path = os.path.join(os.path.dirname(caller.__file__), "WeatherTypes.json")
+    benchmark(WeatherObjects, path)
+
+
+def test_schema_get_obj(benchmark):
+    """Get the shared weather types (i.e., checking the file changed)"""
+    benchmark(WeatherObjects.get_obj)
+
+
+@pytest.mark.parametrize("key", ["hourly", "daily"])
+def test_parse(benchmark, objs, response, key):
+    """Parse a forecast"""
+    benchmark(objs.parse_object_type, response[key], OBJ_TYPE)
+
+
+def test_format(benchmark, objs, response, units):
+    """Format the parsed hourly forecast"""
+    data = objs.parse_object_type(response["hourly"], OBJ_TYPE)
+    benchmark(format_data, data, units, objs=objs)
+
+
+def test_table(benchmark, objs, response, units):
+    """Build the table of the hourly forecast"""
+    data = format_data(
+        objs.parse_object_type(response["hourly"], OBJ_TYPE), units,
+        objs=objs,
+    )
+
+    def build():
+        cur_data = dict(data)
+        index = cur_data.pop("Date/Time")
+        return Table(index, cur_data)
+
+    benchmark(build)
+
+
+def test_dataframe(benchmark, objs, response, units):
+    """Build a DataFrame of the hourly forecast (e.g., Parquet)"""
+    table = get_table(objs, response, units)
+    benchmark(table.to_frame)
+
+
+def test_save_overwrite(benchmark, objs, response, units, collector,
+                        tmp_path):
+    """Save the hourly forecast to a new file"""
+    table = get_table(objs, response, units)
+    path = str(tmp_path / "Hourly.csv")
+    benchmark(collector.save_data, table, path, False)
+
+
+def test_save_append(benchmark, objs, response, units, collector, tmp_path):
+    """Append the hourly forecast to a file"""
+    table = get_table(objs, response, units)
+    path = str(tmp_path / "Hourly.csv")
+    benchmark(collector.save_data, table, path, True)
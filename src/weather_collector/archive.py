@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Archive of the raw API responses. Responses are recorded to one compressed
+JSON lines file per (UTC) day so that collections can be replayed offline,
+e.g., to reprocess the history after `WeatherTypes.json` changes.
+"""
+
+import datetime as dt
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+
+import pytz
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".jsonl.gz"
+_RESPONSE_KEY = ',"Response":'
+
+_archive_lock = threading.Lock()
+
+
+def get_archive_path(directory, call_time):
+    """Get the archive file of a call time
+
+    Args:
+        directory (str): Archive directory
+        call_time (:obj:`datetime.datetime`): Call time
+
+    Returns:
+        str: Path to the archive file of the day of the call
+    """
+    day = call_time.astimezone(pytz.utc).strftime("%Y-%m-%d")
+    return os.path.join(directory, day + ARCHIVE_SUFFIX)
+
+
+def record(directory, name, output):
+    """Record a response to the archive
+
+    Args:
+        directory (str): Archive directory
+        name (str): Name of the source (i.e., `Name` of the configuration)
+        output (dict): Output of :meth:`Caller.call_api`
+    """
+    line = json.dumps({
+        "Name": name,
+        "CallTime": output["CallTime"].isoformat(),
+        "Cached": output.get("Cached", False),
+        "Response": output["Response"],
+    }, separators=(",", ":"))
+    path = get_archive_path(directory, output["CallTime"])
+    with _archive_lock:
+        os.makedirs(directory, exist_ok=True)
+        # Every record is a gzip member; a crash only loses the last record
+        with gzip.open(path, "at") as archive_file:
+            archive_file.write(line + "\n")
+
+
+def read_lines(path):
+    """Read the (encoded) records of an archive file
+
+    Args:
+        path (str): Path to the archive file
+
+    Returns:
+        list: Records (i.e., JSON lines); a truncated last record is dropped
+    """
+    lines = []
+    with gzip.open(path, "rt") as archive_file:
+        try:
+            for line in archive_file:
+                lines.append(line)
+        except (EOFError, OSError, zlib.error) as ex:
+            _logger.warning("Truncated archive %s: %s", path, ex)
+    return lines
+
+
+def decode_record(line):
+    """Decode a record
+
+    Args:
+        line (str): Record (i.e., JSON line)
+
+    Returns:
+        tuple: Name of the source and output of :meth:`Caller.call_api`
+        (i.e., keys `CallTime`, `Response` and `Cached`)
+    """
+    entry = json.loads(line)
+    call_time = dt.datetime.fromisoformat(entry["CallTime"])
+    return entry["Name"], {
+        "CallTime": call_time.astimezone(pytz.utc),
+        "Response": entry["Response"],
+        "Cached": entry["Cached"],
+    }
+
+
+def decode_header(line):
+    """Decode the header of a record (i.e., everything but the response),
+    without decoding the response
+
+    Args:
+        line (str): Record (i.e., JSON line)
+
+    Returns:
+        tuple: Name of the source and output of :meth:`Caller.call_api`
+        without the response (i.e., keys `CallTime` and `Cached`)
+    """
+    # Records are written with the response last (see :func:`record`); a
+    # quote in a string is escaped, so the key cannot be part of the header
+    end = line.find(_RESPONSE_KEY)
+    if end < 0:
+        name, output = decode_record(line)
+        del output["Response"]
+        return name, output
+    entry = json.loads(line[:end] + "}")
+    call_time = dt.datetime.fromisoformat(entry["CallTime"])
+    return entry["Name"], {
+        "CallTime": call_time.astimezone(pytz.utc),
+        "Cached": entry["Cached"],
+    }
+
+
+def get_archive_files(directory):
+    """Get the archive files of a directory in chronological order
+
+    Args:
+        directory (str): Archive directory
+
+    Returns:
+        list: Paths to the archive files
+    """
+    return sorted(glob.glob(os.path.join(directory, "*" + ARCHIVE_SUFFIX)))
+
+
+def iter_records(directory, name=None, headers=False):
+    """Iterate over the records of an archive in the order they were recorded
+
+    Args:
+        directory (str): Archive directory
+        name (str): If set, only iterate over the records of this source
+        headers (bool): If true, only the headers of the records are decoded
+            (see :func:`decode_header`)
+
+    Yields:
+        tuple: Path to the archive file, number of the record in the file and
+        output of :meth:`Caller.call_api`
+    """
+    decode = decode_header if headers else decode_record
+    for path in get_archive_files(directory):
+        for number, line in enumerate(read_lines(path)):
+            try:
+                cur_name, output = decode(line)
+            except ValueError as ex:
+                _logger.warning("Invalid record %d of %s: %s", number, path,
+                                ex)
+                continue
+            if name is None or cur_name == name:
+                yield path, number, output
+
+
+def read_archive(directory, name=None):
+    """Read the responses recorded to an archive in the order they were
+    recorded
+
+    Args:
+        directory (str): Archive directory
+        name (str): If set, only read the responses of this source
+
+    Yields:
+        dict: Output of :meth:`Caller.call_api` (i.e., keys `CallTime`,
+        `Response` and `Cached`)
+    """
+    for _, _, output in iter_records(directory, name):
+        yield output
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of API responses. Responses are revalidated with conditional requests
+(`ETag` / `Last-Modified`) and are not requested again while they are fresh
+according to `Cache-Control: max-age` or `Expires`.
+"""
+
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+
+def get_expiry(headers, cur_time=None):
+    """Get the time a response expires from its headers
+
+    Args:
+        headers (dict): Response headers
+        cur_time (float): Time of the response (defaults to now)
+
+    Returns:
+        float: Time the response expires; None if it must not be cached
+    """
+    cur_time = time.time() if cur_time is None else cur_time
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return cur_time
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return cur_time + int(match.group(1))
+    if "Expires" in headers:
+        try:
+            return email.utils.parsedate_to_datetime(
+                headers["Expires"]
+            ).timestamp()
+        except (TypeError, ValueError):
+            return cur_time
+    return cur_time
+
+
+class CacheEntry:
+    """Cached response
+
+    Args:
+        response: Decoded response
+        etag (str): `ETag` header
+        last_modified (str): `Last-Modified` header
+        expires (float): Time the response expires
+
+    Attributes:
+        response: Decoded response
+        etag (str): `ETag` header
+        last_modified (str): `Last-Modified` header
+        expires (float): Time the response expires
+    """
+
+    __slots__ = ("response", "etag", "last_modified", "expires")
+
+    def __init__(self, response, etag=None, last_modified=None, expires=0):
+        self.response = response
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def is_fresh(self, cur_time=None):
+        """Check if the response may be used without revalidating it
+
+        Args:
+            cur_time (float): Time (defaults to now)
+
+        Returns:
+            bool: True if fresh
+        """
+        cur_time = time.time() if cur_time is None else cur_time
+        return cur_time < self.expires
+
+    def conditional_headers(self):
+        """Get the headers of a conditional request for the response
+
+        Returns:
+            dict: Request headers
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """In-memory cache of responses keyed by URL, optionally persisted to a
+    directory (one JSON file per URL).
+
+    Args:
+        directory (str): Directory of the persisted responses; None to only
+            keep them in memory
+
+    Attributes:
+        directory (str): Directory of the persisted responses
+    """
+
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        # The URL is hashed to keep API keys out of the file names
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, url):
+        """Get the cached response of a URL
+
+        Args:
+            url (str): URL
+
+        Returns:
+            :obj:`CacheEntry`: Cached response; None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is not None or self.directory is None:
+            return entry
+
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as json_file:
+                data = json.load(json_file)
+        except (OSError, ValueError) as ex:
+            _logger.warning("Failed to read cached response %s: %s", path, ex)
+            return None
+        entry = CacheEntry(
+            data["Response"], data["ETag"], data["Last-Modified"],
+            data["Expires"],
+        )
+        with self._lock:
+            self._entries[url] = entry
+        return entry
+
+    def store(self, url, response, headers):
+        """Store the response of a URL
+
+        Args:
+            url (str): URL
+            response: Decoded response
+            headers (dict): Response headers
+
+        Returns:
+            :obj:`CacheEntry`: Cached response; None if it must not be cached
+        """
+        expires = get_expiry(headers)
+        if expires is None:
+            self.remove(url)
+            return None
+        entry = CacheEntry(
+            response,
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+            expires,
+        )
+        with self._lock:
+            self._entries[url] = entry
+        self._persist(url, entry)
+        return entry
+
+    def refresh(self, url, entry, headers):
+        """Refresh a cached response that was not modified (i.e., 304)
+
+        Args:
+            url (str): URL
+            entry (:obj:`CacheEntry`): Cached response
+            headers (dict): Headers of the 304 response
+        """
+        expires = get_expiry(headers)
+        entry.expires = entry.expires if expires is None else expires
+        entry.etag = headers.get("ETag", entry.etag)
+        entry.last_modified = headers.get(
+            "Last-Modified", entry.last_modified
+        )
+        self._persist(url, entry)
+
+    def remove(self, url):
+        """Remove the cached response of a URL
+
+        Args:
+            url (str): URL
+        """
+        with self._lock:
+            self._entries.pop(url, None)
+        if self.directory is not None and os.path.exists(self._path(url)):
+            os.remove(self._path(url))
+
+    def _persist(self, url, entry):
+        if self.directory is None:
+            return
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump({
+                "Response": entry.response,
+                "ETag": entry.etag,
+                "Last-Modified": entry.last_modified,
+                "Expires": entry.expires,
+            }, json_file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def get_cache(cls, directory=None):
+        """Get the response cache of a directory shared by the process
+
+        Args:
+            directory (str): Directory of the persisted responses; None to
+                only keep them in memory
+
+        Returns:
+            :obj:`ResponseCache`: Response cache
+        """
+        with cls._caches_lock:
+            if directory not in cls._caches:
+                cls._caches[directory] = cls(directory)
+            return cls._caches[directory]
@@ -5,15 +5,51 @@ the results
 """
 
 import datetime as dt
-import glob
 import json
 import logging
-import math
 import os
+import threading
+import time
 import pytz
-import pandas as pd
 import requests
 
+from weather_collector.archive import read_archive, record
+from weather_collector.cache import ResponseCache
+from weather_collector.coalesce import SingleFlight
+from weather_collector.config import ConfigStore, load_json
+from weather_collector.metrics import (
+    CALL_SECONDS,
+    CALL_STATUS,
+    PARSE_SECONDS,
+    RECEIVED_BYTES,
+    ROWS_SKIPPED,
+    ROWS_WRITTEN,
+    WRITE_SECONDS,
+)
+from weather_collector.ratelimit import TokenBucket
+from weather_collector.retry import (
+    CircuitBreaker,
+    RETRY_STATUS_CODES,
+    RetryPolicy,
+    parse_retry_after,
+)
+from weather_collector.sessions import (
+    DEFAULT_POOL_SIZE,
+    get_host,
+    get_session,
+    get_timeout,
+)
+from weather_collector.streaming import decode_response, get_paths
+# Registers the `store` format
+import weather_collector.store  # noqa: F401 pylint: disable=unused-import
+from weather_collector.writers import (
+    BACKENDS,
+    BufferPolicy,
+    DEFAULT_POLICY,
+    get_backend,
+    Table,
+)
+
 
 __author__ = "Matt Ellis"
 __copyright__ = "Matt Ellis"
@@ -21,6 +57,8 @@ __license__ = "mit"
 
 _logger = logging.getLogger(__name__)
 
+_single_flight = SingleFlight()
+
 
 # pylint: disable=fixme
 def _set_attr_if_exist(obj, kwargs):
@@ -49,38 +87,148 @@ def create_file_name(fmt_code, date):
     return "".join(parts)
 
 
-def format_data(data, units):
-    """Format data
+def to_datetimes(values, tz=None):
+    """Convert epoch times to date/times. Integer epochs are converted as a
+    whole array.
 
     Args:
-        data (dict): key-value layout of data. Value is list
-        units (units):
+        values (list): Epoch times
+        tz (:obj:`datetime.tzinfo`): Time zone; if None, the date/times are
+            naive UTC date/times
 
+    Returns:
+        list: Date/times
     """
-    # TODO: this could be included in a data processor
+    if tz is not None:
+        return [dt.datetime.fromtimestamp(d, tz) for d in values]
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    epochs = np.asarray(values)
+    if epochs.dtype.kind != "i":
+        return [dt.datetime.utcfromtimestamp(d) for d in values]
+    return epochs.astype("datetime64[s]").tolist()
 
-    types = WeatherObjects.get_obj()
-    r_data = {}
-    for key, val in data.items():
-        obj_type = key.split(".")[-1]
 
-        pnt_t = types.types[obj_type]["Type"]
-        if pnt_t not in units:
+class DataFormatter:
+    """Formats parsed data for output. The output column and the conversion
+    of each key are computed once and re-used for every call.
+
+    Args:
+        objs (:obj:`WeatherObjects`): Weather objects
+        units (dict): Unit of each object type (i.e., `units.json`)
+
+    Attributes:
+        objs (:obj:`WeatherObjects`): Weather objects
+        units (dict): Unit of each object type
+    """
+
+    def __init__(self, objs, units):
+        self.objs = objs
+        self.units = units
+        self._columns = {}
+
+    def column(self, key):
+        """Get the output column of a key
+
+        Args:
+            key (str): Key of the parsed data
+
+        Returns:
+            tuple: Output column name, True if the values are epoch times, and
+            the time zone of the date/times
+        """
+        if key in self._columns:
+            return self._columns[key]
+
+        in_key = key
+        obj_type = key.split(".")[-1]
+        pnt_t = self.objs.types[obj_type]["Type"]
+        if pnt_t not in self.units:
             msg = f"Object type {pnt_t} is not found"
             _logger.error(msg)
             raise KeyError(msg)
 
-        unit = units[pnt_t]
+        unit = self.units[pnt_t]
+        is_epoch, tz = False, None
         # TODO: Make this a bit more generic..
         if pnt_t.lower() == "datetime":
+            # UTC: naive UTC date/times; time zone name: aware date/times
             if unit.lower() == "utc":
-                val = [dt.datetime.utcfromtimestamp(d) for d in val]
+                is_epoch = True
+            elif unit in pytz.all_timezones_set:
+                is_epoch, tz = True, pytz.timezone(unit)
         elif unit != "":
             key += "#" + unit
         if obj_type == "Date/Time":
             key = "Date/Time"
-        r_data[key] = val
-    return r_data
+        column = (key, is_epoch, tz)
+        self._columns[in_key] = column
+        return column
+
+    def format(self, data):
+        """Format data
+
+        Args:
+            data (dict): key-value layout of data. Value is list
+
+        Returns:
+            dict: Output columns
+        """
+        r_data = {}
+        for key, val in data.items():
+            column, is_epoch, tz = self.column(key)
+            r_data[column] = to_datetimes(val, tz) if is_epoch else val
+        return r_data
+
+
+def format_data(data, units, objs=None):
+    """Format data
+
+    Args:
+        data (dict): key-value layout of data. Value is list
+        units (units): Unit of each object type
+        objs (:obj:`WeatherObjects`): Weather objects (defaults to
+            :meth:`WeatherObjects.get_obj`)
+
+    Returns:
+        dict: Output columns
+    """
+    # TODO: this could be included in a data processor
+    if objs is None:
+        objs = WeatherObjects.get_obj()
+    return objs.formatter(units).format(data)
+
+
+def get_data_path(data_config, call_time, data_dir):
+    """Get the file the data of a data file is saved to
+
+    Args:
+        data_config (dict): Data file (i.e., data specification)
+        call_time (:obj:`datetime.datetime`): Time the API was called
+        data_dir (str): Data directory
+
+    Returns:
+        str: Path of the file
+    """
+    return os.path.join(
+        data_dir, create_file_name(data_config["Filename"], call_time)
+    )
+
+
+def get_wire_size(output):
+    """Get the size of the body of a response on the wire
+
+    Args:
+        output (:obj:`requests.Response`): Output of a call
+
+    Returns:
+        int: `Content-Length` of the response if set (i.e., the size of the
+        possibly compressed body), otherwise the size of the decoded body
+    """
+    length = output.headers.get("Content-Length")
+    if isinstance(length, str) and length.isdigit():
+        return int(length)
+    return len(output.content) if isinstance(output.content, bytes) else 0
 
 
 class Caller:
@@ -93,10 +241,20 @@ class Caller:
     Attributes:
         config (Union[str, dict]): either the config file path or the
             configuration data structure
+        reserved (bool): True if a token of the rate limiter was already
+            acquired for the first call (see :class:`TokenBucket`); it is
+            refunded if the call does not request the API (e.g., it is
+            served from the cache or shares another call)
+        paths (frozenset): Paths of the response used by the data files; if
+            set and the API configuration has `Stream`, only these paths are
+            decoded (see :func:`get_paths`)
     """
 
     def __init__(self, **kwargs):
         self.config = None
+        self.reserved = False
+        self.paths = None
+        self._requested = False
         _set_attr_if_exist(self, kwargs)
         if self.config is None:
             _logger.error("Must set the caller configuration")
@@ -106,11 +264,11 @@ class Caller:
 
         Returns:
             dict: If successful, this will be populated with the data from the
-            API; contains key: "CallTime" and "Response"
+            API; contains key: "CallTime", "Response" and "Cached" (True if
+            the response is a cached response that has not changed)
         """
         if isinstance(self.config, str):
-            with open(self.config, "r") as config_file:
-                config_data = json.load(config_file)
+            config_data = load_json(self.config)
         else:
             config_data = self.config
         if "URL" not in config_data or config_data["URL"] == "":
@@ -118,41 +276,166 @@ class Caller:
             _logger.error(msg)
             raise KeyError(msg)
 
-        now = dt.datetime.now().astimezone(pytz.utc)
-        output = None
+        # Collections of the same URL share the call and the response
+        self._requested = False
         try:
-            output = requests.get(config_data["URL"])
-        except Exception as unknown_ex:
-            _logger.warning(unknown_ex)
+            output = _single_flight.do(
+                self._key(config_data),
+                lambda: self._request(config_data),
+                window=config_data.get("Coalesce Window", 0),
+            )
+        finally:
+            bucket = TokenBucket.get_bucket(config_data)
+            if self.reserved and not self._requested and bucket is not None:
+                bucket.refund()
+        if output is None:
+            return None
+        if config_data.get("Archive Directory"):
+            record(config_data["Archive Directory"],
+                   config_data.get("Name", ""), output)
+        return dict(output)
+
+    def _streaming(self, config_data):
+        return config_data.get("Stream", False) and self.paths is not None
+
+    def _key(self, config_data):
+        """Get the key of the response shared by calls and cached
 
-        # pylint: disable=protected-access
+        Args:
+            config_data (dict): API configuration
+
+        Returns:
+            str: URL, followed by the decoded paths if streaming
+        """
+        if not self._streaming(config_data):
+            return config_data["URL"]
+        return config_data["URL"] + "#" + ",".join(sorted(self.paths))
+
+    def _request(self, config_data):
+        """Request the API (or use its cached response)
+
+        Args:
+            config_data (dict): API configuration
+
+        Returns:
+            dict: Output of :meth:`call_api`
+        """
         url = config_data["URL"]
-        if hasattr(output, 'status_code') and output.status_code == 200:
-            name = (
-                "" if "Name" not in config_data else config_data["Name"] + " "
+        key = self._key(config_data)
+        streaming = self._streaming(config_data)
+        name = "" if "Name" not in config_data else config_data["Name"] + " "
+        now = dt.datetime.now().astimezone(pytz.utc)
+        cache, entry = None, None
+        if config_data.get("Cache", False):
+            cache = ResponseCache.get_cache(config_data.get("Cache Directory"))
+            entry = cache.get(key)
+            if entry is not None and entry.is_fresh():
+                _logger.info("Using cached response of %sAPI: %s", name, url)
+                return {"CallTime": now, "Response": entry.response,
+                        "Cached": True}
+
+        session = get_session(
+            url, pool_size=config_data.get("Pool Size", DEFAULT_POOL_SIZE)
+        )
+        breaker = CircuitBreaker.get_breaker(get_host(url), config_data)
+        policy = RetryPolicy.from_config(config_data)
+        bucket = TokenBucket.get_bucket(config_data)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                _logger.warning("Circuit of %s is open; not calling %sAPI",
+                                get_host(url), name)
+                return None
+            if bucket is not None and (attempt > 0 or not self.reserved):
+                bucket.acquire()
+            self._requested = True
+
+            output = None
+            kwargs = {
+                "timeout": get_timeout(config_data),
+                "headers": {} if entry is None
+                else entry.conditional_headers(),
+            }
+            if streaming:
+                kwargs["stream"] = True
+            source = config_data.get("Name", "")
+            try:
+                with CALL_SECONDS.time(source=source):
+                    output = session.get(url, **kwargs)
+            except Exception as unknown_ex:
+                _logger.warning(unknown_ex)
+
+            status_code = getattr(output, "status_code", None)
+            CALL_STATUS.inc(
+                source=source,
+                status="error" if status_code is None else str(status_code),
             )
-            msg = f"Successfully called {name}API: {url}"
-            _logger.info(msg)
-            output = {"CallTime": now, "Response": output.json()}
-        else:
-            # TODO: Need to deal with failures
-            msg = "Failed to call API{url}\n"
-            if hasattr(output, "status_code"):
-                msg += (
-                    f"{output.status_code}: "
-                    + requests.status_codes._codes[output.status_code][0]
-                )
+            if status_code is None or status_code in RETRY_STATUS_CODES:
+                breaker.record_failure()
             else:
-                msg += "No output returned"
+                breaker.record_success()
+
+            if entry is not None and status_code == 304:
+                _logger.info("Response of %sAPI has not changed: %s", name,
+                             url)
+                cache.refresh(key, entry, output.headers)
+                return {"CallTime": now, "Response": entry.response,
+                        "Cached": True}
+            if status_code == 200:
+                msg = f"Successfully called {name}API: {url}"
+                _logger.info(msg)
+                if streaming:
+                    response = decode_response(output, self.paths)
+                    size = getattr(output.raw, "tell", lambda: 0)()
+                else:
+                    response = output.json()
+                    size = get_wire_size(output)
+                RECEIVED_BYTES.inc(size, source=source)
+                if cache is not None:
+                    cache.store(key, response, output.headers)
+                return {"CallTime": now, "Response": response,
+                        "Cached": False}
+
+            if streaming and output is not None:
+                output.close()
+            delay = self.failure_handler(output, attempt, policy)
+            if delay is None:
+                return None
+            _logger.info("Retrying %sAPI in %.1f seconds", name, delay)
+            time.sleep(delay)
+            attempt += 1
 
-            _logger.warning(msg)
-            output = None
-        return output
+    @staticmethod
+    def failure_handler(output, attempt, policy):
+        """Handle a failed call.
+
+        Args:
+            output (:obj:`requests.Response`): Output of the call; None if no
+                output was returned
+            attempt (int): Number of the failed attempt (starting at 0)
+            policy (:obj:`RetryPolicy`): Retry policy
+
+        Returns:
+            float: Seconds to wait before retrying; None to give up
+        """
+        # pylint: disable=protected-access
+        msg = "Failed to call API\n"
+        status_code = getattr(output, "status_code", None)
+        if status_code is not None:
+            msg += (
+                f"{status_code}: "
+                + requests.status_codes._codes.get(status_code, ("",))[0]
+            )
+        else:
+            msg += "No output returned"
+        _logger.warning(msg)
 
-    def failure_handler(self):
-        """Handle failures."""
-        # TODO: Implement failure handler?
-        raise NotImplementedError("This method is not implemented")
+        if status_code is not None and status_code not in RETRY_STATUS_CODES:
+            return None
+        retry_after = None
+        if status_code is not None:
+            retry_after = parse_retry_after(output.headers.get("Retry-After"))
+        return policy.delay(attempt, retry_after)
 
 
 class Collector:
@@ -172,13 +455,12 @@ class Collector:
             raise ValueError(msg)
 
     def load_config(self):
-        """Load configuration. Re-loading the config allows for hot-swamping
-        it at runtime.
+        """Load configuration. The configuration file is only re-read if it
+        changed, which allows for hot-swapping it at runtime.
         """
-        if isinstance(self.config, dict):
+        if not isinstance(self.config, str):
             return self.config
-        with open(self.config, "r") as config_file:
-            return json.load(config_file)
+        return load_json(self.config)
 
     def get_json_files_in_dir(self, config_dir):
         """Get all the JSON files in directory.
@@ -198,11 +480,19 @@ class Collector:
             config_dir,
             self.load_config()["Name"],
         )
-        return [
-            file
-            for file in glob.glob(config_dir + "/*.json")
-            if os.path.basename(file) not in ["units.json", "config.json"]
-        ]
+        return list(ConfigStore.get_store(config_dir).snapshot().data_specs)
+
+    def get_paths(self, config_dir):
+        """Get the paths of the response used by the data files
+
+        Args:
+            config_dir (str): Path to configuration directory
+
+        Returns:
+            frozenset: Paths (see :func:`get_paths`)
+        """
+        snapshot = ConfigStore.get_store(config_dir).snapshot()
+        return get_paths(snapshot.data_specs)
 
     def collect(self, config_dir, data_dir):
         """Collects data and parse
@@ -211,30 +501,98 @@ class Collector:
             config_dir (str): Configuration directory
             data_dir (str): Data directory
         """
-        objs = WeatherObjects.get_obj()
-
         # Call the API
-        response = Caller(config=self.config).call_api()
+        response = Caller(
+            config=self.config, paths=self.get_paths(config_dir)
+        ).call_api()
         if response is None:
             return
 
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
+        self.process(response, config_dir, data_dir)
+
+    def replay(self, config_dir, data_dir, directory=None):
+        """Replay the collections of the responses recorded to an archive
+        (see `Archive Directory`), without calling the API. The data
+        directory must be new or empty, since appended rows would be added to
+        files that already have them (the files of an existing data directory
+        are rebuilt by :func:`weather_collector.reprocess.reprocess`).
+
+        Args:
+            config_dir (str): Configuration directory
+            data_dir (str): Data directory (new or empty)
+            directory (str): Archive directory (defaults to the
+                `Archive Directory` of the configuration)
+
+        Returns:
+            int: Number of replayed responses
+        """
+        config = self.load_config()
+        directory = config.get("Archive Directory") if directory is None \
+            else directory
+        if directory is None:
+            msg = f"Must set the Archive Directory of {config['Name']}"
+            _logger.error(msg)
+            raise ValueError(msg)
+        if os.path.isdir(data_dir) and os.listdir(data_dir):
+            msg = (f"Data directory {data_dir} is not empty; replay into a "
+                   "new directory or rebuild its files with "
+                   "weather-collector-reprocess --overwrite")
+            _logger.error(msg)
+            raise FileExistsError(msg)
+
+        count = 0
+        for response in read_archive(directory, config.get("Name", "")):
+            self.process(response, config_dir, data_dir)
+            count += 1
+        _logger.info("Replayed %d responses of %s", count, config["Name"])
+        return count
+
+    def process(self, response, config_dir, data_dir):
+        """Parse and save a response of the API
+
+        Args:
+            response (dict): Response returned by :meth:`Caller.call_api`
+            config_dir (str): Configuration directory
+            data_dir (str): Data directory
+        """
+        objs = WeatherObjects.get_obj()
+
+        os.makedirs(data_dir, exist_ok=True)
 
-        with open(os.path.join(config_dir, "units.json"), "r") as file:
-            units = json.load(file)
+        snapshot = ConfigStore.get_store(config_dir).snapshot()
+        if snapshot.units is None:
+            msg = f"Must have a units.json in {config_dir}"
+            _logger.error(msg)
+            raise FileNotFoundError(msg)
+        units = snapshot.units
 
         # TODO: makes call, formats data, and saves data (too much)
         # Currently combining since JSON is
-        for data_config in self.get_json_files_in_dir(config_dir):
-            with open(data_config, "r") as json_file:
-                data_config = json.load(json_file)
+        for path, data_config in snapshot.data_specs.items():
+            if response.get("Cached", False) and \
+                    data_config.get("Unchanged", "write") == "skip":
+                _logger.debug("Response has not changed; skipping %s", path)
+                continue
+            self.process_spec(response, data_config, units, data_dir,
+                              objs=objs)
+
+    def process_spec(self, response, data_config, units, data_dir,
+                     objs=None):
+        """Parse and save the data of a data file from a response
 
-            if "Append" not in data_config:
-                data_config["Append"] = False
+        Args:
+            response (dict): Response returned by :meth:`Caller.call_api`
+            data_config (dict): Data file (i.e., data specification)
+            units (dict): Units (i.e., `units.json`)
+            data_dir (str): Data directory
+            objs (:obj:`WeatherObjects`): Weather objects (defaults to the
+                shared weather objects)
+        """
+        objs = WeatherObjects.get_obj() if objs is None else objs
 
-            # Get the data
-            cur_data = {}
+        # Get the data
+        cur_data = {}
+        with PARSE_SECONDS.time(source=self.load_config().get("Name", "")):
             for attr in data_config["Data"].keys():
                 if attr == "!now":
                     cur_data["Collection Time"] = response["CallTime"]
@@ -245,49 +603,226 @@ class Collector:
                     cur_response = cur_response[key]
 
                 cur_response = objs.parse_object_type(
-                    cur_response.copy(), data_config["Data"][attr]
+                    cur_response, data_config["Data"][attr]
                 )
-                cur_data.update(format_data(cur_response, units))
-
-            index = cur_data["Date/Time"]
-            del cur_data["Date/Time"]
-            file_name = os.path.join(
-                data_dir,
-                create_file_name(
-                    data_config["Filename"], response["CallTime"]
-                ),
-            )
-            self.save_data(
-                pd.DataFrame(index=index, data=cur_data),
-                file_name,
-                data_config["Append"],
-            )
+                cur_data.update(format_data(cur_response, units, objs=objs))
+
+        index = cur_data["Date/Time"]
+        del cur_data["Date/Time"]
+        self.save_data(
+            Table(index, cur_data),
+            get_data_path(data_config, response["CallTime"], data_dir),
+            data_config.get("Append", False),
+            policy=BufferPolicy.from_spec(data_config),
+            backend=get_backend(data_config),
+            issued=response["CallTime"],
+        )
 
-    def save_data(self, data, path, append):
+    def save_data(self, data, path, append, policy=DEFAULT_POLICY,
+                  backend=None, issued=None):
         """Save data
 
         Args:
-            data (:obj:`pd.DataFrame`): Data
+            data (Union[:obj:`Table`, :obj:`pd.DataFrame`]): Data
             path (str): Path of file to save
             append (bool): Append to existing file if exists
+            policy (:obj:`BufferPolicy`): Buffering policy of appended rows
+            backend: Storage backend (defaults to CSV)
+            issued (:obj:`datetime.datetime`): Time the API was called
         """
+        if not isinstance(data, Table):
+            data = Table.from_frame(data)
         _logger.debug("Saving data to %s", path)
         api_name = self.load_config()["Name"]
-        success_msg = f"Successfully saved data from {api_name}"
-        if os.path.exists(path) and append:
-            # Open file and append results
-            with open(path, "a") as file:
-                data.to_csv(file, header=False)
-            _logger.info(success_msg)
-            return
+        backend = BACKENDS["csv"] if backend is None else backend
+        with WRITE_SECONDS.time(source=api_name):
+            written = backend.save(data, path, append, policy=policy,
+                                   issued=issued)
+        written = len(data) if written is None else written
+        ROWS_WRITTEN.inc(written, source=api_name)
+        if written < len(data):
+            ROWS_SKIPPED.inc(len(data) - written, source=api_name)
+        _logger.info("Successfully saved data from %s", api_name)
+
+
+class ParsePlan:
+    """Compiled parse plan of a weather object type. A plan is compiled once
+    from the definition in `WeatherTypes.json` so that parsing a response does
+    not re-walk the schema.
+
+    Args:
+        obj_type (str): Name of the object type
+        points (:obj:`tuple` of :obj:`PointExtractor`): Extractors of the
+            points that make up the object; None if the object is not a
+            collection of points
 
-        if os.path.exists(path):
-            # Remove file
-            _logger.warning("File %s exists!; overwriting it", path)
-            os.remove(path)
+    Attributes:
+        obj_type (str): Name of the object type
+        points (:obj:`tuple` of :obj:`PointExtractor`): Point extractors
+    """
 
-        data.to_csv(path)
-        _logger.info(success_msg)
+    __slots__ = ("obj_type", "points")
+
+    def __init__(self, obj_type, points=None):
+        self.obj_type = obj_type
+        self.points = points
+
+
+class PointExtractor:
+    """Extractor of a single point of a collection.
+
+    Args:
+        name (str): Name of the point (i.e., the target column name)
+        key (str): Key of the point in the response
+        optional (bool): If true, the point may be missing in the response
+        obj_type (str): Alternative object type of the point (None if not
+            defined)
+
+    Attributes:
+        name (str): Name of the point
+        key (str): Key of the point in the response
+        optional (bool): If true, the point may be missing in the response
+        obj_type (str): Alternative object type of the point
+        leaf_plan (:obj:`ParsePlan`): Plan used if the data is not a group
+        sub_plan (:obj:`ParsePlan`): Plan used if the data is a group
+    """
+
+    __slots__ = ("name", "key", "optional", "obj_type", "leaf_plan",
+                 "sub_plan")
+
+    def __init__(self, name, key, optional=False, obj_type=None):
+        self.name = name
+        self.key = key
+        self.optional = optional
+        self.obj_type = obj_type
+        self.leaf_plan = None
+        self.sub_plan = None
+
+    def plan(self, data):
+        """Get the plan used to parse the extracted data
+
+        Args:
+            data (list): Extracted data
+
+        Returns:
+            :obj:`ParsePlan`: parse plan
+        """
+        if self.obj_type is None or (
+            len(data) > 0 and not isinstance(data[0], dict)
+        ):
+            plan, obj_type = self.leaf_plan, self.name
+        else:
+            plan, obj_type = self.sub_plan, self.obj_type
+        if plan is None:
+            msg = f"The key {obj_type} is not defined in the Weather types"
+            _logger.error(msg)
+            raise KeyError(msg)
+        return plan
+
+
+def compile_types(types):
+    """Compile weather object types into parse plans
+
+    Args:
+        types (dict): All defined objects (i.e., `WeatherTypes.json`)
+
+    Returns:
+        dict: Parse plan (:obj:`ParsePlan`) of each object type
+    """
+    plans = {}
+    for obj_type, cur_type in types.items():
+        points = None
+        if "Points" in cur_type:
+            points = []
+            for obj_t, pnt in cur_type["Points"].items():
+                # Could be a string or a dict with Key, Optional and/or Type
+                if isinstance(pnt, str):
+                    pnt = {"Key": pnt}
+                points.append(
+                    PointExtractor(
+                        obj_t,
+                        pnt["Key"],
+                        optional=pnt.get("Optional", False),
+                        obj_type=pnt.get("Type"),
+                    )
+                )
+            points = tuple(points)
+        plans[obj_type] = ParsePlan(obj_type, points)
+
+    # Resolve the plans of the points once all plans exist
+    for plan in plans.values():
+        for pnt in plan.points or ():
+            pnt.leaf_plan = plans.get(pnt.name)
+            if pnt.obj_type is not None:
+                pnt.sub_plan = plans.get(pnt.obj_type)
+    return plans
+
+
+_MISSING = object()
+
+
+def extract_column(pnt, data):
+    """Extract the column of a point from a collection in a single pass
+
+    Args:
+        pnt (:obj:`PointExtractor`): Point extractor
+        data (:obj:`list` of :obj:`dict`): Collection
+
+    Returns:
+        list: Values of the point (NaN if missing from an item); None if a
+        required point is missing from any item or an optional point is
+        missing from every item
+    """
+    key = pnt.key
+    column = [d.get(key, _MISSING) for d in data]
+    if _MISSING not in column:
+        return column
+    if not pnt.optional:
+        return None
+    if all(d is _MISSING for d in column):
+        return None
+    # Missing values of (partly) missing objects are empty groups so that
+    # their points are missing as well (new ones, since the column may be
+    # modified)
+    if any(isinstance(d, dict) for d in column):
+        return [{} if d is _MISSING else d for d in column]
+    nan = float("nan")
+    return [nan if d is _MISSING else d for d in column]
+
+
+def execute_plan(plan, data, key):
+    """Execute a parse plan on data returned by the API
+
+    Args:
+        plan (:obj:`ParsePlan`): Parse plan
+        data (:obj:`list` of :obj:`dict`): Message returned by the API
+        key (str): Prefix key
+
+    Returns:
+        dict: key-value pair of key and list of values
+    """
+    data = data if isinstance(data, list) else [data]
+    fmt_data = {}
+    if len(data) == 0:
+        return fmt_data
+
+    if plan.points is None or not any(isinstance(d, dict) for d in data):
+        fmt_data[key] = data
+        return fmt_data
+
+    prefix = key + "." if key != "" else ""
+    for pnt in plan.points:
+        column = extract_column(pnt, data)
+        if column is None:
+            if pnt.optional:
+                continue
+            msg = f"Type {plan.obj_type} is missing data ({pnt.key})"
+            _logger.error(msg)
+            raise ValueError(msg)
+        fmt_data.update(
+            execute_plan(pnt.plan(column), column, prefix + pnt.name)
+        )
+    return fmt_data
 
 
 class WeatherObjects:
@@ -298,11 +833,34 @@ class WeatherObjects:
 
     Attributes:
         types (dict): All defined objects
+        plans (dict): Compiled parse plan of each object
     """
 
     def __init__(self, path):
         with open(path, "r") as json_file:
             self.types = json.load(json_file)
+        self.plans = compile_types(self.types)
+        self._formatters = {}
+        self._formatters_lock = threading.Lock()
+
+    def formatter(self, units):
+        """Get the data formatter of a unit configuration. Formatters are
+        kept for the units in use (e.g., a configuration snapshot).
+
+        Args:
+            units (dict): Unit of each object type (i.e., `units.json`)
+
+        Returns:
+            :obj:`DataFormatter`: Data formatter
+        """
+        with self._formatters_lock:
+            cached = self._formatters.get(id(units))
+            if cached is None or cached.units is not units:
+                if len(self._formatters) >= 64:
+                    self._formatters.clear()
+                cached = DataFormatter(self, units)
+                self._formatters[id(units)] = cached
+            return cached
 
     def parse_object_type(self, data, obj_type, key=None):
         """Parse object type
@@ -315,58 +873,41 @@ class WeatherObjects:
         Returns:
             dict: key-value pair of key and list of values
         """
-        if obj_type not in self.types:
+        if obj_type not in self.plans:
             msg = f"The key {obj_type} is not defined in the Weather types"
             _logger.error(msg)
             raise KeyError(msg)
 
-        data = data if isinstance(data, list) else [data]
-        fmt_data = {}
-        if len(data) == 0:
-            return fmt_data
-
-        cur_type = self.types[obj_type]
         if key is None:
             key = obj_type
+        return execute_plan(self.plans[obj_type], data, key)
 
-        if "Points" in cur_type:
-            if not any([isinstance(d, dict) for d in data]):
-                fmt_data.update({key: data})
-                return fmt_data
+    _cache = {}
+    _cache_lock = threading.Lock()
 
-            for obj_t, pnt in cur_type["Points"].items():
-                # Could be a string or a dict with Key, Optional and/or Type
-                pnt = pnt.copy() if not isinstance(pnt, str) else {"Key": pnt}
-                if "Optional" not in pnt:
-                    pnt["Optional"] = False
-
-                dat = [d.get(pnt["Key"], float("nan")) for d in data]
-                if not pnt["Optional"] and any(
-                    [d == float("nan") for d in dat]
-                ):
-                    msg = f"Type {obj_type} is missing data"
-                    _logger.error(msg)
-                    raise ValueError(msg)
-
-                if pnt["Optional"] and all([math.isnan(d) for d in dat]):
-                    continue
-
-                new_key = key + "." + obj_t if key != "" else obj_t
-                if "Type" not in pnt or (
-                    len(dat) > 0 and not isinstance(dat[0], dict)
-                ):
-                    pnt["Type"] = obj_t
-
-                cur_dat = self.parse_object_type(dat, pnt["Type"], key=new_key)
-                fmt_data.update(cur_dat)
-        else:
-            fmt_data[key] = data
+    @classmethod
+    def get_obj(cls, path=None):
+        """Get a Weather object. The objects are shared by the process and
+        only re-loaded if the modification time or size of the file changes,
+        which keeps `WeatherTypes.json` hot-swappable at runtime.
 
-        return fmt_data
+        Args:
+            path (str): Path to the weather types file (defaults to the
+                packaged `WeatherTypes.json`)
 
-    @staticmethod
-    def get_obj():
-        """Get a Weather object"""
-        cur_path = os.path.dirname(os.path.abspath(__file__))
-        wk_path = os.path.join(cur_path, "WeatherTypes.json")
-        return WeatherObjects(wk_path)
+        Returns:
+            :obj:`WeatherObjects`: Weather objects
+        """
+        if path is None:
+            cur_path = os.path.dirname(os.path.abspath(__file__))
+            path = os.path.join(cur_path, "WeatherTypes.json")
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            _logger.debug("Loading weather types from %s", path)
+            obj = cls(path)
+            cls._cache[path] = (signature, obj)
+            return obj
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Request coalescing: concurrent calls with the same key share a single call
+and its result
+"""
+
+import logging
+import threading
+import time
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Call shared by the callers of a key"""
+
+    __slots__ = ("event", "result", "error", "done_time", "window")
+
+    def __init__(self, window=0):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.done_time = None
+        self.window = window
+
+    def is_expired(self, cur_time):
+        """Check if the call is finished and no longer shared
+
+        Args:
+            cur_time (float): Monotonic time
+
+        Returns:
+            bool: True if the call expired
+        """
+        return self.done_time is not None and \
+            cur_time - self.done_time >= self.window
+
+
+class SingleFlight:
+    """Share calls with the same key. While a call is in flight, callers with
+    the same key wait for it and get its result instead of calling again. A
+    finished call may also be shared for a window of time (e.g., collections
+    of the same tick that run one after the other); expired calls are
+    dropped when a new call starts.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, window=0):
+        """Call a function unless a call with the same key is in flight
+
+        Args:
+            key: Key of the call (e.g., the URL)
+            function: Callable function
+            window (float): Seconds the result of a finished call is shared
+
+        Returns:
+            Result of the (shared) call
+        """
+        with self._lock:
+            cur_time = time.monotonic()
+            call = self._calls.get(key)
+            if call is not None and call.done_time is not None and \
+                    cur_time - call.done_time >= window:
+                call = None
+            leader = call is None
+            if leader:
+                self._purge(cur_time)
+                call = self._calls[key] = _Call(window)
+
+        if not leader:
+            _logger.debug("Sharing in-flight call of %s", key)
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                call.done_time = time.monotonic()
+                if (window <= 0 or call.error is not None) and \
+                        self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def _purge(self, cur_time):
+        """Drop the expired calls (the lock must be held)
+
+        Args:
+            cur_time (float): Monotonic time
+        """
+        for key in [key for key, call in self._calls.items()
+                    if call.is_expired(cur_time)]:
+            del self._calls[key]
@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+"""
+Compaction of the small files written every call (data files that are not
+appended and whose `Filename` has a date code, e.g., `daily.json`). The files
+of a closed (UTC) day are merged into one compressed segment per data file
+and day, and the index of each segment maps its files to their position in
+the segment.
+
+Layout of a data directory::
+
+    <data_dir>/pending.json                        compacted files still to
+                                                    be removed
+    <data_dir>/segments/<spec>_<YYYY-MM-DD>.csv.gz  segments (one gzip member
+                                                    per compacted file)
+    <data_dir>/segments/<spec>_<YYYY-MM-DD>.json    indexes of the segments
+
+Compaction is crash-safe: a segment is written to a temporary file, synced
+and renamed, and is only visible once its index is written (the commit). A
+compaction pass writes all its segments, then the list of the files to
+remove (`pending.json`), then commits the segments and finally removes the
+files; a crash before a commit leaves an orphaned segment and a crash after
+it leaves pending files, which are both removed by the next compaction.
+Readers (:func:`list_files` and :func:`read_file`) resolve files through the
+indexes, so they see either the files or the segment, never a mix; the
+indexes are cached and only re-read when the segments change. A file that is
+written again after it was compacted (e.g., by reprocessing) has a different
+modification time than its entry, so it is kept and read instead of the
+segment (and compacted again by the next compaction).
+"""
+
+import argparse
+import datetime as dt
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import types
+
+import pytz
+
+from weather_collector import __version__
+from weather_collector.config import ConfigStore, load_json
+from weather_collector.engine import create_jobs, load_locations
+from weather_collector.writers import sync_dir
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+PENDING_FILE = "pending.json"
+SEGMENT_DIR = "segments"
+SEGMENT_SUFFIX = ".csv.gz"
+INDEX_SUFFIX = ".json"
+TMP_SUFFIX = ".tmp"
+DEFAULT_GRACE = 3600
+
+_DIRECTIVES = {"Y": r"\d{4}", "m": r"\d{2}", "d": r"\d{2}", "H": r"\d{2}",
+               "M": r"\d{2}", "S": r"\d{2}", "j": r"\d{3}", "y": r"\d{2}"}
+
+_compacted_cache = {}
+_compacted_cache_lock = threading.Lock()
+
+def get_pattern(filename):
+    """Get the pattern of the names of the files of a `Filename` with date
+    codes (see :func:`create_file_name`)
+
+    Args:
+        filename (str): `Filename` of a data file
+
+    Returns:
+        tuple: Compiled pattern and the date format of each of its groups,
+        or None if `Filename` has no date code
+    """
+    regex, formats = "", []
+    for part in filename.split("#"):
+        if part[0:6] != "<date>":
+            regex += re.escape(part)
+            continue
+        fmt = part[6:]
+        regex += "(" + re.sub(
+            r"%(.)|([^%]+)",
+            lambda match: _DIRECTIVES.get(match.group(1), ".+?")
+            if match.group(1) else re.escape(match.group(2)),
+            fmt,
+        ) + ")"
+        formats.append(fmt)
+    if not formats:
+        return None
+    return re.compile(regex + "$"), formats
+
+
+def parse_call_time(pattern, name):
+    """Parse the call time of a file from its name
+
+    Args:
+        pattern (tuple): Pattern of the names (see :func:`get_pattern`)
+        name (str): Name of the file
+
+    Returns:
+        :obj:`datetime.datetime`: Call time (UTC), or None if the name does
+        not match
+    """
+    regex, formats = pattern
+    match = regex.match(name)
+    if match is None:
+        return None
+    try:
+        call_time = dt.datetime.strptime(
+            "#".join(match.groups()), "#".join(formats)
+        )
+    except ValueError:
+        return None
+    return pytz.utc.localize(call_time)
+
+
+def get_index_path(segment):
+    """Get the path of the index of a segment
+
+    Args:
+        segment (str): Path of the segment
+
+    Returns:
+        str: Path of the index
+    """
+    return segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+def _write_json(path, data):
+    """Atomically replace a JSON file (the directory is not synced)
+
+    Args:
+        path (str): Path of the file
+        data: Data
+    """
+    with open(path + TMP_SUFFIX, "w") as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + TMP_SUFFIX, path)
+
+
+def write_index(data_dir, index):
+    """Write the index of a segment (the commit of the segment; the segments
+    directory must be synced for it to be durable)
+
+    Args:
+        data_dir (str): Data directory
+        index (dict): Index (keys `Segment`, `Spec`, `Window`, `Sequence`
+            and `Files`)
+    """
+    _write_json(os.path.join(data_dir, get_index_path(index["Segment"])),
+                index)
+
+
+def read_pending(data_dir):
+    """Read the compacted files of a data directory that are still to be
+    removed
+
+    Args:
+        data_dir (str): Data directory
+
+    Returns:
+        list: Entries of the files (see :func:`write_segment`) with the key
+        `Segment`
+    """
+    try:
+        with open(os.path.join(data_dir, PENDING_FILE), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def write_pending(data_dir, entries):
+    """Durably write the compacted files of a data directory that are to be
+    removed once their segments are committed
+
+    Args:
+        data_dir (str): Data directory
+        entries (list): Entries of the files with the key `Segment`
+    """
+    _write_json(os.path.join(data_dir, PENDING_FILE), entries)
+    sync_dir(data_dir)
+
+
+def get_compacted(data_dir, refresh=False):
+    """Get the compacted files of a data directory. The indexes are cached
+    by the process and only re-read if the segments directory changes.
+
+    Args:
+        data_dir (str): Data directory
+        refresh (bool): Re-read the indexes even if the segments directory
+            did not change
+
+    Returns:
+        :obj:`types.MappingProxyType`: Segment and entry (keys `Name`,
+        `Offset`, `Length`, `Size` and `MtimeNs`) of each compacted file (the
+        last compaction of a file wins)
+    """
+    segment_dir = os.path.join(data_dir, SEGMENT_DIR)
+    try:
+        stat = os.stat(segment_dir)
+    except FileNotFoundError:
+        return types.MappingProxyType({})
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _compacted_cache_lock:
+        cached = _compacted_cache.get(data_dir)
+    if cached is not None and cached[0] == signature and not refresh:
+        return cached[1]
+
+    indexes = []
+    with os.scandir(segment_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(INDEX_SUFFIX):
+                indexes.append(load_json(entry.path, stat=entry.stat()))
+    compacted = {}
+    for index in sorted(indexes, key=lambda index: (index["Window"][0],
+                                                   index["Sequence"])):
+        for entry in index["Files"]:
+            compacted[entry["Name"]] = (index["Segment"], entry)
+    compacted = types.MappingProxyType(compacted)
+    with _compacted_cache_lock:
+        _compacted_cache[data_dir] = (signature, compacted)
+    return compacted
+
+
+def is_compacted(path, entry):
+    """Check if a file is the file that was compacted to an entry (i.e., it
+    was not written again since)
+
+    Args:
+        path (str): Path of the file
+        entry (dict): Entry of the compacted file
+
+    Returns:
+        bool: True if the file exists and is the compacted file
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return stat.st_size == entry["Size"] and \
+        stat.st_mtime_ns == entry.get("MtimeNs")
+
+
+def list_files(data_dir):
+    """List the files of a data directory, compacted or not
+
+    Args:
+        data_dir (str): Data directory
+
+    Returns:
+        list: Names of the files
+    """
+    names = set(get_compacted(data_dir))
+    names.update(
+        name for name in os.listdir(data_dir)
+        if os.path.isfile(os.path.join(data_dir, name))
+        and name != PENDING_FILE and not name.endswith(TMP_SUFFIX)
+    )
+    return sorted(names)
+
+
+def read_file(data_dir, name):
+    """Read a file of a data directory, compacted or not
+
+    Args:
+        data_dir (str): Data directory
+        name (str): Name of the file
+
+    Returns:
+        bytes: Contents of the file
+    """
+    path = os.path.join(data_dir, name)
+    for attempt in range(2):
+        compacted = get_compacted(data_dir, refresh=bool(attempt))
+        if name in compacted and (
+                is_compacted(path, compacted[name][1])
+                or not os.path.exists(path)):
+            segment, entry = compacted[name]
+            with open(os.path.join(data_dir, segment), "rb") as seg_file:
+                seg_file.seek(entry["Offset"])
+                return gzip.decompress(seg_file.read(entry["Length"]))
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            if attempt:
+                raise
+            # Compacted since the indexes were read
+
+
+def remove_pending(data_dir, entries):
+    """Remove the compacted files that are pending removal and whose segment
+    is committed. A file that was written again since it was compacted is
+    kept.
+
+    Args:
+        data_dir (str): Data directory
+        entries (list): Entries of the files with the key `Segment`
+    """
+    for entry in entries:
+        path = os.path.join(data_dir, entry["Name"])
+        if not os.path.exists(
+                os.path.join(data_dir, get_index_path(entry["Segment"]))):
+            continue
+        if is_compacted(path, entry):
+            os.remove(path)
+        elif os.path.exists(path):
+            _logger.warning("Compacted file %s was modified; keeping it",
+                            path)
+    try:
+        os.remove(os.path.join(data_dir, PENDING_FILE))
+    except FileNotFoundError:
+        return
+    sync_dir(data_dir)
+
+
+def recover(data_dir):
+    """Finish or roll back an interrupted compaction: remove the files that
+    were compacted (committed) and the segments that were not
+
+    Args:
+        data_dir (str): Data directory
+    """
+    remove_pending(data_dir, read_pending(data_dir))
+
+    segment_dir = os.path.join(data_dir, SEGMENT_DIR)
+    if not os.path.isdir(segment_dir):
+        return
+    names = set(os.listdir(segment_dir))
+    for name in names:
+        if name.endswith(TMP_SUFFIX) or (
+                name.endswith(SEGMENT_SUFFIX)
+                and get_index_path(name) not in names):
+            _logger.warning("Removing uncommitted segment %s", name)
+            os.remove(os.path.join(segment_dir, name))
+
+
+def find_windows(data_dir, data_config, before):
+    """Find the files of a data file per closed (UTC) day
+
+    Args:
+        data_dir (str): Data directory
+        data_config (dict): Data file (i.e., data specification)
+        before (:obj:`datetime.datetime`): Only the days that ended before
+            this time are closed
+
+    Returns:
+        dict: Names of the files (in call time order) of each closed day
+    """
+    if data_config.get("Append", False) or \
+            data_config.get("Format", "csv").lower() != "csv":
+        return {}
+    pattern = get_pattern(data_config["Filename"])
+    if pattern is None or not os.path.isdir(data_dir):
+        return {}
+    windows = {}
+    for name in os.listdir(data_dir):
+        call_time = parse_call_time(pattern, name)
+        if call_time is None:
+            continue
+        day = call_time.date()
+        if pytz.utc.localize(dt.datetime.combine(
+                day + dt.timedelta(days=1), dt.time())) > before:
+            continue
+        windows.setdefault(day, []).append((call_time, name))
+    return {day: [name for _, name in sorted(files)]
+            for day, files in windows.items()}
+
+
+def write_segment(data_dir, segment, names):
+    """Write the files to a segment
+
+    Args:
+        data_dir (str): Data directory
+        segment (str): Path of the segment (relative to the data directory)
+        names (list): Names of the files
+
+    Returns:
+        list: Entries of the files (keys `Name`, `Offset`, `Length`, `Size`
+        and `MtimeNs`, the modification time of the file)
+    """
+    path = os.path.join(data_dir, segment)
+    entries = []
+    with open(path + TMP_SUFFIX, "wb") as seg_file:
+        for name in names:
+            with open(os.path.join(data_dir, name), "rb") as file:
+                mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+                data = file.read()
+            member = gzip.compress(data)
+            entries.append({"Name": name, "Offset": seg_file.tell(),
+                            "Length": len(member), "Size": len(data),
+                            "MtimeNs": mtime_ns})
+            seg_file.write(member)
+        seg_file.flush()
+        os.fsync(seg_file.fileno())
+    os.replace(path + TMP_SUFFIX, path)
+    # The segment must be durable before the manifest lists it
+    sync_dir(os.path.dirname(path))
+    return entries
+
+
+def compact(config_dir, data_dir, now=None, grace=DEFAULT_GRACE):
+    """Compact the files of the closed days of the data files of a
+    configuration directory
+
+    Args:
+        config_dir (str): Configuration directory
+        data_dir (str): Data directory
+        now (:obj:`datetime.datetime`): Current time (defaults to now)
+        grace (float): Seconds after the end of a day before it is closed
+
+    Returns:
+        int: Number of compacted files
+    """
+    now = dt.datetime.now(pytz.utc) if now is None else now
+    before = now - dt.timedelta(seconds=grace)
+    if not os.path.isdir(data_dir):
+        return 0
+    recover(data_dir)
+
+    indexes, pending = [], []
+    snapshot = ConfigStore.get_store(config_dir).snapshot()
+    for spec_path, data_config in sorted(snapshot.data_specs.items()):
+        spec = os.path.splitext(os.path.basename(spec_path))[0]
+        windows = find_windows(data_dir, data_config, before)
+        for day, names in sorted(windows.items()):
+            segment, number = None, 0
+            while segment is None or \
+                    os.path.exists(os.path.join(data_dir, segment)):
+                suffix = f".{number}" if number else ""
+                segment = os.path.join(
+                    SEGMENT_DIR,
+                    f"{spec}_{day.isoformat()}{suffix}{SEGMENT_SUFFIX}",
+                )
+                number += 1
+            os.makedirs(os.path.join(data_dir, SEGMENT_DIR), exist_ok=True)
+            entries = write_segment(data_dir, segment, names)
+            start = pytz.utc.localize(dt.datetime.combine(day, dt.time()))
+            indexes.append({
+                "Segment": segment,
+                "Spec": os.path.basename(spec_path),
+                "Window": [start.isoformat(),
+                           (start + dt.timedelta(days=1)).isoformat()],
+                "Sequence": number - 1,
+                "Files": entries,
+            })
+            pending.extend(dict(entry, Segment=segment) for entry in entries)
+    if not indexes:
+        return 0
+
+    write_pending(data_dir, pending)
+    for index in indexes:
+        write_index(data_dir, index)
+        _logger.info("Compacted %d files of %s into %s",
+                     len(index["Files"]), index["Spec"], index["Segment"])
+    sync_dir(os.path.join(data_dir, SEGMENT_DIR))
+    remove_pending(data_dir, pending)
+    return len(pending)
+
+
+def compact_job(job, grace=DEFAULT_GRACE):
+    """Compact the files of a collection job
+
+    Args:
+        job (:obj:`Job`): Collection job
+        grace (float): Seconds after the end of a day before it is closed
+
+    Returns:
+        int: Number of compacted files
+    """
+    return compact(job.config_dir,
+                   job.collector.load_config()["Data Directory"],
+                   grace=grace)
+
+
+def compact_jobs(jobs, grace=DEFAULT_GRACE):
+    """Compact the files of collection jobs (e.g., from the scheduler)
+
+    Args:
+        jobs (:obj:`list` of :obj:`Job`): Collection jobs
+        grace (float): Seconds after the end of a day before it is closed
+
+    Returns:
+        int: Number of compacted files
+    """
+    return sum(compact_job(job, grace) for job in jobs)
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args ([str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Compact the files of closed days into segments")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="weather-collector {ver}".
+                format(ver=__version__))
+    parser.add_argument(
+        '-c',
+        '--config',
+        dest="config",
+        help="Configuration file(s)",
+        type=str,
+        nargs="+",
+        required=True)
+    parser.add_argument(
+        '-l',
+        '--locations',
+        dest="locations",
+        help="Locations file; each configuration is compacted at every "
+             "location",
+        type=str)
+    parser.add_argument(
+        '-g',
+        '--grace',
+        dest="grace",
+        help="Seconds after the end of a day before it is compacted",
+        type=float,
+        default=DEFAULT_GRACE)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO)
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG)
+    return parser.parse_args(args)
+
+
+def main(args):
+    """Main entry point allowing external calls
+
+    Args:
+      args ([str]): command line parameter list
+
+    Returns:
+      int: Number of compacted files
+    """
+    # pylint: disable=import-outside-toplevel
+    from weather_collector.run import setup_logging
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+    locations = None
+    if args.locations is not None:
+        locations = load_locations(args.locations)
+    count = compact_jobs(create_jobs(args.config, locations), args.grace)
+    _logger.info("Compacted %d files", count)
+    return count
+
+
+def run():
+    """Entry point for console_scripts
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Cached configuration of the collection sources. Configuration files are kept
+in memory and only re-read when their modification time or size changes,
+which keeps them hot-swappable at runtime.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import types
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "config.json"
+UNITS_FILE = "units.json"
+
+ConfigSnapshot = collections.namedtuple(
+    "ConfigSnapshot", ["config", "units", "data_specs"]
+)
+ConfigSnapshot.__doc__ = """Immutable snapshot of a configuration directory
+
+Args:
+    config (:obj:`types.MappingProxyType`): API configuration
+        (`config.json`); None if not in the directory
+    units (:obj:`types.MappingProxyType`): Unit configuration
+        (`units.json`); None if not in the directory
+    data_specs (:obj:`types.MappingProxyType`): Data file specifications
+        keyed by path
+"""
+
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+
+def freeze(data):
+    """Make decoded JSON data immutable
+
+    Args:
+        data: Decoded JSON data
+
+    Returns:
+        Data where dicts are read-only mappings and lists are tuples
+    """
+    if isinstance(data, dict):
+        return types.MappingProxyType(
+            {key: freeze(val) for key, val in data.items()}
+        )
+    if isinstance(data, list):
+        return tuple(freeze(val) for val in data)
+    return data
+
+
+def thaw(data):
+    """Make a mutable (and picklable) copy of frozen data (see
+    :func:`freeze`)
+
+    Args:
+        data: Frozen data
+
+    Returns:
+        Data where read-only mappings are dicts and tuples are lists
+    """
+    if isinstance(data, (dict, types.MappingProxyType)):
+        return {key: thaw(val) for key, val in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [thaw(val) for val in data]
+    return data
+
+
+def load_json(path, stat=None):
+    """Load a JSON file. The decoded data is shared by the process and only
+    re-read if the modification time or size of the file changes.
+
+    Args:
+        path (str): Path to JSON file
+        stat (:obj:`os.stat_result`): Status of the file if already known
+
+    Returns:
+        Immutable decoded data (see :func:`freeze`)
+    """
+    if stat is None:
+        stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _json_cache_lock:
+        cached = _json_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    _logger.debug("Loading %s", path)
+    with open(path, "r") as json_file:
+        data = freeze(json.load(json_file))
+    with _json_cache_lock:
+        _json_cache[path] = (signature, data)
+    return data
+
+
+class ConfigStore:
+    """Configuration store of a source's configuration directory. Each
+    snapshot only costs a directory scan; files are re-read if they changed.
+
+    Args:
+        config_dir (str): Configuration directory
+
+    Attributes:
+        config_dir (str): Configuration directory
+    """
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self._files = {}
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Get the current configuration
+
+        Returns:
+            :obj:`ConfigSnapshot`: Snapshot of the configuration directory
+        """
+        with self._lock:
+            files = {}
+            with os.scandir(self.config_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    path = os.path.join(self.config_dir, entry.name)
+                    files[path] = load_json(path, stat=entry.stat())
+
+            if self._snapshot is not None and files.keys() == \
+                    self._files.keys() and all(
+                        files[path] is self._files[path] for path in files):
+                return self._snapshot
+
+            _logger.debug("Configuration in %s changed", self.config_dir)
+            self._files = files
+            config, units, data_specs = None, None, {}
+            for path in sorted(files):
+                name = os.path.basename(path)
+                if name == CONFIG_FILE:
+                    config = files[path]
+                elif name == UNITS_FILE:
+                    units = files[path]
+                else:
+                    data_specs[path] = files[path]
+            self._snapshot = ConfigSnapshot(
+                config, units, types.MappingProxyType(data_specs)
+            )
+            return self._snapshot
+
+    @classmethod
+    def get_store(cls, config_dir):
+        """Get the configuration store of a directory shared by the process
+
+        Args:
+            config_dir (str): Configuration directory
+
+        Returns:
+            :obj:`ConfigStore`: Configuration store
+        """
+        with cls._stores_lock:
+            if config_dir not in cls._stores:
+                cls._stores[config_dir] = cls(config_dir)
+            return cls._stores[config_dir]
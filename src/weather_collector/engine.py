@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous collection engine responsible for collecting from many sources
+(or one source at many locations) concurrently
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+
+from weather_collector.caller import Caller, Collector
+from weather_collector.config import load_json, thaw
+from weather_collector.ratelimit import TokenBucket
+from weather_collector.runner import Scheduler
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_WORKERS = 4
+HOUSEKEEPING_WORKERS = 3
+
+Job = collections.namedtuple("Job", ["collector", "config_dir"])
+Job.__doc__ = """Collection job of a source
+
+Args:
+    collector (:obj:`Collector`): Collector of the source
+    config_dir (str): Configuration directory of the source
+"""
+
+
+def load_locations(path):
+    """Load locations file. The file is a JSON list of objects with keys
+    `Name`, `Latitude` and `Longitude`.
+
+    Args:
+        path (str): Path to locations file
+
+    Returns:
+        tuple: Locations
+    """
+    locations = load_json(path)
+    for location in locations:
+        for key in ["Name", "Latitude", "Longitude"]:
+            if key not in location:
+                msg = f"Location {dict(location)} is missing {key}"
+                _logger.error(msg)
+                raise KeyError(msg)
+    return locations
+
+
+def locate_config(config, location):
+    """Create the configuration of a source template at a location. The
+    `{lat}` and `{lon}` fields in the URL are replaced by the location.
+
+    Args:
+        config (dict): Source (template) configuration
+        location (dict): Location with keys `Name`, `Latitude` and `Longitude`
+
+    Returns:
+        dict: Configuration of the source at the location (a mutable copy of
+        the template, so that it can be sent to other processes)
+    """
+    config = thaw(config)
+    config["URL"] = (
+        config["URL"]
+        .replace("{lat}", str(location["Latitude"]))
+        .replace("{lon}", str(location["Longitude"]))
+    )
+    config["Name"] = f"{config.get('Name', '')} {location['Name']}".strip()
+    config["Data Directory"] = os.path.join(
+        config["Data Directory"], location["Name"]
+    )
+    return config
+
+
+def collect_job(job):
+    """Collect the data of a job
+
+    Args:
+        job (:obj:`Job`): Collection job
+    """
+    _logger.debug("Running collector")
+    job.collector.collect(
+        config_dir=job.config_dir,
+        data_dir=job.collector.load_config()["Data Directory"],
+    )
+
+
+def replay_job(job, directory=None):
+    """Replay the recorded collections of a job
+
+    Args:
+        job (:obj:`Job`): Collection job
+        directory (str): Archive directory (defaults to the
+            `Archive Directory` of the job's configuration)
+
+    Returns:
+        int: Number of replayed responses
+    """
+    return job.collector.replay(
+        config_dir=job.config_dir,
+        data_dir=job.collector.load_config()["Data Directory"],
+        directory=directory,
+    )
+
+
+def create_jobs(config_paths, locations=None):
+    """Create the collection jobs
+
+    Args:
+        config_paths (:obj:`list` of :obj:`str`): Paths to the `config.json`
+            of the sources
+        locations (list): If set, each source is a template that is collected
+            at every location (see :func:`locate_config`)
+
+    Returns:
+        list: Collection jobs (:obj:`Job`)
+    """
+    jobs = []
+    for path in config_paths:
+        config_dir = os.path.dirname(path)
+        if not locations:
+            jobs.append(Job(Collector(config=path), config_dir))
+            continue
+        template = load_json(path)
+        for location in locations:
+            config = locate_config(template, location)
+            jobs.append(Job(Collector(config=config), config_dir))
+    return jobs
+
+
+class AsyncEngine:
+    """Collect from many sources concurrently. API calls are run
+    concurrently (bounded by `max_concurrency`) and each response is handed to
+    a pool of workers that parse and save it. Calls waiting for a rate limit
+    (see :class:`TokenBucket`) wait asynchronously.
+
+    Args:
+        jobs (:obj:`list` of :obj:`Job`): Collection jobs
+        max_concurrency (int): Maximum number of concurrent API calls
+        workers (int): Number of parse/write workers
+
+    Attributes:
+        jobs (:obj:`list` of :obj:`Job`): Collection jobs
+        max_concurrency (int): Maximum number of concurrent API calls
+        workers (int): Number of parse/write workers
+        scheduler (:obj:`Scheduler`): Scheduler of the periodic collections
+        housekeeping (:obj:`Scheduler`): Scheduler of the periodic
+            housekeeping jobs (e.g., flushing buffers), which have their own
+            workers so that they neither wait for nor delay collections
+    """
+
+    def __init__(self, jobs, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 workers=DEFAULT_WORKERS):
+        self.jobs = list(jobs)
+        self.max_concurrency = max_concurrency
+        self.workers = workers
+        self.scheduler = None
+        self.housekeeping = Scheduler(workers=HOUSEKEEPING_WORKERS)
+        self._call_pool = None
+        self._work_pool = None
+
+    def _pools(self):
+        if self._call_pool is None:
+            self._call_pool = concurrent.futures.ThreadPoolExecutor(
+                self.max_concurrency, thread_name_prefix="call"
+            )
+            self._work_pool = concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="work"
+            )
+        return self._call_pool, self._work_pool
+
+    async def collect(self, jobs=None):
+        """Collect data of all jobs concurrently
+
+        Args:
+            jobs (:obj:`list` of :obj:`Job`): Jobs to run (defaults to all)
+
+        Returns:
+            int: Number of jobs that were collected successfully
+        """
+        jobs = self.jobs if jobs is None else jobs
+        call_pool, work_pool = self._pools()
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_job(job):
+            # Wait for the rate limit without holding a call thread
+            bucket = TokenBucket.get_bucket(job.collector.load_config())
+            if bucket is not None:
+                await bucket.acquire_async()
+            async with semaphore:
+                caller = Caller(
+                    config=job.collector.config,
+                    reserved=bucket is not None,
+                    paths=job.collector.get_paths(job.config_dir),
+                )
+                response = await loop.run_in_executor(
+                    call_pool, caller.call_api
+                )
+            if response is None:
+                return False
+            data_dir = job.collector.load_config()["Data Directory"]
+            await loop.run_in_executor(
+                work_pool,
+                job.collector.process,
+                response,
+                job.config_dir,
+                data_dir,
+            )
+            return True
+
+        results = await asyncio.gather(
+            *(run_job(job) for job in jobs), return_exceptions=True
+        )
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                _logger.error(
+                    "Failed to collect %s: %s",
+                    job.collector.load_config().get("Name", ""),
+                    result,
+                )
+        return sum(result is True for result in results)
+
+    def run(self, jobs=None):
+        """Run a collection of the jobs
+
+        Args:
+            jobs (:obj:`list` of :obj:`Job`): Jobs to run (defaults to all)
+
+        Returns:
+            int: Number of jobs that were collected successfully
+        """
+        success = asyncio.run(self.collect(jobs))
+        _logger.info("Collected %d of %d sources", success,
+                     len(self.jobs if jobs is None else jobs))
+        return success
+
+    def start(self):
+        """Start collecting periodically. Jobs sharing a call frequency are
+        collected together."""
+        groups = collections.defaultdict(list)
+        for job in self.jobs:
+            interval = job.collector.load_config()["Call Frequency"] * 60
+            groups[interval].append(job)
+        self.scheduler = Scheduler(workers=max(1, len(groups)))
+        for interval, jobs in groups.items():
+            self.scheduler.add_job(interval, self.run, jobs)
+        self.scheduler.start()
+        self.housekeeping.start()
+
+    def add_housekeeping(self, interval, function, *args):
+        """Add a periodic housekeeping job (e.g., flushing buffers or writing
+        metrics)
+
+        Args:
+            interval (float): Interval in seconds
+            function: Callable function
+            *args: Positional arguments for function
+
+        Returns:
+            :obj:`ScheduledJob`: The job
+        """
+        return self.housekeeping.add_job(interval, function, *args)
+
+    def stop(self):
+        """Terminate the collection"""
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        if self.housekeeping.thread is not None:
+            self.housekeeping.stop()
+        if self._call_pool is not None:
+            self._call_pool.shutdown()
+            self._work_pool.shutdown()
+            self._call_pool = None
+            self._work_pool = None
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of the collector internals (calls, parsing, writing and scheduling)
+exposed in the Prometheus text format, either by a local HTTP endpoint or by
+a file for the node exporter's textfile collector
+"""
+
+import contextlib
+import http.server
+import logging
+import math
+import os
+import threading
+import time
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+METRICS_INTERVAL = 15
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"'
+             for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Metric with labels
+
+    Args:
+        name (str): Name of the metric
+        documentation (str): Description of the metric
+        labelnames (tuple): Names of the labels
+
+    Attributes:
+        name (str): Name of the metric
+        documentation (str): Description of the metric
+        labelnames (tuple): Names of the labels
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            msg = (f"Metric {self.name} has labels {self.labelnames}, not "
+                   f"{tuple(labels)}")
+            _logger.error(msg)
+            raise ValueError(msg)
+        return tuple(labels[name] for name in self.labelnames)
+
+    def clear(self):
+        """Clear the values of all labels"""
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        """Render the metric in the Prometheus text format
+
+        Returns:
+            list: Lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Counter (i.e., a value that only increases)"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter
+
+        Args:
+            amount (float): Amount
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Get the value of the counter
+
+        Args:
+            **labels: Label values
+
+        Returns:
+            float: Value
+        """
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield (f"{self.name}{_format_labels(self.labelnames, key)} "
+                   f"{_format_value(value)}")
+
+
+class Histogram(Metric):
+    """Histogram of observations (e.g., latencies)
+
+    Args:
+        name (str): Name of the metric
+        documentation (str): Description of the metric
+        labelnames (tuple): Names of the labels
+        buckets (tuple): Upper bounds of the buckets
+
+    Attributes:
+        buckets (tuple): Upper bounds of the buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """Observe a value
+
+        Args:
+            value (float): Value
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the seconds a block of code takes
+
+        Args:
+            **labels: Label values
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels):
+        """Get the number of observations
+
+        Args:
+            **labels: Label values
+
+        Returns:
+            int: Number of observations
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return 0 if state is None else state[2]
+
+    def _render_samples(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, cur_count in zip(self.buckets, counts):
+                cumulative += cur_count
+                labels = _format_labels(self.labelnames, key,
+                                        ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    """Registry of the metrics of the process"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Register a metric
+
+        Args:
+            metric (:obj:`Metric`): Metric
+
+        Returns:
+            :obj:`Metric`: Metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text format
+
+        Returns:
+            str: Metrics
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CALL_SECONDS = REGISTRY.register(Histogram(
+    "weather_collector_call_seconds", "Latency of API calls", ["source"]))
+CALL_STATUS = REGISTRY.register(Counter(
+    "weather_collector_calls_total",
+    "API calls by HTTP status code (error if there was no response)",
+    ["source", "status"]))
+RECEIVED_BYTES = REGISTRY.register(Counter(
+    "weather_collector_received_bytes_total",
+    "Bytes of the response bodies received from APIs (possibly compressed)",
+    ["source"]))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    "weather_collector_parse_seconds",
+    "Time to parse and format the data of a data file", ["source"]))
+ROWS_WRITTEN = REGISTRY.register(Counter(
+    "weather_collector_rows_written_total", "Rows written", ["source"]))
+ROWS_SKIPPED = REGISTRY.register(Counter(
+    "weather_collector_rows_skipped_total",
+    "Appended rows that were not written because they did not change",
+    ["source"]))
+WRITE_SECONDS = REGISTRY.register(Histogram(
+    "weather_collector_write_seconds", "Time to save the data of a data file",
+    ["source"]))
+SCHEDULER_LAG = REGISTRY.register(Histogram(
+    "weather_collector_scheduler_lag_seconds",
+    "Time a job fired after its target time", ["job"]))
+OVERRUNS = REGISTRY.register(Counter(
+    "weather_collector_overruns_total",
+    "Times a job was due while it was still running", ["job"]))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Handler of the metrics endpoint"""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Respond with the metrics"""
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        _logger.debug(*args)
+
+
+def start_http_server(port, address="127.0.0.1"):
+    """Serve the metrics at `http://<address>:<port>/metrics` from a daemon
+    thread
+
+    Args:
+        port (int): Port (0 for any free port)
+        address (str): Address to listen on
+
+    Returns:
+        :obj:`http.server.ThreadingHTTPServer`: Server (call `shutdown` to
+        stop it)
+    """
+    server = http.server.ThreadingHTTPServer((address, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True,
+                              name="metrics")
+    thread.start()
+    _logger.info("Serving metrics on %s:%d", *server.server_address[:2])
+    return server
+
+
+def write_textfile(path):
+    """Write the metrics to a file (e.g., for the node exporter's textfile
+    collector). The file is replaced atomically.
+
+    Args:
+        path (str): Path to the file
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as metrics_file:
+        metrics_file.write(REGISTRY.render())
+    os.replace(tmp_path, path)
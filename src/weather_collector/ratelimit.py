@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Token-bucket rate limiters shared by all callers of the process. A bucket is
+kept per rate limit key (the API host by default, or e.g. the API key) so that
+sources sharing a quota share its bucket. The buckets may be persisted to a
+file so that a restart does not burst.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from weather_collector.sessions import get_host
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket. Tokens are added at `rate` tokens per second up to
+    `capacity` and every call takes a token. Calls that find the bucket empty
+    reserve a token in advance and wait for it, so waiting calls are served in
+    order.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): Maximum number of tokens (i.e., burst)
+        key (str): Rate limit key
+        path (str): File the bucket is persisted to; None to keep it in memory
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Maximum number of tokens (i.e., burst)
+        key (str): Rate limit key
+        path (str): File the bucket is persisted to
+        tokens (float): Tokens at the last update (negative if tokens are
+            reserved)
+    """
+
+    _buckets = {}
+    _buckets_lock = threading.Lock()
+
+    def __init__(self, rate, capacity, key=None, path=None):
+        if rate <= 0 or capacity < 1:
+            msg = f"Invalid rate limit of {key}: {rate}/s, burst {capacity}"
+            _logger.error(msg)
+            raise ValueError(msg)
+        self.rate = rate
+        self.capacity = capacity
+        self.key = key
+        self.path = path
+        self.tokens = capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+        if path is not None:
+            self._restore()
+
+    def _refill(self, cur_time):
+        elapsed = max(0.0, cur_time - self._updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self._updated = cur_time
+
+    def reserve(self, tokens=1):
+        """Take tokens, reserving them in advance if the bucket is empty
+
+        Args:
+            tokens (float): Number of tokens
+
+        Returns:
+            float: Seconds to wait before the tokens may be used
+        """
+        with self._lock:
+            self._refill(time.time())
+            self.tokens -= tokens
+            delay = max(0.0, -self.tokens / self.rate)
+            state = (self.tokens, self._updated)
+        if self.path is not None:
+            _persist(self.path, self.key, state)
+        if delay > 0:
+            _logger.info("Rate limit of %s reached; waiting %.1f seconds",
+                         self.key, delay)
+        return delay
+
+    def refund(self, tokens=1):
+        """Return tokens that were taken but not used (e.g., the call was
+        served from a cache)
+
+        Args:
+            tokens (float): Number of tokens
+        """
+        with self._lock:
+            self._refill(time.time())
+            self.tokens = min(self.capacity, self.tokens + tokens)
+            state = (self.tokens, self._updated)
+        if self.path is not None:
+            _persist(self.path, self.key, state)
+
+    def acquire(self, tokens=1):
+        """Take tokens, waiting for them if the bucket is empty
+
+        Args:
+            tokens (float): Number of tokens
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens=1):
+        """Take tokens, waiting asynchronously for them if the bucket is empty
+
+        Args:
+            tokens (float): Number of tokens
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _restore(self):
+        state = _load(self.path).get(self.key)
+        if state is None:
+            return
+        self.tokens = min(self.capacity, state["Tokens"])
+        self._updated = state["Time"]
+        self._refill(time.time())
+
+    @classmethod
+    def get_bucket(cls, config):
+        """Get the bucket of an API configuration shared by the process. The
+        rate limit is set by the `Rate Limit` object of the configuration
+        (keys `Calls`, `Period`, `Burst`, `Key` and `File`).
+
+        Args:
+            config (dict): API configuration
+
+        Returns:
+            :obj:`TokenBucket`: Token bucket; None if the API is not rate
+            limited
+        """
+        limit = config.get("Rate Limit")
+        if not limit:
+            return None
+        rate = limit["Calls"] / limit.get("Period", 1)
+        capacity = limit.get("Burst", limit["Calls"])
+        key = limit.get("Key", get_host(config["URL"]))
+        path = limit.get("File")
+        with cls._buckets_lock:
+            bucket = cls._buckets.get(key)
+            if bucket is None:
+                bucket = cls._buckets[key] = cls(rate, capacity, key, path)
+        with bucket._lock:  # pylint: disable=protected-access
+            bucket.rate = rate
+            bucket.capacity = capacity
+        return bucket
+
+
+_files_lock = threading.Lock()
+
+
+def _load(path):
+    """Load the bucket states persisted to a file
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        dict: States (`Tokens` and `Time`) by rate limit key
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError) as ex:
+        _logger.warning("Failed to read rate limits %s: %s", path, ex)
+        return {}
+
+
+def _persist(path, key, state):
+    """Persist the state of a bucket to a file shared by other buckets
+
+    Args:
+        path (str): Path to the file
+        key (str): Rate limit key
+        state (tuple): Tokens and time of the last update
+    """
+    with _files_lock:
+        states = _load(path)
+        states[key] = {"Tokens": state[0], "Time": state[1]}
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump(states, json_file)
+        os.replace(tmp_path, path)
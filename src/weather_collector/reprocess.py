@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Batch reprocessing of recorded responses (see `Archive Directory`) across CPU
+cores. The responses are partitioned by the file their data is saved to, so
+that every file is written by a single process, in the order the responses
+were recorded, and the output is the same as replaying them one by one.
+Every file is rebuilt next to the data and only then swapped in, and existing
+files are only replaced if asked to (their rows that were not recorded, e.g.,
+collected before archiving was turned on, are lost).
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import functools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from weather_collector import __version__
+from weather_collector.archive import decode_record, iter_records, read_lines
+from weather_collector.caller import Collector, get_data_path
+from weather_collector.config import ConfigStore
+from weather_collector.engine import create_jobs, load_locations
+from weather_collector.run import setup_logging
+from weather_collector.writers import close_all, replace_atomically, sync_dir
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+REPORT_INTERVAL = 5
+
+Task = collections.namedtuple(
+    "Task",
+    ["config", "config_dir", "spec_path", "data_dir", "data_path", "records"],
+)
+Task.__doc__ = """Reprocessing task: all the data saved to a file
+
+Args:
+    config (Union[str, dict]): Configuration of the source
+    config_dir (str): Configuration directory of the source
+    spec_path (str): Path to the data file (i.e., data specification)
+    data_dir (str): Data directory of the source
+    data_path (str): File the data is saved to
+    records (tuple): Archive file and record number of each response, in the
+        order they were recorded
+"""
+
+Report = collections.namedtuple(
+    "Report", ["files", "responses", "seconds"]
+)
+Report.__doc__ = """Reprocessing report
+
+Args:
+    files (int): Number of files written
+    responses (int): Number of responses reprocessed (once per file)
+    seconds (float): Elapsed seconds
+"""
+
+
+def create_tasks(jobs, directory=None):
+    """Partition the recorded responses of jobs by the file they are saved to
+
+    Args:
+        jobs (:obj:`list` of :obj:`Job`): Collection jobs
+        directory (str): Archive directory (defaults to the
+            `Archive Directory` of each job's configuration)
+
+    Returns:
+        list: Reprocessing tasks (:obj:`Task`)
+    """
+    tasks = {}
+    for job in jobs:
+        config = job.collector.load_config()
+        archive_dir = config.get("Archive Directory") if directory is None \
+            else directory
+        if archive_dir is None:
+            msg = f"Must set the Archive Directory of {config['Name']}"
+            _logger.error(msg)
+            raise ValueError(msg)
+
+        snapshot = ConfigStore.get_store(job.config_dir).snapshot()
+        # The responses are only decoded by the workers
+        for path, number, output in iter_records(
+                archive_dir, config.get("Name", ""), headers=True):
+            for spec_path, data_config in snapshot.data_specs.items():
+                if output["Cached"] and \
+                        data_config.get("Unchanged", "write") == "skip":
+                    continue
+                data_path = get_data_path(
+                    data_config, output["CallTime"],
+                    config["Data Directory"],
+                )
+                if data_path not in tasks:
+                    tasks[data_path] = Task(
+                        job.collector.config, job.config_dir, spec_path,
+                        config["Data Directory"], data_path, [],
+                    )
+                tasks[data_path].records.append((path, number))
+    return [task._replace(records=tuple(task.records))
+            for task in tasks.values()]
+
+
+@functools.lru_cache(maxsize=4)
+def _read_lines(path):
+    # Consecutive tasks of a worker mostly read the same archive files
+    return read_lines(path)
+
+
+def _swap(built, path, build_dir):
+    """Replace a file (or a source directory of the forecast store) with a
+    rebuilt one
+
+    Args:
+        built (str): Path of the rebuilt file
+        path (str): Path of the file
+        build_dir (str): Build directory the old directory is moved to
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.isdir(built):
+        with replace_atomically(path) as tmp_path:
+            os.replace(built, tmp_path)
+        return
+    if os.path.exists(path):
+        os.replace(path, os.path.join(build_dir, ".old"))
+    os.replace(built, path)
+    sync_dir(os.path.dirname(path))
+
+
+def run_task(task):
+    """Reprocess the responses of a task into a new file and replace its
+    file with it (a failure leaves the file unchanged)
+
+    Args:
+        task (:obj:`Task`): Reprocessing task
+
+    Returns:
+        int: Number of reprocessed responses
+    """
+    collector = Collector(config=task.config)
+    snapshot = ConfigStore.get_store(task.config_dir).snapshot()
+    data_config = snapshot.data_specs[task.spec_path]
+    os.makedirs(task.data_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".reprocess-", dir=task.data_dir)
+    built = os.path.join(build_dir,
+                         os.path.relpath(task.data_path, task.data_dir))
+    try:
+        os.makedirs(os.path.dirname(built), exist_ok=True)
+        for path, number in task.records:
+            _, output = decode_record(_read_lines(path)[number])
+            collector.process_spec(output, data_config, snapshot.units,
+                                   build_dir)
+        close_all()
+        if os.path.exists(built):
+            _swap(built, task.data_path, build_dir)
+        else:
+            _logger.warning("No data to save to %s", task.data_path)
+    finally:
+        close_all()
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return len(task.records)
+
+
+def reprocess(jobs, directory=None, processes=None, overwrite=False):
+    """Reprocess the recorded responses of jobs in parallel. Every file the
+    responses are saved to is rebuilt from scratch by a single process.
+
+    Args:
+        jobs (:obj:`list` of :obj:`Job`): Collection jobs
+        directory (str): Archive directory (defaults to the
+            `Archive Directory` of each job's configuration)
+        processes (int): Number of processes (defaults to the number of CPUs)
+        overwrite (bool): Replace existing files; their rows that were not
+            recorded are lost
+
+    Returns:
+        :obj:`Report`: Reprocessing report
+    """
+    start = time.monotonic()
+    tasks = create_tasks(jobs, directory)
+    existing = [task.data_path for task in tasks
+                if os.path.exists(task.data_path)]
+    if existing and not overwrite:
+        msg = (f"{len(existing)} files already exist (e.g., {existing[0]}); "
+               "reprocessing would replace them")
+        _logger.error(msg)
+        raise FileExistsError(msg)
+    _logger.info("Reprocessing %d files", len(tasks))
+    files, responses, last_report = 0, 0, start
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(run_task, task) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            responses += future.result()
+            files += 1
+            cur_time = time.monotonic()
+            if cur_time - last_report >= REPORT_INTERVAL or \
+                    files == len(tasks):
+                last_report = cur_time
+                _logger.info(
+                    "Reprocessed %d/%d files (%d responses, %.1f "
+                    "responses/s)", files, len(tasks), responses,
+                    responses / max(cur_time - start, 1e-9),
+                )
+    return Report(files, responses, time.monotonic() - start)
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args ([str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Reprocess recorded responses in parallel")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="weather-collector {ver}".
+                format(ver=__version__))
+    parser.add_argument(
+        '-c',
+        '--config',
+        dest="config",
+        help="Configuration file(s)",
+        type=str,
+        nargs="+",
+        required=True)
+    parser.add_argument(
+        '-l',
+        '--locations',
+        dest="locations",
+        help="Locations file; each configuration is reprocessed at every "
+             "location",
+        type=str)
+    parser.add_argument(
+        '-a',
+        '--archive',
+        dest="archive",
+        help="Archive directory (defaults to the Archive Directory of each "
+             "configuration)",
+        type=str)
+    parser.add_argument(
+        '-p',
+        '--processes',
+        dest="processes",
+        help="Number of processes (defaults to the number of CPUs)",
+        type=int)
+    parser.add_argument(
+        '--overwrite',
+        dest="overwrite",
+        help="Replace existing files (their rows that were not recorded are "
+             "lost)",
+        action="store_true")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO)
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG)
+    return parser.parse_args(args)
+
+
+def main(args):
+    """Main entry point allowing external calls
+
+    Args:
+      args ([str]): command line parameter list
+
+    Returns:
+      :obj:`Report`: Reprocessing report
+    """
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+    locations = None
+    if args.locations is not None:
+        locations = load_locations(args.locations)
+    jobs = create_jobs(args.config, locations)
+    report = reprocess(jobs, directory=args.archive,
+                       processes=args.processes, overwrite=args.overwrite)
+    _logger.info(
+        "Reprocessed %d responses into %d files in %.1f s (%.1f "
+        "responses/s)", report.responses, report.files, report.seconds,
+        report.responses / max(report.seconds, 1e-9),
+    )
+    return report
+
+
+def run():
+    """Entry point for console_scripts
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Retries of failed API calls (exponential backoff with jitter) and per-host
+circuit breakers that stop calling a failing API for a while
+"""
+
+import collections
+import email.utils
+import logging
+import random
+import threading
+import time
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+# Status codes of failures that may succeed if retried
+RETRY_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value, cur_time=None):
+    """Parse a `Retry-After` header
+
+    Args:
+        value (str): Seconds or HTTP date
+        cur_time (float): Time (defaults to now)
+
+    Returns:
+        float: Seconds to wait; None if not valid
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    cur_time = time.time() if cur_time is None else cur_time
+    return max(0.0, retry_time - cur_time)
+
+
+class RetryPolicy(
+    collections.namedtuple(
+        "RetryPolicy", ["retries", "backoff", "max_backoff"]
+    )
+):
+    """Retry policy of an API
+
+    Args:
+        retries (int): Maximum number of retries
+        backoff (float): Base delay in seconds; the delay doubles every retry
+        max_backoff (float): Maximum delay in seconds
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config):
+        """Get the retry policy of an API configuration (keys
+        `Number of Retries`, `Retry Backoff` and `Retry Max Backoff`)
+
+        Args:
+            config (dict): API configuration
+
+        Returns:
+            :obj:`RetryPolicy`: Retry policy
+        """
+        return cls(
+            config.get("Number of Retries", 0),
+            config.get("Retry Backoff", 1),
+            config.get("Retry Max Backoff", 60),
+        )
+
+    def delay(self, attempt, retry_after=None):
+        """Get the delay before retrying
+
+        Args:
+            attempt (int): Number of the failed attempt (starting at 0)
+            retry_after (float): Seconds requested by the API (`Retry-After`)
+
+        Returns:
+            float: Seconds to wait; None if the call must not be retried
+        """
+        if attempt >= self.retries:
+            return None
+        if retry_after is not None:
+            # Give up if the API asks to wait longer than allowed
+            return retry_after if retry_after <= self.max_backoff else None
+        # Full jitter
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt)
+        )
+
+
+class CircuitBreaker:
+    """Circuit breaker of a host. After `threshold` consecutive failures the
+    circuit opens and calls are not made for `timeout` seconds. Then, a single
+    call is let through (half-open): the circuit closes if it succeeds and
+    opens again if it fails.
+
+    Args:
+        threshold (int): Consecutive failures that open the circuit
+        timeout (float): Seconds the circuit stays open
+
+    Attributes:
+        threshold (int): Consecutive failures that open the circuit
+        timeout (float): Seconds the circuit stays open
+        state (str): "closed", "open" or "half-open"
+        failures (int): Consecutive failures
+    """
+
+    _breakers = {}
+    _breakers_lock = threading.Lock()
+
+    def __init__(self, threshold=5, timeout=60):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check if a call is allowed
+
+        Returns:
+            bool: True if the call may be made
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and \
+                    time.monotonic() - self._opened >= self.timeout:
+                # Let a single probe through
+                self.state = "half-open"
+                return True
+            return False
+
+    def record_success(self):
+        """Record a successful call"""
+        with self._lock:
+            if self.state != "closed":
+                _logger.info("Circuit closed")
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        """Record a failed call"""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or (
+                self.state == "closed" and self.failures >= self.threshold
+            ):
+                _logger.warning(
+                    "Circuit opened after %d failures", self.failures
+                )
+                self.state = "open"
+                self._opened = time.monotonic()
+
+    @classmethod
+    def get_breaker(cls, host, config=None):
+        """Get the circuit breaker of a host shared by the process. The
+        thresholds are set by the API configuration (keys
+        `Circuit Breaker Threshold` and `Circuit Breaker Timeout`).
+
+        Args:
+            host (str): Host
+            config (dict): API configuration
+
+        Returns:
+            :obj:`CircuitBreaker`: Circuit breaker
+        """
+        config = {} if config is None else config
+        with cls._breakers_lock:
+            if host not in cls._breakers:
+                cls._breakers[host] = cls()
+            breaker = cls._breakers[host]
+        breaker.threshold = config.get("Circuit Breaker Threshold", 5)
+        breaker.timeout = config.get("Circuit Breaker Timeout", 60)
+        return breaker
@@ -4,15 +4,29 @@ Example runner for weather collector
 """
 
 import argparse
-import json
-import os
+import signal
 import sys
+import threading
 import time
 import logging
 
 from weather_collector import __version__
-from weather_collector.caller import Collector
-from weather_collector.runner import SynchronousEvent
+from weather_collector.compaction import compact_jobs
+from weather_collector.engine import (
+    AsyncEngine,
+    collect_job,
+    create_jobs,
+    load_locations,
+    replay_job,
+    DEFAULT_MAX_CONCURRENCY,
+)
+from weather_collector.metrics import (
+    METRICS_INTERVAL,
+    start_http_server,
+    write_textfile,
+)
+from weather_collector.runner import Scheduler
+from weather_collector.writers import FLUSH_INTERVAL, close_all, get_appender
 
 __author__ = "Matt Ellis"
 __copyright__ = "Matt Ellis"
@@ -41,9 +55,76 @@ def parse_args(args):
         '-c',
         '--config',
         dest="config",
-        help="Configuration file",
+        help="Configuration file(s)",
         type=str,
+        nargs="+",
         required=True)
+    parser.add_argument(
+        '-m',
+        '--mode',
+        dest="mode",
+        help="sync: collect one source; async: collect many sources "
+             "concurrently",
+        choices=["sync", "async"],
+        default="sync")
+    parser.add_argument(
+        '-l',
+        '--locations',
+        dest="locations",
+        help="Locations file; each configuration is collected at every "
+             "location",
+        type=str)
+    parser.add_argument(
+        '--workers',
+        dest="workers",
+        help="Number of collection workers (sync mode only)",
+        type=int,
+        default=4)
+    parser.add_argument(
+        '--jitter',
+        dest="jitter",
+        help="Maximum random offset in seconds of each source's collection "
+             "time (sync mode only)",
+        type=float,
+        default=0)
+    parser.add_argument(
+        '--overrun',
+        dest="overrun",
+        help="Action if a collection is due while the previous one is still "
+             "running (sync mode only)",
+        choices=Scheduler.OVERRUN_POLICIES,
+        default="skip")
+    parser.add_argument(
+        '--max-concurrency',
+        dest="max_concurrency",
+        help="Maximum number of concurrent API calls (async mode only)",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument(
+        '--metrics-port',
+        dest="metrics_port",
+        help="Serve metrics on http://localhost:<port>/metrics",
+        type=int)
+    parser.add_argument(
+        '--metrics-file',
+        dest="metrics_file",
+        help="Write metrics to this file every 15 seconds (e.g., for the "
+             "node exporter's textfile collector)",
+        type=str)
+    parser.add_argument(
+        '--compact-interval',
+        dest="compact_interval",
+        help="Compact the files of closed days into segments every this "
+             "many minutes",
+        type=float)
+    parser.add_argument(
+        '--replay',
+        dest="replay",
+        help="Replay the responses recorded to the Archive Directory of each "
+             "configuration (or to this directory) and exit",
+        nargs="?",
+        const="",
+        type=str)
     parser.add_argument(
         "-v",
         "--verbose",
@@ -72,6 +153,23 @@ def setup_logging(loglevel):
                         format=logformat, datefmt="%Y-%m-%d %H:%M:%S")
 
 
+def handle_sigterm(runner):
+    """Stop the runner and flush all buffered data on SIGTERM
+
+    Args:
+      runner (Union[Scheduler, AsyncEngine]): event runner
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def stop(signum, _):
+        _logger.info("Received signal %d; stopping", signum)
+        runner.stop()
+        close_all()
+
+    signal.signal(signal.SIGTERM, stop)
+
+
 def main(args):
     """Main entry point allowing external calls
 
@@ -79,25 +177,51 @@ def main(args):
       args ([str]): command line parameter list
 
     Returns:
-      SynchronousEvent: event runner
+      Union[Scheduler, AsyncEngine]: event runner (None if replaying)
     """
     args = parse_args(args)
     setup_logging(args.loglevel)
     _logger.debug("Starting weather collector...")
-    with open(args.config, 'r') as config_file:
-        config = json.load(config_file)
-    config_dir = os.path.dirname(args.config)
-    collector = Collector(config=config)
-    config = collector.load_config()
-
-    def do_collect():
-        _logger.debug('Running collector')
-        collector.collect(config_dir=config_dir,
-                          data_dir=config['Data Directory'])
-
-    event = SynchronousEvent(config['Call Frequency']*60, do_collect)
-    event.start()
-    return event
+    locations = None
+    if args.locations is not None:
+        locations = load_locations(args.locations)
+    jobs = create_jobs(args.config, locations)
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+    if args.replay is not None:
+        for job in jobs:
+            replay_job(job, directory=args.replay or None)
+        close_all()
+        if args.metrics_file is not None:
+            write_textfile(args.metrics_file)
+        return None
+
+    if args.mode == "async":
+        engine = AsyncEngine(jobs, max_concurrency=args.max_concurrency)
+        engine.start()
+        engine.add_housekeeping(FLUSH_INTERVAL, get_appender().flush_expired)
+        if args.metrics_file is not None:
+            engine.add_housekeeping(METRICS_INTERVAL, write_textfile,
+                                    args.metrics_file)
+        if args.compact_interval is not None:
+            engine.add_housekeeping(args.compact_interval*60, compact_jobs,
+                                    jobs)
+        handle_sigterm(engine)
+        return engine
+
+    scheduler = Scheduler(workers=args.workers, overrun=args.overrun)
+    for job in jobs:
+        config = job.collector.load_config()
+        scheduler.add_job(config['Call Frequency']*60, collect_job, job,
+                          jitter=args.jitter)
+    scheduler.add_job(FLUSH_INTERVAL, get_appender().flush_expired)
+    if args.metrics_file is not None:
+        scheduler.add_job(METRICS_INTERVAL, write_textfile, args.metrics_file)
+    if args.compact_interval is not None:
+        scheduler.add_job(args.compact_interval*60, compact_jobs, jobs)
+    scheduler.start()
+    handle_sigterm(scheduler)
+    return scheduler
 
 
 def run():
@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 """
-Generic runner class responsible for running a function periodically
+Generic runner classes responsible for running functions periodically
 """
+import concurrent.futures
+import heapq
+import itertools
 import logging
+import math
+import random
 import time
-from threading import Event, Thread
+from threading import Condition, Event, Thread
+
+from weather_collector.metrics import OVERRUNS, SCHEDULER_LAG
+from weather_collector.writers import flush_all
 
 __author__ = "Matt Ellis"
 __copyright__ = "Matt Ellis"
@@ -13,6 +21,24 @@ __license__ = "mit"
 _logger = logging.getLogger(__name__)
 
 
+def get_job_name(function, args=()):
+    """Get the name of a job used by the metrics
+
+    Args:
+        function: Callable function
+        args (tuple): Positional arguments for function
+
+    Returns:
+        str: Name of the function, followed by the name of the source if the
+        first argument is a collection job
+    """
+    name = getattr(function, "__qualname__", repr(function))
+    if args and hasattr(args[0], "collector"):
+        config = args[0].collector.load_config()
+        name += " " + config.get("Name", "")
+    return name
+
+
 class SynchronousEvent:
     """
     Repeat an event `function` every `interval` seconds.
@@ -42,7 +68,13 @@ class SynchronousEvent:
         self.start_time = None
 
     def _target(self):
-        while not self.event.wait(self._time):
+        while True:
+            delay = self._time
+            target = time.time() + delay
+            if self.event.wait(delay):
+                break
+            SCHEDULER_LAG.observe(time.time() - target,
+                                  job=get_job_name(self.function))
             self.function(*self.args, **self.kwargs)
 
     @property
@@ -60,8 +92,198 @@ class SynchronousEvent:
         self.thread.start()
 
     def stop(self):
-        """Terminate execution of event"""
+        """Terminate execution of event; flushes buffered data"""
         self.event.set()
         self.thread.join()
         self.thread = None
         self.event = None
+        flush_all()
+
+
+class ScheduledJob:
+    """
+    Periodic job of a :obj:`Scheduler`. The job fires at the same wall-clock
+    aligned times as a :obj:`SynchronousEvent` with the same interval, shifted
+    by a fixed random offset of up to `jitter` seconds.
+
+    Args:
+        interval (float): Interval in seconds
+        function: Callable function
+        args (tuple): Positional arguments for function
+        kwargs (dict): Keyword arguments for function
+        jitter (float): Maximum offset in seconds
+
+    Attributes:
+        interval (float): Interval in seconds
+        function: Callable function
+        args (tuple): Positional arguments for function
+        kwargs (dict): Keyword arguments for function
+        offset (float): Offset in seconds from the aligned times
+        start_time (float): time of the first run
+        next_time (float): time of the next run
+        running (bool): True if the job is running
+        pending (bool): True if a coalesced run is pending
+        runs (int): Number of runs
+        overruns (int): Number of times the job was due while running
+        name (str): Name of the job used by the metrics
+    """
+    def __init__(self, interval, function, args=(), kwargs=None, jitter=0):
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.kwargs = {} if kwargs is None else kwargs
+        self.name = get_job_name(function, args)
+        self.offset = random.uniform(0, min(jitter, interval)) if jitter \
+            else 0
+        self.start_time = None
+        self.next_time = None
+        self.running = False
+        self.pending = False
+        self.runs = 0
+        self.overruns = 0
+
+    def schedule(self, cur_time):
+        """Schedule the next run after a time
+
+        Args:
+            cur_time (float): Time
+
+        Returns:
+            float: time of the next run
+        """
+        if self.start_time is None:
+            self.start_time = (cur_time - cur_time % self.interval
+                               + self.interval + self.offset)
+            self.next_time = self.start_time
+        else:
+            # Tolerance guards against firing twice due to rounding
+            periods = math.floor(
+                (cur_time - self.start_time + 1e-6) / self.interval) + 1
+            self.next_time = self.start_time + periods * self.interval
+        return self.next_time
+
+
+class Scheduler:
+    """
+    Run many periodic jobs from a single thread. The next run time of each job
+    is kept in a heap and due jobs are dispatched to a bounded pool of
+    workers. If a job is still running when it is due again (an overrun), the
+    run is either skipped or coalesced into a single run once the current run
+    finishes.
+
+    Args:
+        workers (int): Number of workers
+        overrun (str): Overrun policy: "skip" or "coalesce"
+
+    Attributes:
+        workers (int): Number of workers
+        overrun (str): Overrun policy
+        jobs (:obj:`list` of :obj:`ScheduledJob`): Scheduled jobs
+        thread (:obj:`Thread`): Scheduler thread
+    """
+    OVERRUN_POLICIES = ("skip", "coalesce")
+
+    def __init__(self, workers=4, overrun="skip"):
+        if overrun not in self.OVERRUN_POLICIES:
+            msg = f"Unknown overrun policy {overrun}"
+            _logger.error(msg)
+            raise ValueError(msg)
+        self.workers = workers
+        self.overrun = overrun
+        self.jobs = []
+        self.thread = None
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._stopped = False
+        self._pool = None
+
+    def add_job(self, interval, function, *args, jitter=0, **kwargs):
+        """Add a periodic job
+
+        Args:
+            interval (float): Interval in seconds
+            function: Callable function
+            *args: Positional arguments for function
+            jitter (float): Maximum offset in seconds of the job
+            **kwargs: Keyword arguments function
+
+        Returns:
+            :obj:`ScheduledJob`: The job
+        """
+        job = ScheduledJob(interval, function, args, kwargs, jitter=jitter)
+        with self._condition:
+            self.jobs.append(job)
+            self._push(job, time.time())
+            self._condition.notify()
+        return job
+
+    def _push(self, job, cur_time):
+        heapq.heappush(
+            self._heap, (job.schedule(cur_time), next(self._counter), job)
+        )
+
+    def _target(self):
+        with self._condition:
+            while not self._stopped:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                target, _, job = heapq.heappop(self._heap)
+                SCHEDULER_LAG.observe(time.time() - target, job=job.name)
+                self._dispatch(job)
+                self._push(job, time.time())
+
+    def _dispatch(self, job):
+        if not job.running:
+            job.running = True
+            self._pool.submit(self._run, job)
+            return
+        job.overruns += 1
+        OVERRUNS.inc(job=job.name)
+        _logger.warning("Job %s is still running; %s run", job.name,
+                        "skipping" if self.overrun == "skip" else
+                        "coalescing")
+        if self.overrun == "coalesce":
+            job.pending = True
+
+    def _run(self, job):
+        while True:
+            try:
+                job.function(*job.args, **job.kwargs)
+            except Exception as unknown_ex:  # pylint: disable=broad-except
+                _logger.exception(unknown_ex)
+            with self._condition:
+                job.runs += 1
+                if not job.pending or self._stopped:
+                    job.pending = False
+                    job.running = False
+                    return
+                job.pending = False
+
+    def start(self):
+        """Start the execution of the jobs"""
+        self._stopped = False
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="scheduler"
+            )
+        if self.thread is None:
+            self.thread = Thread(target=self._target)
+        self.thread.start()
+
+    def stop(self):
+        """Terminate execution of the jobs; waits for running jobs and
+        flushes buffered data"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.thread.join()
+        self.thread = None
+        self._pool.shutdown()
+        self._pool = None
+        flush_all()
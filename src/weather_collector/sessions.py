@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Long-lived HTTP sessions shared by all callers of the process. A session is
+kept per host so that connections are kept alive and re-used between calls.
+"""
+
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_host(url):
+    """Get the host of a URL
+
+    Args:
+        url (str): URL
+
+    Returns:
+        str: Scheme and network location of the URL (e.g.,
+        `https://api.openweathermap.org`)
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url, pool_size=DEFAULT_POOL_SIZE):
+    """Get the session of the host of a URL
+
+    Args:
+        url (str): URL
+        pool_size (int): Maximum number of connections kept alive to the host
+
+    Returns:
+        :obj:`requests.Session`: Session of the host
+    """
+    host = get_host(url)
+    with _sessions_lock:
+        session, cur_size = _sessions.get(host, (None, 0))
+        if session is None:
+            _logger.debug("Creating session for %s", host)
+            session = requests.Session()
+        if pool_size > cur_size:
+            # Only grow the pool; sources sharing a host share the pool
+            old = session.adapters.get(host + "/")
+            session.mount(
+                host + "/",
+                HTTPAdapter(pool_connections=1, pool_maxsize=pool_size),
+            )
+            if old is not None:
+                # Idle connections are closed now and the connections in use
+                # when they are released
+                old.close()
+            cur_size = pool_size
+        _sessions[host] = (session, cur_size)
+        return session
+
+
+def get_timeout(config):
+    """Get the timeout of a source
+
+    Args:
+        config (dict): API configuration (i.e., `config.json`)
+
+    Returns:
+        tuple: Connect and read timeouts in seconds
+    """
+    return (
+        config.get("Connect Timeout", DEFAULT_CONNECT_TIMEOUT),
+        config.get("Read Timeout", DEFAULT_READ_TIMEOUT),
+    )
+
+
+def close_sessions():
+    """Close all sessions of the process"""
+    with _sessions_lock:
+        for session, _ in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,648 @@
+# -*- coding: utf-8 -*-
+"""
+Time-partitioned forecast store. Every save of a source (i.e., a forecast
+vintage) is appended to the segment file of its issue day and indexed by its
+issue time and the range of its valid times, so that queries only read the
+vintages they need.
+
+Consecutive vintages mostly overlap (e.g., 47 of the 48 hours of an hourly
+forecast), so a vintage may be stored as a delta against the previous vintage
+of its source: the valid times it shares with it and only the cells that
+changed. Every `keyframe_interval` vintages, and at the start of every
+segment, a full vintage (a keyframe) is stored instead, so that reading a
+vintage replays at most `keyframe_interval - 1` deltas.
+
+Layout of a store::
+
+    <root>/<source>/<YYYY-MM-DD>.jsonl.gz   segments (one gzip member per
+                                            vintage)
+    <root>/<source>/index.jsonl             index (one line per vintage)
+"""
+
+import collections
+import datetime as dt
+import gzip
+import json
+import logging
+import os
+import threading
+
+import pytz
+
+from weather_collector.writers import DEFAULT_POLICY, Table, register_backend
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.jsonl"
+SEGMENT_SUFFIX = ".jsonl.gz"
+KEYFRAME_INTERVAL = 24
+
+IndexEntry = collections.namedtuple(
+    "IndexEntry",
+    ["segment", "offset", "length", "issued", "valid_from", "valid_to",
+     "kind"],
+)
+IndexEntry.__doc__ = """Index entry of a vintage
+
+Args:
+    segment (str): Name of the segment file
+    offset (int): Offset of the vintage in the segment file
+    length (int): Length of the vintage in the segment file
+    issued (float): Issue time (POSIX timestamp)
+    valid_from (float): First valid time (POSIX timestamp)
+    valid_to (float): Last valid time (POSIX timestamp)
+    kind (str): `key` for a full vintage or `delta` for a delta against the
+        previous vintage
+"""
+
+
+def to_timestamp(value):
+    """Convert a date/time to a POSIX timestamp (naive date/times are UTC)
+
+    Args:
+        value (:obj:`datetime.datetime`): Date/time
+
+    Returns:
+        float: Timestamp
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=pytz.utc)
+    return value.timestamp()
+
+
+def _is_datetime_column(values):
+    present = [val for val in values if val is not None]
+    return bool(present) and all(
+        isinstance(val, dt.datetime) for val in present
+    )
+
+
+def encode_columns(table):
+    """Encode the columns of a table for a segment (date/times are ISO 8601
+    strings)
+
+    Args:
+        table (:obj:`Table`): Table
+
+    Returns:
+        tuple: Encoded columns (dict) and names of the date/time columns
+    """
+    columns, datetimes = {}, []
+    for column, values in table.columns.items():
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(table.index)
+        if _is_datetime_column(values):
+            values = [None if val is None else val.isoformat()
+                      for val in values]
+            datetimes.append(column)
+        columns[column] = list(values)
+    return columns, datetimes
+
+
+def decode_columns(columns, datetimes):
+    """Decode the columns of a segment (see :func:`encode_columns`)
+
+    Args:
+        columns (dict): Encoded columns
+        datetimes (list): Names of the date/time columns
+
+    Returns:
+        dict: Columns
+    """
+    for column in datetimes:
+        columns[column] = [
+            None if val is None else dt.datetime.fromisoformat(val)
+            for val in columns[column]
+        ]
+    return columns
+
+
+def _same(value, other):
+    if type(value) is not type(other):  # pylint: disable=unidiomatic-typecheck
+        return False
+    # NaN (i.e., missing values) are the same
+    return value == other or (value != value and other != other)
+
+
+def encode_delta(base, vintage):
+    """Encode a vintage as a delta against a base vintage. Vintages are dicts
+    with the keys `Index` (ISO 8601 valid times), `Columns` and `Datetimes`
+    (see :func:`encode_columns`).
+
+    The rows of the vintage are encoded as ranges of the rows of the base
+    vintage with the same valid times (`[start, stop]`) and new valid times;
+    only the cells that are not in the base vintage are stored (`Rows` and
+    `Values`, or `Fill` if all rows changed to the same value).
+
+    Args:
+        base (dict): Base vintage
+        vintage (dict): Vintage
+
+    Returns:
+        dict: Delta
+    """
+    positions = {val: i for i, val in enumerate(base["Index"])}
+    index, rows = [], []
+    for val in vintage["Index"]:
+        pos = positions.get(val)
+        rows.append(pos)
+        if pos is None:
+            index.append(val)
+        elif index and isinstance(index[-1], list) and index[-1][1] == pos:
+            index[-1][1] = pos + 1
+        else:
+            index.append([pos, pos + 1])
+
+    base_datetimes = set(base["Datetimes"])
+    changes = {}
+    for column, values in vintage["Columns"].items():
+        base_values = base["Columns"].get(column)
+        if base_values is None or (column in base_datetimes) != \
+                (column in vintage["Datetimes"]):
+            changed = list(range(len(values)))
+        else:
+            changed = [
+                i for i, pos in enumerate(rows)
+                if pos is None or not _same(values[i], base_values[pos])
+            ]
+        if not changed:
+            continue
+        if len(changed) == len(values):
+            if all(_same(val, values[0]) for val in values):
+                changes[column] = {"Fill": values[0]}
+            else:
+                changes[column] = {"Values": values}
+        else:
+            changes[column] = {"Rows": changed,
+                               "Values": [values[i] for i in changed]}
+    return {
+        "Index": index,
+        "Names": list(vintage["Columns"]),
+        "Changes": changes,
+        "Datetimes": vintage["Datetimes"],
+    }
+
+
+def decode_delta(base, delta):
+    """Decode a delta against its base vintage (see :func:`encode_delta`)
+
+    Args:
+        base (dict): Base vintage
+        delta (dict): Delta
+
+    Returns:
+        dict: Vintage
+    """
+    index, rows = [], []
+    for val in delta["Index"]:
+        if isinstance(val, list):
+            index.extend(base["Index"][val[0]:val[1]])
+            rows.extend(range(val[0], val[1]))
+        else:
+            index.append(val)
+            rows.append(None)
+
+    columns = {}
+    for column in delta["Names"]:
+        change = delta["Changes"].get(column, {})
+        if "Fill" in change:
+            columns[column] = [change["Fill"]] * len(index)
+        elif change and "Rows" not in change:
+            columns[column] = change["Values"]
+        else:
+            base_values = base["Columns"][column]
+            values = [None if pos is None else base_values[pos]
+                      for pos in rows]
+            for i, val in zip(change.get("Rows", ()),
+                              change.get("Values", ())):
+                values[i] = val
+            columns[column] = values
+    return {"Index": index, "Columns": columns,
+            "Datetimes": delta["Datetimes"]}
+
+
+class ForecastStore:
+    """Time-partitioned store of forecast vintages
+
+    Args:
+        root (str): Root directory of the store
+
+    Attributes:
+        root (str): Root directory of the store
+    """
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.RLock()
+        self._indexes = {}
+        self._last = {}
+
+    def sources(self):
+        """Get the sources of the store
+
+        Returns:
+            list: Names of the sources
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, INDEX_FILE))
+        )
+
+    def write(self, source, issued, table, keyframe_interval=1):
+        """Write a vintage of a source
+
+        Args:
+            source (str): Source
+            issued (:obj:`datetime.datetime`): Issue time (i.e., call time)
+            table (:obj:`Table`): Data; the index is the valid times
+            keyframe_interval (int): Number of vintages between full
+                vintages; the vintages in between are stored as deltas
+                (1 stores every vintage in full)
+        """
+        if len(table) == 0:
+            return
+        columns, datetimes = encode_columns(table)
+        vintage = {
+            "Index": [val.isoformat() for val in table.index],
+            "Columns": columns,
+            "Datetimes": datetimes,
+        }
+        valid = [to_timestamp(val) for val in table.index]
+        self._append(source, issued, vintage, min(valid), max(valid),
+                     keyframe_interval)
+
+    def _append(self, source, issued, vintage, valid_from, valid_to,
+                keyframe_interval=1):
+        """Append a vintage to the segment of its issue day and index it
+
+        Args:
+            source (str): Source
+            issued (:obj:`datetime.datetime`): Issue time
+            vintage (dict): Vintage (see :func:`encode_delta`)
+            valid_from (float): First valid time
+            valid_to (float): Last valid time
+            keyframe_interval (int): Number of vintages between full
+                vintages
+        """
+        source_dir = os.path.join(self.root, source)
+        segment = issued.astimezone(pytz.utc).strftime("%Y-%m-%d") \
+            + SEGMENT_SUFFIX
+        with self._lock:
+            record = dict(vintage, Kind="key", Issued=issued.isoformat())
+            text = json.dumps(record)
+            last = self._get_last(source) if keyframe_interval > 1 \
+                else None
+            since_key = 0
+            if last is not None and last[0].segment == segment and \
+                    last[2] + 1 < keyframe_interval:
+                delta = dict(encode_delta(last[1], vintage), Kind="delta",
+                             Issued=issued.isoformat())
+                delta_text = json.dumps(delta)
+                if len(delta_text) < len(text):
+                    record, text, since_key = delta, delta_text, last[2] + 1
+            data = gzip.compress(text.encode())
+
+            os.makedirs(source_dir, exist_ok=True)
+            # The vintage is written before it is indexed; a crash in between
+            # leaves an unindexed (i.e., invisible) vintage
+            with open(os.path.join(source_dir, segment), "ab") as seg_file:
+                offset = seg_file.tell()
+                seg_file.write(data)
+            entry = {
+                "Segment": segment,
+                "Offset": offset,
+                "Length": len(data),
+                "Issued": to_timestamp(issued),
+                "ValidFrom": valid_from,
+                "ValidTo": valid_to,
+                "Kind": record["Kind"],
+            }
+            line = (json.dumps(entry) + "\n").encode()
+            with open(os.path.join(source_dir, INDEX_FILE), "a+b") as index:
+                if index.tell() > 0:
+                    # Terminate a line left partially written by a crash
+                    index.seek(-1, os.SEEK_END)
+                    if index.read(1) != b"\n":
+                        line = b"\n" + line
+                index.write(line)
+
+            entries = self.read_index(source)
+            if entries and entries[-1].offset == offset and \
+                    entries[-1].segment == segment:
+                self._last[source] = (entries[-1], vintage, since_key,
+                                      len(entries))
+
+    def _get_last(self, source):
+        """Get the last vintage of a source (the base of the next delta)
+
+        Args:
+            source (str): Source
+
+        Returns:
+            tuple: Index entry, vintage and number of deltas since the last
+            full vintage, or None if the source has no vintages
+        """
+        entries = self.read_index(source)
+        if not entries:
+            return None
+        last = self._last.get(source)
+        if last is None or last[3] != len(entries) or \
+                last[0] != entries[-1]:
+            # Written by another process (or never read)
+            position = len(entries) - 1
+            _, vintage = next(self._iter_records(source, entries,
+                                                 [position]))
+            since_key = 0
+            while entries[position - since_key].kind != "key":
+                since_key += 1
+            last = (entries[-1], vintage, since_key, len(entries))
+            self._last[source] = last
+        return last
+
+    def read_index(self, source):
+        """Read the index of a source. The index is kept in memory and only
+        the lines appended since it was last read are read.
+
+        Args:
+            source (str): Source
+
+        Returns:
+            list: Index entries (:obj:`IndexEntry`) in the order the vintages
+            were written
+        """
+        path = os.path.join(self.root, source, INDEX_FILE)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            inode, size, entries = self._indexes.get(source, (None, 0, []))
+            if inode != stat.st_ino or stat.st_size < size:
+                # The index was replaced
+                size, entries = 0, []
+            if stat.st_size > size:
+                entries = list(entries)
+                with open(path, "rb") as index:
+                    index.seek(size)
+                    for line in index:
+                        if not line.endswith(b"\n"):
+                            break  # Line being written
+                        size += len(line)
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            _logger.warning("Invalid index entry in %s", path)
+                            continue
+                        entries.append(IndexEntry(
+                            entry["Segment"], entry["Offset"],
+                            entry["Length"], entry["Issued"],
+                            entry["ValidFrom"], entry["ValidTo"],
+                            entry.get("Kind", "key"),
+                        ))
+                self._indexes[source] = (stat.st_ino, size, entries)
+            return entries
+
+    def read_record(self, source, entry, seg_file=None):
+        """Read the record of a vintage
+
+        Args:
+            source (str): Source
+            entry (:obj:`IndexEntry`): Index entry of the vintage
+            seg_file: Open segment file (opened if not set)
+
+        Returns:
+            dict: Record
+        """
+        if seg_file is None:
+            path = os.path.join(self.root, source, entry.segment)
+            with open(path, "rb") as cur_file:
+                return self.read_record(source, entry, cur_file)
+        seg_file.seek(entry.offset)
+        return json.loads(gzip.decompress(seg_file.read(entry.length)))
+
+    def read_vintage(self, source, entry):
+        """Read a vintage
+
+        Args:
+            source (str): Source
+            entry (:obj:`IndexEntry`): Index entry of the vintage
+
+        Returns:
+            :obj:`Table`: Data of the vintage
+        """
+        for _, table in self.iter_vintages(source, [entry]):
+            return table
+        msg = f"Vintage {entry} is not in the index of {source}"
+        _logger.error(msg)
+        raise KeyError(msg)
+
+    def select(self, source, valid_from=None, valid_to=None,
+               issued_between=None):
+        """Select the vintages of a source by valid and issue time
+
+        Args:
+            source (str): Source
+            valid_from (:obj:`datetime.datetime`): First valid time
+            valid_to (:obj:`datetime.datetime`): Last valid time
+            issued_between (tuple): First and last issue times (either may
+                be None)
+
+        Returns:
+            list: Index entries (:obj:`IndexEntry`) of the vintages
+        """
+        low = -float("inf") if valid_from is None \
+            else to_timestamp(valid_from)
+        high = float("inf") if valid_to is None else to_timestamp(valid_to)
+        first, last = (None, None) if issued_between is None \
+            else issued_between
+        first = -float("inf") if first is None else to_timestamp(first)
+        last = float("inf") if last is None else to_timestamp(last)
+        return [
+            entry for entry in self.read_index(source)
+            if entry.valid_to >= low and entry.valid_from <= high
+            and first <= entry.issued <= last
+        ]
+
+    def query(self, source, valid_from=None, valid_to=None,
+              issued_between=None):
+        """Query the forecasts of a source. Only the vintages that match are
+        read.
+
+        Args:
+            source (str): Source
+            valid_from (:obj:`datetime.datetime`): First valid time
+            valid_to (:obj:`datetime.datetime`): Last valid time
+            issued_between (tuple): First and last issue times (either may
+                be None)
+
+        Returns:
+            :obj:`Table`: Forecasts ordered by issue time; the index is the
+            valid times and the `Issued` column is the issue time (UTC)
+        """
+        entries = self.select(source, valid_from, valid_to, issued_between)
+        low = -float("inf") if valid_from is None \
+            else to_timestamp(valid_from)
+        high = float("inf") if valid_to is None else to_timestamp(valid_to)
+
+        index, issued, rows, names = [], [], [], {}
+        for entry, vintage in self.iter_vintages(source, entries):
+            cur_issued = dt.datetime.fromtimestamp(entry.issued, pytz.utc)
+            names.update(dict.fromkeys(vintage.columns))
+            for i, valid in enumerate(vintage.index):
+                if low <= to_timestamp(valid) <= high:
+                    index.append(valid)
+                    issued.append(cur_issued)
+                    rows.append({name: values[i] for name, values
+                                 in vintage.columns.items()})
+
+        columns = {"Issued": issued}
+        for name in names:
+            columns[name] = [row.get(name) for row in rows]
+        return Table(index, columns)
+
+    def iter_vintages(self, source, entries):
+        """Read vintages (deltas are decoded against the previous vintages)
+
+        Args:
+            source (str): Source
+            entries (list): Index entries (:obj:`IndexEntry`)
+
+        Yields:
+            tuple: Index entry and data (:obj:`Table`) of each vintage
+        """
+        index = self.read_index(source)
+        positions = {(entry.segment, entry.offset): i
+                     for i, entry in enumerate(index)}
+        selected = [positions[(entry.segment, entry.offset)]
+                    for entry in entries
+                    if (entry.segment, entry.offset) in positions]
+        for position, vintage in self._iter_records(source, index,
+                                                    selected):
+            yield index[position], Table(
+                [dt.datetime.fromisoformat(val) for val in vintage["Index"]],
+                decode_columns(dict(vintage["Columns"]),
+                               vintage["Datetimes"]),
+            )
+
+    def _iter_records(self, source, index, positions):
+        """Read the (encoded) vintages at positions of the index, replaying
+        the deltas from the previous full vintage. Consecutive positions
+        re-use the previous vintage and each segment file is opened once.
+
+        Args:
+            source (str): Source
+            index (list): Index entries (:obj:`IndexEntry`) of the source
+            positions (list): Positions in the index
+
+        Yields:
+            tuple: Position and vintage (see :func:`encode_delta`)
+        """
+        files = {}
+        last_position, last_vintage = None, None
+        try:
+            for position in positions:
+                start = position
+                while index[start].kind != "key" and start != last_position:
+                    start -= 1
+                    if start < 0:
+                        msg = f"Vintage {index[position]} of {source} has " \
+                              "no full vintage"
+                        _logger.error(msg)
+                        raise ValueError(msg)
+                vintage = last_vintage if start == last_position else None
+                if start == last_position:
+                    start += 1
+                for cur in range(start, position + 1):
+                    entry = index[cur]
+                    if entry.segment not in files:
+                        # pylint: disable=consider-using-with
+                        files[entry.segment] = open(
+                            os.path.join(self.root, source, entry.segment),
+                            "rb",
+                        )
+                    record = self.read_record(source, entry,
+                                              files[entry.segment])
+                    if record.get("Kind", "key") != "key":
+                        record = decode_delta(vintage, record)
+                    vintage = record
+                last_position, last_vintage = position, vintage
+                yield position, vintage
+        finally:
+            for seg_file in files.values():
+                seg_file.close()
+
+    @classmethod
+    def get_store(cls, root):
+        """Get the store of a directory shared by the process
+
+        Args:
+            root (str): Root directory of the store
+
+        Returns:
+            :obj:`ForecastStore`: Store
+        """
+        with cls._stores_lock:
+            if root not in cls._stores:
+                cls._stores[root] = cls(root)
+            return cls._stores[root]
+
+
+class StoreBackend:
+    """Save data to the forecast store of the data directory. The file name
+    of the data file (`Filename`) is the name of the source in the store.
+
+    Args:
+        keyframe_interval (int): Number of vintages between full vintages
+            (see :meth:`ForecastStore.write`)
+
+    Attributes:
+        keyframe_interval (int): Number of vintages between full vintages
+    """
+
+    def __init__(self, keyframe_interval=1):
+        self.keyframe_interval = keyframe_interval
+
+    @staticmethod
+    def check_spec(spec):
+        """Check that the `Filename` of a data file has no date codes (a
+        source is partitioned by issue day by the store; a date code would
+        create a source every call)
+
+        Args:
+            spec (dict): Data file specification
+        """
+        if "#<date>" in spec["Filename"]:
+            msg = (f"Filename {spec['Filename']} of the forecast store must "
+                   "not have date codes (it is the name of the source)")
+            _logger.error(msg)
+            raise ValueError(msg)
+
+    def save(self, data, path, append, policy=DEFAULT_POLICY, issued=None):
+        """Save data
+
+        Args:
+            data (:obj:`Table`): Data
+            path (str): Path of the source (i.e., `<root>/<source>`)
+            append (bool): Not used (vintages are always added)
+            policy (:obj:`BufferPolicy`): Not used
+            issued (:obj:`datetime.datetime`): Issue time (defaults to now)
+        """
+        # pylint: disable=unused-argument
+        issued = dt.datetime.now(pytz.utc) if issued is None else issued
+        store = ForecastStore.get_store(os.path.dirname(path))
+        store.write(os.path.basename(path), issued, data,
+                    keyframe_interval=self.keyframe_interval)
+
+
+register_backend("store", StoreBackend())
+register_backend("store-delta",
+                 StoreBackend(keyframe_interval=KEYFRAME_INTERVAL))
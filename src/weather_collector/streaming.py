@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming JSON decoding of API responses. Only the sub-trees referenced by
+the `Data` keys of the data files are decoded; the rest of the response is
+skipped as it is read, so memory grows with the data kept rather than the
+size of the response.
+"""
+
+import logging
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+_STARTS = frozenset(["start_map", "start_array"])
+_ENDS = frozenset(["end_map", "end_array"])
+
+
+def _import_ijson():
+    """Import the optional ijson dependency
+
+    Returns:
+        module: `ijson` module
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        import ijson
+    except ImportError as ex:
+        msg = ("Streaming responses requires ijson; install it with "
+               "`pip install weather-collector[streaming]`")
+        _logger.error(msg)
+        raise ImportError(msg) from ex
+    return ijson
+
+
+def get_paths(data_specs):
+    """Get the paths of the response referenced by data files
+
+    Args:
+        data_specs (dict): Data files (i.e., data specifications) by path
+
+    Returns:
+        frozenset: Paths (i.e., the `Data` keys, e.g., `hourly` or `a.b`)
+    """
+    return frozenset(
+        attr
+        for data_config in data_specs.values()
+        for attr in data_config["Data"]
+        if attr != "!now"
+    )
+
+
+def _set_path(data, path, value):
+    """Set the value of a (dot separated) path of nested dictionaries
+
+    Args:
+        data (dict): Nested dictionaries
+        path (str): Path
+        value: Value
+    """
+    keys = path.split(".")
+    for key in keys[:-1]:
+        data = data.setdefault(key, {})
+    data[keys[-1]] = value
+
+
+def decode_paths(stream, paths):
+    """Decode the sub-trees of a JSON document at the given paths. Reading
+    stops as soon as all the paths were decoded.
+
+    Args:
+        stream: File-like object with the JSON document
+        paths (iterable): Paths to decode (see :func:`get_paths`)
+
+    Returns:
+        dict: Document with only the decoded sub-trees (paths not found in the
+        document are missing)
+    """
+    ijson = _import_ijson()
+    wanted = set(paths)
+    data = {}
+    active = []  # Sub-trees being decoded: [path, builder, depth]
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if prefix in wanted and event != "map_key" and event not in _ENDS:
+            wanted.discard(prefix)
+            active.append([prefix, ijson.ObjectBuilder(), 0])
+        for item in tuple(active):
+            item[1].event(event, value)
+            if event in _STARTS:
+                item[2] += 1
+            elif event in _ENDS:
+                item[2] -= 1
+            if item[2] == 0:
+                _set_path(data, item[0], item[1].value)
+                active.remove(item)
+        if not wanted and not active:
+            break
+    return data
+
+
+def decode_response(output, paths):
+    """Decode the sub-trees of a streamed response (i.e., requested with
+    `stream=True`) and close it
+
+    Args:
+        output (:obj:`requests.Response`): Response
+        paths (iterable): Paths to decode (see :func:`get_paths`)
+
+    Returns:
+        dict: Response with only the decoded sub-trees
+    """
+    try:
+        output.raw.decode_content = True
+        return decode_paths(output.raw, paths)
+    finally:
+        output.close()
@@ -0,0 +1,846 @@
+# -*- coding: utf-8 -*-
+"""
+Writers responsible for saving the collected data
+"""
+
+import atexit
+import collections
+import contextlib
+import csv
+import datetime as dt
+import io
+import logging
+import os
+import threading
+import time
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("never", "flush", "close")
+FLUSH_INTERVAL = 10
+DEDUP_ROWS = 256
+DEDUP_TAIL_BYTES = 64 * 1024
+DEDUP_IGNORE = ("Collection Time",)
+PYARROW_MIN_VERSION = 14
+
+_cleaned_dirs = set()
+_cleaned_dirs_lock = threading.Lock()
+
+
+class BufferPolicy(
+    collections.namedtuple(
+        "BufferPolicy", ["rows", "bytes", "latency", "fsync", "dedup"],
+        defaults=(False,),
+    )
+):
+    """Buffering policy of appended rows. The buffer is flushed once any of
+    the limits is reached.
+
+    Args:
+        rows (int): Maximum number of buffered rows
+        bytes (int): Maximum number of buffered bytes (0: no limit)
+        latency (float): Maximum seconds rows are buffered (0: no limit)
+        fsync (str): When to sync the file to disk: "never", "flush" (every
+            flush) or "close" (when the file is closed)
+        dedup (bool): Skip appended rows that did not change (see
+            :class:`RecentRows`)
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Get the buffering policy of a data file specification. The policy
+        is defined by the optional `Buffer` object with keys `Rows`, `Bytes`,
+        `Latency` and `Fsync`; by default rows are written every call. The
+        optional `Dedup` key skips the appended rows that did not change.
+
+        Args:
+            spec (dict): Data file specification
+
+        Returns:
+            :obj:`BufferPolicy`: Buffering policy
+        """
+        buffer = spec.get("Buffer", {})
+        policy = cls(
+            buffer.get("Rows", 1),
+            buffer.get("Bytes", 0),
+            buffer.get("Latency", 0),
+            buffer.get("Fsync", "never"),
+            spec.get("Dedup", False),
+        )
+        if policy.fsync not in FSYNC_POLICIES:
+            msg = f"Unknown fsync policy {policy.fsync}"
+            _logger.error(msg)
+            raise ValueError(msg)
+        return policy
+
+
+DEFAULT_POLICY = BufferPolicy(1, 0, 0, "never")
+
+
+def sync_dir(path):
+    """Sync a directory to disk (e.g., so that a rename in it is durable).
+    Does nothing on platforms that cannot open directories.
+
+    Args:
+        path (str): Path of directory
+    """
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _is_running(pid, ident):
+    """Check if the thread of a process is running
+
+    Args:
+        pid (int): Process ID
+        ident (int): Thread identifier (only checked in this process)
+
+    Returns:
+        bool: True if the thread may be running
+    """
+    if pid == os.getpid():
+        return any(thread.ident == ident for thread in threading.enumerate())
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def remove_stale_tmp(path):
+    """Remove the temporary files left in the directory of a file by writers
+    that crashed (see :func:`replace_atomically`). Each directory is only
+    cleaned once per process.
+
+    Args:
+        path (str): Path of file
+    """
+    directory = os.path.dirname(path)
+    with _cleaned_dirs_lock:
+        if directory in _cleaned_dirs:
+            return
+        _cleaned_dirs.add(directory)
+    try:
+        names = os.listdir(directory or ".")
+    except FileNotFoundError:
+        return
+    for name in names:
+        parts = name.rsplit(".", 3)
+        if len(parts) != 4 or parts[3] != "tmp" or \
+                not (parts[1].isdigit() and parts[2].isdigit()) or \
+                _is_running(int(parts[1]), int(parts[2])):
+            continue
+        _logger.warning("Removing stale temporary file %s", name)
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+@contextlib.contextmanager
+def replace_atomically(path):
+    """Replace a file atomically and durably: the new file is written to a
+    temporary file in the same directory, synced to disk and renamed over the
+    file once it is complete, and the directory is synced, so that readers
+    see either the old or the new file and a failed write (e.g., a full disk)
+    or a crash leaves the old file.
+
+    Args:
+        path (str): Path of file
+
+    Yields:
+        str: Path of the temporary file to write
+    """
+    remove_stale_tmp(path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        with open(tmp_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        sync_dir(os.path.dirname(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _repair_tail(file, path):
+    """Remove a partial row left at the end of a file (e.g., by a crash). A
+    file without any newline is left unchanged.
+
+    Args:
+        file: File open for appending in binary mode
+        path (str): Path of file
+
+    Returns:
+        int: Length of the file
+    """
+    size = os.fstat(file.fileno()).st_size
+    end = size
+    with open(path, "rb") as cur_file:
+        while end > 0:
+            start = max(end - 4096, 0)
+            cur_file.seek(start)
+            chunk = cur_file.read(end - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+    if end == 0 and size > 0:
+        _logger.warning("File %s has no complete row; not repairing it",
+                        path)
+        return size
+    if end != size:
+        _logger.warning("Removing a partial row from %s", path)
+        os.ftruncate(file.fileno(), end)
+    return end
+
+
+class Table(collections.namedtuple("Table", ["index", "columns"])):
+    """Collected data: the date/time index and the columns. Saving a table
+    does not require pandas unless the backend needs a data frame.
+
+    Args:
+        index (list): Index (i.e., date/times) of the rows
+        columns (dict): Values of each column; a scalar value is repeated for
+            every row
+    """
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.index)
+
+    def to_frame(self):
+        """Convert the table to a data frame
+
+        Returns:
+            :obj:`pd.DataFrame`: Data frame
+        """
+        # pylint: disable=import-outside-toplevel
+        import pandas as pd
+        return pd.DataFrame(index=self.index, data=self.columns)
+
+    @classmethod
+    def from_frame(cls, data):
+        """Create a table from a data frame
+
+        Args:
+            data (:obj:`pd.DataFrame`): Data frame
+
+        Returns:
+            :obj:`Table`: Table
+        """
+        return cls(
+            data.index.tolist(),
+            {column: data[column].tolist() for column in data.columns},
+        )
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _format_values(values):
+    """Format the values of a column for a CSV file the same way as pandas
+
+    Args:
+        values (list): Values
+
+    Returns:
+        list: Formatted values
+    """
+    present = [val for val in values if not _is_missing(val)]
+    if all(isinstance(val, (int, float)) and not isinstance(val, bool)
+           for val in present):
+        if len(present) < len(values) or any(
+                isinstance(val, float) for val in present):
+            return ["" if _is_missing(val) else repr(float(val))
+                    for val in values]
+        return [str(val) for val in values]
+
+    if all(isinstance(val, dt.datetime) and val.tzinfo is None
+           for val in present):
+        # Naive date/times share the format of the column
+        if any(val.microsecond for val in present):
+            fmt = "%Y-%m-%d %H:%M:%S.%f"
+        elif all(val.time() == dt.time() for val in present):
+            fmt = "%Y-%m-%d"
+        else:
+            fmt = "%Y-%m-%d %H:%M:%S"
+        return ["" if _is_missing(val) else val.strftime(fmt)
+                for val in values]
+    return ["" if _is_missing(val) else str(val) for val in values]
+
+
+def to_csv_text(table, header=True):
+    """Serialize a table to CSV text. The output is identical to
+    `DataFrame.to_csv` of the table.
+
+    Args:
+        table (:obj:`Table`): Table
+        header (bool): If true, start with the header
+
+    Returns:
+        str: CSV text
+    """
+    columns = []
+    for column, values in table.columns.items():
+        if not isinstance(values, (list, tuple)):
+            # Scalars are broadcast (e.g., the collection time)
+            values = [values] * len(table.index)
+        elif len(values) != len(table.index):
+            msg = (f"Column {column} has {len(values)} values; expected "
+                   f"{len(table.index)}")
+            _logger.error(msg)
+            raise ValueError(msg)
+        columns.append(_format_values(values))
+
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    if header:
+        writer.writerow([""] + list(table.columns))
+    writer.writerows(zip(_format_values(table.index), *columns))
+    return text.getvalue()
+
+
+class _AppendFile:
+    """Open file with buffered rows"""
+
+    __slots__ = ("file", "policy", "buffer", "rows", "bytes", "first_time",
+                 "size", "header", "header_buffered")
+
+    def __init__(self, file, policy, size=0, header=None):
+        self.file = file
+        self.policy = policy
+        self.buffer = []
+        self.rows = 0
+        self.bytes = 0
+        self.first_time = None
+        self.size = size
+        self.header = header
+        self.header_buffered = False
+
+    def is_due(self, cur_time):
+        """Check if the buffer must be flushed
+
+        Args:
+            cur_time (float): Monotonic time
+
+        Returns:
+            bool: True if the buffer must be flushed
+        """
+        policy = self.policy
+        return self.rows >= policy.rows or (
+            policy.bytes and self.bytes >= policy.bytes
+        ) or (
+            policy.latency and self.first_time is not None
+            and cur_time - self.first_time >= policy.latency
+        )
+
+
+class AppendWriter:
+    """Append rows to files through long-lived file handles. Rows are buffered
+    in memory and written in batches (see :obj:`BufferPolicy`).
+
+    Appends are length-checked: the writer keeps the length of every file
+    after its last complete batch, a batch that fails (e.g., a full disk) is
+    truncated back to that length and kept in the buffer, and a partial row
+    at the end of a file (e.g., after a crash) is removed when it is opened.
+    A file that was replaced, rotated or removed since it was opened is
+    reopened before it is written to.
+
+    Args:
+        max_open (int): Maximum number of open files; the least recently used
+            file is closed when exceeded
+    """
+
+    def __init__(self, max_open=64):
+        self.max_open = max_open
+        self._files = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def append(self, path, text, header=None, rows=1, policy=DEFAULT_POLICY):
+        """Append rows to a file
+
+        Args:
+            path (str): Path of file
+            text (str): Serialized rows
+            header (str): Header written if the file does not exist
+            rows (int): Number of rows in `text`
+            policy (:obj:`BufferPolicy`): Buffering policy of the file
+        """
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                entry = self._open(path, header, policy)
+            else:
+                entry.policy = policy
+                self._files.move_to_end(path)
+            if entry.first_time is None:
+                entry.first_time = time.monotonic()
+            entry.buffer.append(text)
+            entry.rows += rows
+            entry.bytes += len(text)
+            if entry.is_due(time.monotonic()):
+                self._flush(path, entry)
+
+    def _open(self, path, header, policy):
+        # pylint: disable=consider-using-with
+        remove_stale_tmp(path)
+        file = open(path, "ab", buffering=0)
+        entry = _AppendFile(file, policy, _repair_tail(file, path), header)
+        if entry.size == 0 and header:
+            entry.buffer.append(header)
+            entry.bytes += len(header)
+            entry.header_buffered = True
+        self._files[path] = entry
+        while len(self._files) > self.max_open:
+            old_path, old_entry = self._files.popitem(last=False)
+            self._close(old_path, old_entry)
+        return entry
+
+    @staticmethod
+    def _reopen(path, entry):
+        """Reopen a file if it was replaced, rotated or removed since it was
+        opened, so that rows are not written to an unlinked file
+
+        Args:
+            path (str): Path of file
+            entry (:obj:`_AppendFile`): Open file
+        """
+        try:
+            stat = os.stat(path)
+            cur_stat = os.fstat(entry.file.fileno())
+            if (stat.st_dev, stat.st_ino) == (cur_stat.st_dev,
+                                              cur_stat.st_ino):
+                return
+        except FileNotFoundError:
+            pass
+        _logger.info("File %s was replaced; reopening it", path)
+        # pylint: disable=consider-using-with
+        file = open(path, "ab", buffering=0)
+        entry.file.close()
+        entry.file = file
+        entry.size = _repair_tail(entry.file, path)
+        _recent_rows.forget(path)
+        if entry.size == 0 and entry.header and not entry.header_buffered:
+            entry.buffer.insert(0, entry.header)
+            entry.bytes += len(entry.header)
+            entry.header_buffered = True
+        elif entry.size > 0 and entry.header_buffered:
+            entry.bytes -= len(entry.buffer.pop(0))
+            entry.header_buffered = False
+
+    @classmethod
+    def _flush(cls, path, entry):
+        if entry.buffer:
+            cls._reopen(path, entry)
+            _logger.debug("Writing %d rows to %s", entry.rows, path)
+            data = memoryview("".join(entry.buffer).encode())
+            fileno = entry.file.fileno()
+            try:
+                while data:
+                    data = data[os.write(fileno, data):]
+            except OSError:
+                # Do not leave a partial batch; it is written again by the
+                # next flush
+                _logger.error("Failed to append to %s", path)
+                os.ftruncate(fileno, entry.size)
+                raise
+            entry.size = os.lseek(fileno, 0, os.SEEK_END)
+            entry.header_buffered = False
+        if entry.policy.fsync == "flush":
+            os.fsync(entry.file.fileno())
+        entry.buffer = []
+        entry.rows = 0
+        entry.bytes = 0
+        entry.first_time = None
+
+    def _close(self, path, entry):
+        try:
+            self._flush(path, entry)
+            if entry.policy.fsync == "close":
+                os.fsync(entry.file.fileno())
+        finally:
+            entry.file.close()
+
+    def flush(self, path=None):
+        """Flush buffered rows
+
+        Args:
+            path (str): Path of file to flush (defaults to all files)
+        """
+        with self._lock:
+            for cur_path, entry in list(self._files.items()):
+                if path is None or cur_path == path:
+                    self._flush(cur_path, entry)
+
+    def flush_expired(self):
+        """Flush the files whose buffers reached their limits (e.g.,
+        latency)"""
+        cur_time = time.monotonic()
+        with self._lock:
+            for path, entry in list(self._files.items()):
+                if entry.rows and entry.is_due(cur_time):
+                    self._flush(path, entry)
+
+    def close(self, path=None):
+        """Flush buffered rows and close files
+
+        Args:
+            path (str): Path of file to close (defaults to all files)
+        """
+        with self._lock:
+            for cur_path in list(self._files):
+                if path is None or cur_path == path:
+                    self._close(cur_path, self._files.pop(cur_path))
+
+
+class RecentRows:
+    """Index of the recent rows of appended CSV files, used to skip the rows
+    that did not change (e.g., the current weather when the API has not
+    refreshed it). The key of a row is its date/time (i.e., the first column)
+    and its value is the rest of the row except the ignored columns (i.e.,
+    the collection time). The index of a file is rebuilt from its tail, so
+    the file is never read in full.
+
+    Args:
+        rows (int): Number of recent keys kept per file
+        max_files (int): Maximum number of indexed files; the least recently
+            used file is dropped when exceeded
+        tail_bytes (int): Number of bytes read from the end of a file to
+            rebuild its index
+    """
+
+    def __init__(self, rows=DEDUP_ROWS, max_files=64,
+                 tail_bytes=DEDUP_TAIL_BYTES):
+        self.rows = rows
+        self.max_files = max_files
+        self.tail_bytes = tail_bytes
+        self._files = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._files
+
+    @staticmethod
+    def _parse(line, ignore):
+        fields = next(csv.reader([line]))
+        return fields[0], tuple(
+            val for i, val in enumerate(fields) if i not in ignore
+        )
+
+    def _load(self, path, ignore):
+        """Rebuild the index of a file from its tail
+
+        Args:
+            path (str): Path of file
+            ignore (set): Positions of the ignored columns
+
+        Returns:
+            :obj:`collections.OrderedDict`: Value of each recent key
+        """
+        recent = collections.OrderedDict()
+        try:
+            with open(path, "rb") as file:
+                start = max(file.seek(0, os.SEEK_END) - self.tail_bytes, 0)
+                # Read the byte before the tail to know if it starts a row
+                file.seek(max(start - 1, 0))
+                data = file.read()
+        except FileNotFoundError:
+            return recent
+        if start > 0 and data[:1] == b"\n":
+            first = 0
+            data = data[1:]
+        else:
+            # The first line is the header or a partial row
+            first = 1
+        # The last line is empty (or a partial row)
+        lines = data.decode(errors="ignore").split("\n")[first:-1]
+        for line in lines[-self.rows:]:
+            if line:
+                key, value = self._parse(line, ignore)
+                recent[key] = value
+                recent.move_to_end(key)
+        return recent
+
+    def filter(self, path, header, lines):
+        """Remove the rows that did not change from rows appended to a file
+
+        Args:
+            path (str): Path of file
+            header (str): Header of the rows
+            lines (list): Rows (CSV lines)
+
+        Returns:
+            list: Rows that changed
+        """
+        names = next(csv.reader([header]))
+        ignore = {i for i, name in enumerate(names) if name in DEDUP_IGNORE}
+        with self._lock:
+            recent = self._files.get(path)
+            if recent is None:
+                recent = self._files[path] = self._load(path, ignore)
+                while len(self._files) > self.max_files:
+                    self._files.popitem(last=False)
+            else:
+                self._files.move_to_end(path)
+            kept = []
+            for line in lines:
+                key, value = self._parse(line, ignore)
+                if recent.get(key) == value:
+                    continue
+                recent[key] = value
+                recent.move_to_end(key)
+                if len(recent) > self.rows:
+                    recent.popitem(last=False)
+                kept.append(line)
+            return kept
+
+    def forget(self, path):
+        """Drop the index of a file (e.g., when it is overwritten)
+
+        Args:
+            path (str): Path of file
+        """
+        with self._lock:
+            self._files.pop(path, None)
+
+    def clear(self):
+        """Drop the indexes of all files"""
+        with self._lock:
+            self._files.clear()
+
+
+def _import_pyarrow():
+    """Import the optional pyarrow dependency
+
+    Returns:
+        tuple: `pyarrow` and `pyarrow.parquet` modules
+    """
+    msg = (f"The Parquet format requires pyarrow>={PYARROW_MIN_VERSION}; "
+           "install it with `pip install weather-collector[parquet]`")
+    try:
+        # pylint: disable=import-outside-toplevel
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as ex:
+        _logger.error(msg)
+        raise ImportError(msg) from ex
+    if int(pyarrow.__version__.split(".")[0]) < PYARROW_MIN_VERSION:
+        _logger.error(msg)
+        raise ImportError(msg)
+    return pyarrow, pyarrow.parquet
+
+
+class CSVBackend:
+    """Save data to CSV files. The units are part of the column names (i.e.,
+    `<Object>.<Point>#<unit>`)."""
+
+    @staticmethod
+    def save(data, path, append, policy=DEFAULT_POLICY, issued=None):
+        """Save data
+
+        Args:
+            data (:obj:`Table`): Data
+            path (str): Path of file to save
+            append (bool): Append to existing file if exists
+            policy (:obj:`BufferPolicy`): Buffering policy of appended rows
+            issued (:obj:`datetime.datetime`): Not used
+
+        Returns:
+            int: Number of rows written (rows that did not change are not
+            appended if the policy has `dedup`)
+        """
+        # pylint: disable=unused-argument
+        text = to_csv_text(data)
+        appender = get_appender()
+        if append:
+            # Rows are appended through a long-lived (buffered) file handle
+            header, rows = text.split("\n", 1)
+            count = len(data)
+            if policy.dedup:
+                if path not in _recent_rows:
+                    # The index is rebuilt from the file
+                    appender.flush(path)
+                lines = _recent_rows.filter(path, header,
+                                            rows.splitlines(keepends=True))
+                count, rows = len(lines), "".join(lines)
+                if not lines:
+                    return 0
+            appender.append(path, rows, header=header + "\n",
+                            rows=count, policy=policy)
+            return count
+
+        appender.close(path)
+        _recent_rows.forget(path)
+        if os.path.exists(path):
+            _logger.warning("File %s exists!; overwriting it", path)
+
+        with replace_atomically(path) as tmp_path:
+            with open(tmp_path, "w") as file:
+                file.write(text)
+        return len(data)
+
+
+class ParquetBackend:
+    """Save data to Parquet files with typed columns. The units are stored in
+    the metadata of each column (key `unit`) instead of the column name.
+    Appending rewrites the file.
+
+    Args:
+        float32 (bool): Store floating point values as float32 (half the size,
+            but about 7 significant digits)
+
+    Attributes:
+        float32 (bool): Store floating point values as float32
+    """
+
+    def __init__(self, float32=False):
+        self.float32 = float32
+
+    def to_table(self, data):
+        """Convert data to an Arrow table
+
+        Args:
+            data (:obj:`Table`): Data
+
+        Returns:
+            :obj:`pyarrow.Table`: Table
+        """
+        pyarrow, _ = _import_pyarrow()
+        frame = data.to_frame().rename_axis("Date/Time").reset_index()
+        arrays, fields = [], []
+        for column in frame.columns:
+            name, _, unit = column.partition("#")
+            array = pyarrow.array(frame[column])
+            if self.float32 and pyarrow.types.is_float64(array.type):
+                array = array.cast(pyarrow.float32())
+            arrays.append(array)
+            fields.append(pyarrow.field(
+                name, array.type, metadata={"unit": unit} if unit else None
+            ))
+        return pyarrow.Table.from_arrays(arrays, schema=pyarrow.schema(fields))
+
+    def save(self, data, path, append, policy=DEFAULT_POLICY, issued=None):
+        """Save data
+
+        Args:
+            data (:obj:`Table`): Data
+            path (str): Path of file to save
+            append (bool): Append to existing file if exists
+            policy (:obj:`BufferPolicy`): Not used
+            issued (:obj:`datetime.datetime`): Not used
+        """
+        # pylint: disable=unused-argument
+        pyarrow, parquet = _import_pyarrow()
+        table = self.to_table(data)
+        if os.path.exists(path):
+            if append:
+                table = pyarrow.concat_tables(
+                    [parquet.read_table(path), table],
+                    promote_options="default",
+                )
+            else:
+                _logger.warning("File %s exists!; overwriting it", path)
+        with replace_atomically(path) as tmp_path:
+            parquet.write_table(table, tmp_path)
+
+
+def read_units(path):
+    """Read the units of the columns of a Parquet file
+
+    Args:
+        path (str): Path of Parquet file
+
+    Returns:
+        dict: Unit of each column that has a unit
+    """
+    _, parquet = _import_pyarrow()
+    schema = parquet.read_schema(path)
+    return {
+        field.name: field.metadata[b"unit"].decode()
+        for field in schema
+        if field.metadata and b"unit" in field.metadata
+    }
+
+
+BACKENDS = {"csv": CSVBackend(), "parquet": ParquetBackend(),
+            "parquet-float32": ParquetBackend(float32=True)}
+
+
+def register_backend(name, backend):
+    """Register a storage backend
+
+    Args:
+        name (str): Name of the format (i.e., `Format` of data files)
+        backend: Backend with a `save(data, path, append, policy, issued)`
+            method (`issued` is the time the API was called) that may return
+            the number of rows written, and optionally a `check_spec(spec)`
+            method that raises an error if a data file specification cannot
+            be saved by the backend
+    """
+    BACKENDS[name.lower()] = backend
+
+
+def get_backend(spec):
+    """Get the storage backend of a data file specification (the optional
+    `Format` key; defaults to CSV)
+
+    Args:
+        spec (dict): Data file specification
+
+    Returns:
+        Storage backend
+    """
+    fmt = spec.get("Format", "csv").lower()
+    if fmt not in BACKENDS:
+        msg = f"Unknown format {fmt}"
+        _logger.error(msg)
+        raise KeyError(msg)
+    backend = BACKENDS[fmt]
+    if hasattr(backend, "check_spec"):
+        backend.check_spec(spec)
+    return backend
+
+
+_appender = AppendWriter()
+atexit.register(_appender.close)
+_recent_rows = RecentRows()
+
+
+def get_appender():
+    """Get the append writer shared by the process
+
+    Returns:
+        :obj:`AppendWriter`: Append writer
+    """
+    return _appender
+
+
+def flush_all():
+    """Flush all buffered data of the process"""
+    _appender.flush()
+
+
+def close_all():
+    """Flush all buffered data and close all files of the process (the
+    indexes of recent rows are rebuilt from the files when needed)"""
+    _appender.close()
+    _recent_rows.clear()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Tests recording and replaying responses
+"""
+import datetime as dt
+import glob
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pytz
+from weather_collector.archive import (decode_header, get_archive_path,
+                                       iter_records, read_archive, record)
+from weather_collector.caller import Caller, Collector
+from weather_collector.writers import close_all
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestArchive(unittest.TestCase):
+    """Test archive of responses"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.response = get_example_response()
+        cls.config_dir = os.path.dirname(get_example_unit_config())
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.tmp_dir.name, 'archive')
+
+    def tearDown(self):
+        close_all()
+        self.tmp_dir.cleanup()
+
+    def output(self, hour, day=9):
+        """Create the output of a call
+
+        Args:
+            hour (int): Hour of the call
+            day (int): Day of the call
+
+        Returns:
+            dict: Output of the call
+        """
+        return {'CallTime': dt.datetime(2020, 11, day, hour, 4, 29, 123456,
+                                        tzinfo=pytz.utc),
+                'Response': self.response, 'Cached': False}
+
+    def test_record_and_read(self):
+        """Test reading recorded responses in order"""
+        record(self.archive_dir, 'A', self.output(1))
+        record(self.archive_dir, 'B', self.output(2))
+        record(self.archive_dir, 'A', self.output(3, day=10))
+        self.assertEqual(len(os.listdir(self.archive_dir)), 2)
+
+        outputs = list(read_archive(self.archive_dir, 'A'))
+        self.assertEqual([o['CallTime'] for o in outputs],
+                         [self.output(1)['CallTime'],
+                          self.output(3, day=10)['CallTime']])
+        self.assertEqual(outputs[0]['Response'], self.response)
+        self.assertEqual(len(list(read_archive(self.archive_dir))), 3)
+
+    def test_headers(self):
+        """Test decoding only the headers of records"""
+        record(self.archive_dir, 'A "Response": 1', self.output(1))
+        records = list(iter_records(self.archive_dir, headers=True))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0][2],
+                         {'CallTime': self.output(1)['CallTime'],
+                          'Cached': False})
+        self.assertEqual(decode_header(
+            '{"Response":{},"Name":"B","CallTime":'
+            '"2020-11-09T01:04:00+00:00","Cached":true}'),
+            ('B', {'CallTime': dt.datetime(2020, 11, 9, 1, 4,
+                                           tzinfo=pytz.utc),
+                   'Cached': True}))
+
+    def test_truncated(self):
+        """Test reading an archive whose last record is truncated"""
+        record(self.archive_dir, 'A', self.output(1))
+        record(self.archive_dir, 'A', self.output(2))
+        path = get_archive_path(self.archive_dir, self.output(1)['CallTime'])
+        with open(path, 'rb') as archive_file:
+            data = archive_file.read()
+        with open(path, 'wb') as archive_file:
+            archive_file.write(data[:-20])
+        with self.assertLogs('weather_collector.archive', 'WARNING'):
+            self.assertEqual(len(list(read_archive(self.archive_dir))), 1)
+
+    def test_call_api_records(self):
+        """Test API calls are recorded"""
+        config = {'URL': 'https://archive.example.com/a', 'Name': 'A',
+                  'Archive Directory': self.archive_dir}
+        with mock.patch('weather_collector.caller.get_session') as session:
+            session.return_value.get.return_value.status_code = 200
+            session.return_value.get.return_value.json.return_value = {'a': 1}
+            Caller(config=config).call_api()
+        outputs = list(read_archive(self.archive_dir))
+        self.assertEqual(len(outputs), 1)
+        self.assertEqual(outputs[0]['Response'], {'a': 1})
+
+    def test_replay(self):
+        """Test replaying gives the same data as collecting"""
+        config = {'Name': 'OpenWeather', 'URL': 'https://example.com/',
+                  'Archive Directory': self.archive_dir}
+        collected = os.path.join(self.tmp_dir.name, 'collected')
+        replayed = os.path.join(self.tmp_dir.name, 'replayed')
+        collector = Collector(config=config)
+        for hour in [1, 2]:
+            output = self.output(hour)
+            record(self.archive_dir, 'OpenWeather', output)
+            collector.process(output, self.config_dir, collected)
+        close_all()
+
+        self.assertEqual(
+            collector.replay(self.config_dir, replayed), 2)
+        close_all()
+        files = sorted(os.listdir(collected))
+        self.assertEqual(sorted(os.listdir(replayed)), files)
+        for name in files:
+            with open(os.path.join(collected, name), 'r') as file:
+                expected = file.read()
+            with open(os.path.join(replayed, name), 'r') as file:
+                self.assertEqual(file.read(), expected)
+        self.assertEqual(len(glob.glob(os.path.join(replayed, '*.csv'))), 5)
+
+    def test_replay_existing(self):
+        """Test replaying into an existing data directory is refused"""
+        collector = Collector(config={'Name': 'OpenWeather',
+                                      'URL': 'https://example.com/',
+                                      'Archive Directory': self.archive_dir})
+        data_dir = os.path.join(self.tmp_dir.name, 'data')
+        collector.process(self.output(1), self.config_dir, data_dir)
+        close_all()
+        files = sorted(os.listdir(data_dir))
+        with self.assertRaises(FileExistsError):
+            collector.replay(self.config_dir, data_dir)
+        self.assertEqual(sorted(os.listdir(data_dir)), files)
+
+    def test_replay_without_archive(self):
+        """Test replaying requires an archive directory"""
+        collector = Collector(config={'Name': 'A', 'URL': 'https://a/'})
+        with self.assertRaises(ValueError):
+            collector.replay(self.config_dir, self.tmp_dir.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Tests response cache
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from weather_collector.cache import ResponseCache, get_expiry
+from weather_collector.caller import Caller, Collector
+from weather_collector.ratelimit import TokenBucket
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test response cache"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_expiry(self):
+        """Test the expiry of responses from their headers"""
+        self.assertEqual(get_expiry({}, 100), 100)
+        self.assertEqual(
+            get_expiry({'Cache-Control': 'public, max-age=60'}, 100), 160)
+        self.assertEqual(get_expiry({'Cache-Control': 'no-cache'}, 100), 100)
+        self.assertIsNone(get_expiry({'Cache-Control': 'no-store'}, 100))
+        self.assertEqual(
+            get_expiry({'Expires': 'Mon, 09 Nov 2020 21:00:00 GMT'}, 100),
+            1604955600)
+
+    def test_store(self):
+        """Test storing responses"""
+        cache = ResponseCache()
+        entry = cache.store('http://a', {'a': 1},
+                            {'ETag': '"1"', 'Cache-Control': 'max-age=60'})
+        self.assertIs(cache.get('http://a'), entry)
+        self.assertTrue(entry.is_fresh())
+        self.assertEqual(entry.conditional_headers(),
+                         {'If-None-Match': '"1"'})
+        cache.store('http://a', {'a': 1}, {'Cache-Control': 'no-store'})
+        self.assertIsNone(cache.get('http://a'))
+
+    def test_persisted(self):
+        """Test responses are persisted to the directory"""
+        cache = ResponseCache(self.tmp_dir.name)
+        cache.store('http://a?appid=key', {'a': 1},
+                    {'Last-Modified': 'Mon, 09 Nov 2020 21:00:00 GMT'})
+        files = os.listdir(self.tmp_dir.name)
+        self.assertEqual(len(files), 1)
+        self.assertNotIn('key', files[0])
+
+        entry = ResponseCache(self.tmp_dir.name).get('http://a?appid=key')
+        self.assertEqual(entry.response, {'a': 1})
+        self.assertFalse(entry.is_fresh())
+        self.assertEqual(entry.conditional_headers(),
+                         {'If-Modified-Since':
+                          'Mon, 09 Nov 2020 21:00:00 GMT'})
+
+
+class TestCachedCaller(unittest.TestCase):
+    """Test calling the API with the response cache"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.response = get_example_response()
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {'Name': 'Test', 'URL': 'https://example.com/cached',
+                       'Cache': True,
+                       'Cache Directory': os.path.join(self.tmp_dir.name,
+                                                       'cache')}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def call(self, status_code, headers, reserved=False):
+        """Call the API with a fake response
+
+        Args:
+            status_code (int): Status code of the response
+            headers (dict): Response headers
+            reserved (bool): True if a token was already acquired
+
+        Returns:
+            tuple: Output of the caller and the session mock
+        """
+        with mock.patch('weather_collector.caller.get_session') as session:
+            output = session.return_value.get.return_value
+            output.status_code = status_code
+            output.headers = headers
+            output.json.return_value = self.response
+            return Caller(config=self.config,
+                          reserved=reserved).call_api(), session
+
+    def test_not_modified(self):
+        """Test revalidating a cached response"""
+        data, _ = self.call(200, {'ETag': '"1"'})
+        self.assertFalse(data['Cached'])
+
+        data, session = self.call(304, {})
+        _, kwargs = session.return_value.get.call_args
+        self.assertEqual(kwargs['headers'], {'If-None-Match': '"1"'})
+        self.assertTrue(data['Cached'])
+        self.assertEqual(data['Response'], self.response)
+
+    def test_fresh(self):
+        """Test a fresh response is not requested"""
+        self.call(200, {'Cache-Control': 'max-age=600'})
+        data, session = self.call(200, {})
+        session.return_value.get.assert_not_called()
+        self.assertTrue(data['Cached'])
+
+    def test_refund(self):
+        """Test a reserved token is refunded if the API is not requested"""
+        self.config['Rate Limit'] = {'Calls': 2, 'Period': 3600,
+                                     'Key': 'cached-refund'}
+        bucket = TokenBucket.get_bucket(self.config)
+        self.call(200, {'Cache-Control': 'max-age=600'})
+        self.assertAlmostEqual(bucket.tokens, 1, places=2)
+        bucket.reserve()
+        self.call(200, {}, reserved=True)
+        self.assertAlmostEqual(bucket.tokens, 1, places=2)
+
+    def test_skip_unchanged(self):
+        """Test skipping data files of unchanged responses"""
+        config_dir = os.path.join(self.tmp_dir.name, 'config')
+        shutil.copytree(os.path.dirname(get_example_unit_config()),
+                        config_dir)
+        with open(os.path.join(config_dir, 'hourly.json'), 'w') as file:
+            file.write('{"Filename": "Hourly.csv", "Unchanged": "skip", '
+                       '"Data": {"hourly": "OpenWeather Weather Object"}}')
+        self.call(200, {'Cache-Control': 'max-age=600'})
+        data_dir = os.path.join(self.tmp_dir.name, 'data')
+        with mock.patch('weather_collector.caller.get_session'):
+            Collector(config=self.config).collect(config_dir, data_dir)
+        files = os.listdir(data_dir)
+        self.assertEqual(len(files), 2)
+        self.assertNotIn('Hourly.csv', files)
+
+
+if __name__ == '__main__':
+    unittest.main()
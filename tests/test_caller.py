@@ -3,6 +3,7 @@
 Tests API Caller
 """
 import unittest
+from unittest import mock
 from weather_collector.caller import Caller
 
 from tests.helpers import (
@@ -29,6 +30,17 @@ class TestCaller(unittest.TestCase):
         with self.assertRaises(KeyError):
             caller.call_api()
 
+    def test_call_api_session(self):
+        """Test the API is called with the host session and timeouts"""
+        config = {'URL': 'https://example.com/a', 'Read Timeout': 5}
+        with mock.patch('weather_collector.caller.get_session') as session:
+            session.return_value.get.return_value.status_code = 200
+            session.return_value.get.return_value.json.return_value = {}
+            data = Caller(config=config).call_api()
+        session.return_value.get.assert_called_once_with(
+            config['URL'], timeout=(10, 5), headers={})
+        self.assertEqual(data['Response'], {})
+
     def test_call_api(self):
         """Test call OpenWeather API"""
         caller = Caller(config=self.config)
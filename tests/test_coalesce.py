@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Tests request coalescing
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from weather_collector.caller import Caller
+from weather_collector.coalesce import SingleFlight
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test single-flight calls"""
+
+    @staticmethod
+    def run_concurrently(function, num):
+        """Run a function in threads
+
+        Args:
+            function: Callable function
+            num (int): Number of threads
+
+        Returns:
+            list: Results of the threads
+        """
+        results = [None] * num
+
+        def target(index):
+            results[index] = function()
+
+        threads = [threading.Thread(target=target, args=(i,))
+                   for i in range(num)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_share_in_flight(self):
+        """Test concurrent calls share the in-flight call"""
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return object()
+
+        results = self.run_concurrently(lambda: flight.do('a', slow), 4)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(res is results[0] for res in results))
+        flight.do('a', slow)
+        self.assertEqual(len(calls), 2)
+
+    def test_window(self):
+        """Test a finished call is shared within the window"""
+        flight = SingleFlight()
+        first = flight.do('a', object, window=60)
+        self.assertIs(flight.do('a', object, window=60), first)
+        self.assertIsNot(flight.do('b', object, window=60), first)
+
+    def test_purge(self):
+        """Test expired calls are dropped"""
+        flight = SingleFlight()
+        for i in range(100):
+            flight.do(i, object, window=0.01)
+        time.sleep(0.02)
+        flight.do('a', object, window=60)
+        # pylint: disable=protected-access
+        self.assertEqual(list(flight._calls), ['a'])
+
+    def test_error(self):
+        """Test errors are raised and not shared afterwards"""
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            flight.do('a', fail, window=60)
+        self.assertEqual(flight.do('a', lambda: 1, window=60), 1)
+
+    def test_caller_shares_response(self):
+        """Test callers of the same URL share one request"""
+        config = {'Name': 'Test', 'URL': 'https://example.com/shared'}
+
+        def get(*_, **__):
+            time.sleep(0.1)
+            output = mock.Mock(status_code=200, headers={})
+            output.json.return_value = {'a': 1}
+            return output
+
+        with mock.patch('weather_collector.caller.get_session') as session:
+            session.return_value.get.side_effect = get
+            results = self.run_concurrently(
+                Caller(config=config).call_api, 3)
+        self.assertEqual(session.return_value.get.call_count, 1)
+        self.assertTrue(all(res['Response'] is results[0]['Response']
+                            for res in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,11 +9,13 @@ import os
 import json
 import shutil
 import unittest
+import pytz
 from weather_collector.caller import (
     Collector,
     create_file_name,
     WeatherObjects,
     format_data,
+    to_datetimes,
 )
 
 from tests.helpers import (
@@ -77,6 +79,39 @@ class TestCollector(unittest.TestCase):
             self.assertTrue(key in data, msg=f'{key} not in formatted data')
             self.assertEqual(len(data[key]), num_expect_items)
 
+    def test_formatting_time_zone(self):
+        """Test formatting date/times in a time zone"""
+        obj = WeatherObjects.get_obj()
+        data = obj.parse_object_type(self.response['hourly'],
+                                     'OpenWeather Weather Object')
+        with open(get_example_unit_config(), 'r') as file:
+            units = json.load(file)
+        units['Datetime'] = 'America/Los_Angeles'
+        data = format_data(data, units, objs=obj)
+        first = data['Date/Time'][0]
+        self.assertEqual(first.utcoffset(), dt.timedelta(hours=-8))
+        self.assertEqual(
+            first,
+            dt.datetime.fromtimestamp(self.response['hourly'][0]['dt'],
+                                      pytz.utc))
+
+    def test_formatter_cached(self):
+        """Test the formatter of a unit configuration is re-used"""
+        obj = WeatherObjects.get_obj()
+        with open(get_example_unit_config(), 'r') as file:
+            units = json.load(file)
+        self.assertIs(obj.formatter(units), obj.formatter(units))
+        self.assertIsNot(obj.formatter(units), obj.formatter(dict(units)))
+
+    def test_to_datetimes(self):
+        """Test converting epochs to date/times"""
+        epochs = [1604955869, 1604932993]
+        expected = [dt.datetime(2020, 11, 9, 21, 4, 29),
+                    dt.datetime(2020, 11, 9, 14, 43, 13)]
+        self.assertEqual(to_datetimes(epochs), expected)
+        self.assertEqual(to_datetimes([1604955869.5])[0],
+                         dt.datetime(2020, 11, 9, 21, 4, 29, 500000))
+
     def test_collect(self):
         """Test data collection"""
         collector = Collector(config=self.config)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Tests compaction of small data files
+"""
+import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytz
+from weather_collector.caller import create_file_name
+from weather_collector.compaction import (SEGMENT_DIR, compact,
+                                          get_compacted, get_pattern,
+                                          list_files, main, parse_call_time,
+                                          read_file, read_pending,
+                                          write_pending, write_segment)
+
+from tests.helpers import get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+FILENAME = "Daily_#<date>%Y_%m_%d_%H_%M#.csv"
+
+
+class TestCompaction(unittest.TestCase):
+    """Test compacting the files of closed days"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.tmp_dir.name, 'config')
+        os.makedirs(self.config_dir)
+        shutil.copy(get_example_unit_config(), self.config_dir)
+        for name, spec in [('daily', {'Filename': FILENAME}),
+                           ('current', {'Filename': 'Current_#<date>%Y#.csv',
+                                        'Append': True})]:
+            with open(os.path.join(self.config_dir, name + '.json'),
+                      'w') as file:
+                json.dump(dict(spec, Data={}), file)
+
+        self.data_dir = os.path.join(self.tmp_dir.name, 'data')
+        os.makedirs(self.data_dir)
+        self.contents = {}
+        for day, hour in [(9, 21), (9, 22), (10, 0), (10, 1)]:
+            call_time = dt.datetime(2020, 11, day, hour, 4, tzinfo=pytz.utc)
+            name = create_file_name(FILENAME, call_time)
+            self.contents[name] = f'Date/Time,Temp\n{day},{hour}\n'.encode()
+        self.contents['Current_2020.csv'] = b'Date/Time\n1\n'
+        for name, data in self.contents.items():
+            with open(os.path.join(self.data_dir, name), 'wb') as file:
+                file.write(data)
+        self.now = dt.datetime(2020, 11, 10, 2, tzinfo=pytz.utc)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pattern(self):
+        """Test parsing call times from file names"""
+        pattern = get_pattern(FILENAME)
+        self.assertEqual(
+            parse_call_time(pattern, 'Daily_2020_11_09_21_04.csv'),
+            dt.datetime(2020, 11, 9, 21, 4, tzinfo=pytz.utc))
+        self.assertIsNone(parse_call_time(pattern, 'Daily_2020.csv'))
+        self.assertIsNone(get_pattern('daily.csv'))
+
+    def test_compact(self):
+        """Test only the files of closed days are compacted"""
+        self.assertEqual(compact(self.config_dir, self.data_dir, self.now),
+                         2)
+        self.assertEqual(
+            sorted(os.listdir(self.data_dir)),
+            ['Current_2020.csv', 'Daily_2020_11_10_00_04.csv',
+             'Daily_2020_11_10_01_04.csv', SEGMENT_DIR])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.data_dir, SEGMENT_DIR))),
+            ['daily_2020-11-09.csv.gz', 'daily_2020-11-09.json'])
+        compacted = get_compacted(self.data_dir)
+        self.assertEqual(sorted(compacted),
+                         ['Daily_2020_11_09_21_04.csv',
+                          'Daily_2020_11_09_22_04.csv'])
+        self.assertEqual(
+            {segment for segment, _ in compacted.values()},
+            {os.path.join(SEGMENT_DIR, 'daily_2020-11-09.csv.gz')})
+        self.assertIs(get_compacted(self.data_dir), compacted)
+
+        # Readers see the same files
+        self.assertEqual(list_files(self.data_dir), sorted(self.contents))
+        for name, data in self.contents.items():
+            self.assertEqual(read_file(self.data_dir, name), data)
+
+        # Nothing more to compact until the next day is closed
+        self.assertEqual(compact(self.config_dir, self.data_dir, self.now),
+                         0)
+        self.assertEqual(compact(self.config_dir, self.data_dir,
+                                 self.now + dt.timedelta(days=1)), 2)
+        self.assertEqual(len(get_compacted(self.data_dir)), 4)
+        for name, data in self.contents.items():
+            self.assertEqual(read_file(self.data_dir, name), data)
+
+    def test_crash_before_commit(self):
+        """Test an uncommitted segment is removed"""
+        names = ['Daily_2020_11_09_21_04.csv']
+        os.makedirs(os.path.join(self.data_dir, SEGMENT_DIR))
+        write_segment(self.data_dir,
+                      os.path.join(SEGMENT_DIR, 'daily_2020-11-09.csv.gz'),
+                      names)
+        self.assertEqual(list_files(self.data_dir), sorted(self.contents))
+        self.assertEqual(compact(self.config_dir, self.data_dir, self.now),
+                         2)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.data_dir, SEGMENT_DIR))),
+            ['daily_2020-11-09.csv.gz', 'daily_2020-11-09.json'])
+        self.assertEqual(read_file(self.data_dir, names[0]),
+                         self.contents[names[0]])
+
+    def test_crash_after_commit(self):
+        """Test pending files left by a crash are removed"""
+        compact(self.config_dir, self.data_dir, self.now)
+        segment, entry = get_compacted(self.data_dir)[
+            'Daily_2020_11_09_21_04.csv']
+        path = os.path.join(self.data_dir, entry['Name'])
+        with open(path, 'wb') as file:
+            file.write(self.contents[entry['Name']])
+        os.utime(path, ns=(entry['MtimeNs'], entry['MtimeNs']))
+        write_pending(self.data_dir, [dict(entry, Segment=segment)])
+        self.assertEqual(list_files(self.data_dir), sorted(self.contents))
+
+        compact(self.config_dir, self.data_dir, self.now)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(read_pending(self.data_dir), [])
+        self.assertEqual(read_file(self.data_dir, entry['Name']),
+                         self.contents[entry['Name']])
+
+    def test_rewritten(self):
+        """Test a file written again after it was compacted wins"""
+        compact(self.config_dir, self.data_dir, self.now)
+        name = 'Daily_2020_11_09_21_04.csv'
+        path = os.path.join(self.data_dir, name)
+        data = self.contents[name].replace(b'21', b'20')
+        with open(path, 'wb') as file:
+            file.write(data)
+        self.assertEqual(read_file(self.data_dir, name), data)
+
+        # Not removed but compacted again
+        self.assertEqual(compact(self.config_dir, self.data_dir, self.now),
+                         1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(read_file(self.data_dir, name), data)
+        self.assertEqual(get_compacted(self.data_dir)[name][0],
+                         os.path.join(SEGMENT_DIR,
+                                      'daily_2020-11-09.1.csv.gz'))
+
+    def test_main(self):
+        """Test the command line"""
+        config = os.path.join(self.config_dir, 'config.json')
+        with open(config, 'w') as file:
+            json.dump({'Name': 'OpenWeather', 'URL': 'https://example.com/',
+                       'Data Directory': self.data_dir}, file)
+        self.assertEqual(main(['-c', config]), 4)
+        self.assertEqual(list_files(self.data_dir), sorted(self.contents))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests configuration store
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from weather_collector.config import ConfigStore, load_json
+
+from tests.helpers import get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestConfigStore(unittest.TestCase):
+    """Test configuration store"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.tmp_dir.name, 'open_weather')
+        shutil.copytree(os.path.dirname(get_example_unit_config()),
+                        self.config_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write a file in the configuration directory
+
+        Args:
+            name (str): File name
+            content (str): File content
+        """
+        with open(os.path.join(self.config_dir, name), 'w') as file:
+            file.write(content)
+
+    def test_snapshot(self):
+        """Test snapshot of the configuration directory"""
+        snapshot = ConfigStore(self.config_dir).snapshot()
+        self.assertIsNone(snapshot.config)
+        self.assertEqual(snapshot.units['Temperature'], 'K')
+        self.assertEqual(
+            sorted(os.path.basename(p) for p in snapshot.data_specs),
+            ['current.json', 'daily.json', 'hourly.json'])
+
+    def test_snapshot_immutable(self):
+        """Test the snapshot can not be modified"""
+        snapshot = ConfigStore(self.config_dir).snapshot()
+        with self.assertRaises(TypeError):
+            snapshot.units['Temperature'] = 'C'
+
+    def test_snapshot_reused(self):
+        """Test the snapshot is reused until a file changes"""
+        store = ConfigStore(self.config_dir)
+        snapshot = store.snapshot()
+        self.assertIs(store.snapshot(), snapshot)
+
+        self.write('config.json', '{"Name": "Test", "URL": "http://a"}')
+        new_snapshot = store.snapshot()
+        self.assertIsNot(new_snapshot, snapshot)
+        self.assertEqual(new_snapshot.config['Name'], 'Test')
+        self.assertIs(new_snapshot.units, snapshot.units)
+
+        os.remove(os.path.join(self.config_dir, 'daily.json'))
+        self.assertEqual(len(store.snapshot().data_specs), 2)
+
+    def test_load_json_reloads(self):
+        """Test loading a JSON file that changes"""
+        path = os.path.join(self.config_dir, 'config.json')
+        self.write('config.json', '{"Name": "A"}')
+        data = load_json(path)
+        self.assertIs(load_json(path), data)
+        self.write('config.json', '{"Name": "AB"}')
+        self.assertEqual(load_json(path)['Name'], 'AB')
+
+    def test_get_store(self):
+        """Test the store is shared by the process"""
+        self.assertIs(ConfigStore.get_store(self.config_dir),
+                      ConfigStore.get_store(self.config_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Tests asynchronous collection engine
+"""
+import datetime as dt
+import glob
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pytz
+from weather_collector.caller import Caller, Collector
+from weather_collector.engine import AsyncEngine, Job, locate_config
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestAsyncEngine(unittest.TestCase):
+    """Test asynchronous collection engine"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.response = get_example_response()
+        cls.config_dir = os.path.dirname(get_example_unit_config())
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_jobs(self, num):
+        """Create jobs at different locations
+
+        Args:
+            num (int): Number of jobs
+
+        Returns:
+            list: Jobs
+        """
+        template = {'Name': 'OpenWeather',
+                    'URL': 'https://example.com/?lat={lat}&lon={lon}',
+                    'Data Directory': self.tmp_dir.name}
+        return [
+            Job(Collector(config=locate_config(
+                template,
+                {'Name': f'Site{i}', 'Latitude': i, 'Longitude': -i})),
+                self.config_dir)
+            for i in range(num)
+        ]
+
+    def fake_call(self, delay=0):
+        """Create a fake API call
+
+        Args:
+            delay (float): Seconds to wait before responding
+
+        Returns:
+            tuple: fake function and a dict with the maximum concurrency
+        """
+        lock = threading.Lock()
+        state = {'active': 0, 'max': 0}
+
+        def call_api(_):
+            with lock:
+                state['active'] += 1
+                state['max'] = max(state['max'], state['active'])
+            time.sleep(delay)
+            with lock:
+                state['active'] -= 1
+            return {'CallTime': dt.datetime(2020, 11, 9, tzinfo=pytz.utc),
+                    'Response': self.response}
+        return call_api, state
+
+    def test_locate_config(self):
+        """Test creating the configuration at a location"""
+        config = locate_config(
+            {'Name': 'OW', 'URL': 'https://a/?lat={lat}&lon={lon}',
+             'Data Directory': 'data'},
+            {'Name': 'Davis', 'Latitude': 38.65, 'Longitude': -121.74})
+        self.assertEqual(config['URL'], 'https://a/?lat=38.65&lon=-121.74')
+        self.assertEqual(config['Name'], 'OW Davis')
+        self.assertEqual(config['Data Directory'],
+                         os.path.join('data', 'Davis'))
+
+    def test_collect(self):
+        """Test collecting from many locations"""
+        call_api, _ = self.fake_call()
+        engine = AsyncEngine(self.create_jobs(3))
+        with mock.patch.object(Caller, 'call_api', call_api):
+            self.assertEqual(engine.run(), 3)
+        engine.stop()
+        for i in range(3):
+            files = glob.glob(os.path.join(self.tmp_dir.name, f'Site{i}',
+                                           '*.csv'))
+            self.assertEqual(len(files), 3)
+
+    def test_max_concurrency(self):
+        """Test the number of concurrent calls is bounded"""
+        call_api, state = self.fake_call(delay=0.05)
+        engine = AsyncEngine(self.create_jobs(6), max_concurrency=2)
+        with mock.patch.object(Caller, 'call_api', call_api):
+            engine.run()
+        engine.stop()
+        self.assertEqual(state['max'], 2)
+
+    def test_housekeeping(self):
+        """Test housekeeping jobs do not share the collection workers"""
+        job = Job(Collector(config={'Name': 'OpenWeather',
+                                    'URL': 'https://example.com/',
+                                    'Call Frequency': 10,
+                                    'Data Directory': self.tmp_dir.name}),
+                  self.config_dir)
+        engine = AsyncEngine([job])
+        ran = threading.Event()
+        engine.start()
+        try:
+            engine.add_housekeeping(0.01, ran.set)
+            self.assertTrue(ran.wait(5))
+            self.assertEqual(len(engine.scheduler.jobs), 1)
+        finally:
+            engine.stop()
+
+    def test_failed_call(self):
+        """Test a failed call is not processed"""
+        engine = AsyncEngine(self.create_jobs(2))
+        with mock.patch.object(Caller, 'call_api', return_value=None):
+            self.assertEqual(engine.run(), 0)
+        engine.stop()
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
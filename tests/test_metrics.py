@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Tests metrics
+"""
+import datetime as dt
+import os
+import tempfile
+import time
+import unittest
+import urllib.request
+from unittest import mock
+
+import pytz
+from weather_collector.caller import Caller, Collector
+from weather_collector.metrics import (
+    CALL_SECONDS,
+    CALL_STATUS,
+    Counter,
+    Histogram,
+    OVERRUNS,
+    PARSE_SECONDS,
+    RECEIVED_BYTES,
+    ROWS_WRITTEN,
+    Registry,
+    SCHEDULER_LAG,
+    start_http_server,
+    write_textfile,
+)
+from weather_collector.runner import Scheduler
+from weather_collector.writers import close_all
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestMetrics(unittest.TestCase):
+    """Test metrics"""
+
+    def test_render(self):
+        """Test rendering metrics in the Prometheus text format"""
+        registry = Registry()
+        counter = registry.register(Counter('calls_total', 'Calls',
+                                            ['source']))
+        histogram = registry.register(Histogram('latency_seconds', 'Latency',
+                                                buckets=(0.1, 1)))
+        counter.inc(source='a "b"')
+        counter.inc(2, source='a "b"')
+        histogram.observe(0.5)
+        histogram.observe(5)
+        text = registry.render()
+        self.assertIn('# TYPE calls_total counter', text)
+        self.assertIn('calls_total{source="a \\"b\\""} 3.0', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('latency_seconds_sum 5.5', text)
+        self.assertIn('latency_seconds_count 2', text)
+
+    def test_labels(self):
+        """Test observations must have the labels of the metric"""
+        with self.assertRaises(ValueError):
+            CALL_STATUS.inc(source='a')
+
+    def test_http_server(self):
+        """Test serving the metrics"""
+        server = start_http_server(0)
+        try:
+            url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+            with urllib.request.urlopen(url) as response:
+                text = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('# TYPE weather_collector_call_seconds histogram',
+                      text)
+
+    def test_textfile(self):
+        """Test writing the metrics to a file"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'collector.prom')
+            write_textfile(path)
+            with open(path, 'r') as metrics_file:
+                self.assertIn('weather_collector_rows_written_total',
+                              metrics_file.read())
+            self.assertEqual(os.listdir(tmp_dir), ['collector.prom'])
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test the instrumentation of the collector"""
+
+    def test_call(self):
+        """Test API calls are measured"""
+        config = {'URL': 'https://metrics.example.com/a', 'Name': 'Metrics'}
+        calls = CALL_SECONDS.get_count(source='Metrics')
+        with mock.patch('weather_collector.caller.get_session') as session:
+            session.return_value.get.return_value.status_code = 404
+            Caller(config=config).call_api()
+            session.return_value.get.side_effect = OSError('down')
+            Caller(config=config).call_api()
+        self.assertEqual(CALL_SECONDS.get_count(source='Metrics'), calls + 2)
+        self.assertEqual(CALL_STATUS.get(source='Metrics', status='404'), 1)
+        self.assertEqual(CALL_STATUS.get(source='Metrics', status='error'),
+                         1)
+
+    def test_received_bytes(self):
+        """Test the received bytes are the bytes on the wire"""
+        config = {'URL': 'https://metrics.example.com/b',
+                  'Name': 'Metrics Bytes'}
+        with mock.patch('weather_collector.caller.get_session') as session:
+            output = session.return_value.get.return_value
+            output.status_code = 200
+            output.json.return_value = {}
+            output.content = b'{}' * 10
+            output.headers = {'Content-Length': '7'}
+            Caller(config=config).call_api()
+            output.headers = {}
+            Caller(config=config).call_api()
+        self.assertEqual(RECEIVED_BYTES.get(source='Metrics Bytes'), 27)
+
+    def test_process(self):
+        """Test parsing and writing are measured"""
+        collector = Collector(config={'Name': 'Metrics Process',
+                                      'URL': 'https://example.com/'})
+        response = {'CallTime': dt.datetime(2020, 11, 9, tzinfo=pytz.utc),
+                    'Response': get_example_response()}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            collector.process(response,
+                              os.path.dirname(get_example_unit_config()),
+                              tmp_dir)
+            close_all()
+        self.assertEqual(
+            PARSE_SECONDS.get_count(source='Metrics Process'), 3)
+        self.assertEqual(ROWS_WRITTEN.get(source='Metrics Process'),
+                         1 + 48 + 8)
+
+    def test_scheduler(self):
+        """Test the lag and overruns of the scheduler are measured"""
+        def slow():
+            time.sleep(0.35)
+
+        scheduler = Scheduler(workers=1)
+        job = scheduler.add_job(0.1, slow)
+        scheduler.start()
+        time.sleep(0.45)
+        scheduler.stop()
+        self.assertGreater(SCHEDULER_LAG.get_count(job=job.name), 1)
+        self.assertEqual(OVERRUNS.get(job=job.name), job.overruns)
+        self.assertGreater(job.overruns, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Tests rate limiters
+"""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from weather_collector.caller import Caller
+from weather_collector.ratelimit import TokenBucket
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token buckets"""
+
+    def test_reserve(self):
+        """Test tokens are reserved in order once the bucket is empty"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_refund(self):
+        """Test refunded tokens can be taken again"""
+        bucket = TokenBucket(rate=0.01, capacity=1)
+        bucket.reserve()
+        bucket.refund()
+        self.assertEqual(bucket.reserve(), 0)
+        bucket.refund(2)
+        self.assertLessEqual(bucket.tokens, 1)
+
+    def test_acquire_async(self):
+        """Test waiting asynchronously for a token"""
+        bucket = TokenBucket(rate=1, capacity=1)
+        bucket.reserve()
+        with mock.patch('weather_collector.ratelimit.asyncio.sleep',
+                        new=mock.AsyncMock()) as sleep:
+            asyncio.run(bucket.acquire_async())
+        self.assertAlmostEqual(sleep.call_args[0][0], 1, places=1)
+
+    def test_invalid(self):
+        """Test invalid rate limits"""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+
+    def test_get_bucket(self):
+        """Test buckets are shared by key"""
+        limit = {'Calls': 60, 'Period': 60}
+        self.assertIsNone(TokenBucket.get_bucket({'URL': 'https://a.com/'}))
+        bucket = TokenBucket.get_bucket(
+            {'URL': 'https://shared.example.com/a', 'Rate Limit': limit})
+        self.assertIs(TokenBucket.get_bucket(
+            {'URL': 'https://shared.example.com/b', 'Rate Limit': limit}),
+            bucket)
+        self.assertEqual(bucket.key, 'https://shared.example.com')
+        self.assertEqual(bucket.rate, 1)
+        self.assertEqual(bucket.capacity, 60)
+        self.assertIsNot(TokenBucket.get_bucket(
+            {'URL': 'https://shared.example.com/c',
+             'Rate Limit': dict(limit, Key='other')}), bucket)
+
+    def test_persist(self):
+        """Test restoring a persisted bucket does not burst"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'limits.json')
+            bucket = TokenBucket(0.01, 2, key='a', path=path)
+            bucket.reserve()
+            bucket.reserve()
+            with open(path, 'r') as json_file:
+                self.assertIn('a', json.load(json_file))
+
+            restored = TokenBucket(0.01, 2, key='a', path=path)
+            self.assertLess(restored.tokens, 1)
+            self.assertGreater(restored.reserve(), 0)
+            self.assertEqual(TokenBucket(0.01, 2, key='b',
+                                         path=path).tokens, 2)
+
+
+class TestRateLimitCaller(unittest.TestCase):
+    """Test rate limited API calls"""
+
+    def test_call_waits(self):
+        """Test calls wait for the rate limit"""
+        config = {'URL': 'https://limited.example.com/a', 'Name': 'Test',
+                  'Rate Limit': {'Calls': 1, 'Period': 10}}
+        with mock.patch('weather_collector.caller.get_session') as session, \
+                mock.patch('weather_collector.ratelimit.time.sleep') as sleep:
+            session.return_value.get.return_value.status_code = 200
+            session.return_value.get.return_value.json.return_value = {}
+            Caller(config=config).call_api()
+            sleep.assert_not_called()
+            Caller(config=config).call_api()
+            self.assertAlmostEqual(sleep.call_args[0][0], 10, places=0)
+            # The token was already acquired (e.g., by the engine)
+            sleep.reset_mock()
+            Caller(config=config, reserved=True).call_api()
+            sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
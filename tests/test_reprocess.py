@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Tests parallel reprocessing of recorded responses
+"""
+import datetime as dt
+import json
+import os
+import tempfile
+import unittest
+
+import pytz
+from weather_collector.archive import record
+from weather_collector.caller import Collector
+from weather_collector.engine import Job, create_jobs, load_locations
+from weather_collector.reprocess import create_tasks, reprocess
+from weather_collector.writers import close_all
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestReprocess(unittest.TestCase):
+    """Test reprocessing recorded responses"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.response = get_example_response()
+        cls.config_dir = os.path.dirname(get_example_unit_config())
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.tmp_dir.name, 'archive')
+        for day, hour in [(9, 1), (9, 2), (10, 1)]:
+            record(self.archive_dir, 'OpenWeather', {
+                'CallTime': dt.datetime(2020, 11, day, hour, 4,
+                                        tzinfo=pytz.utc),
+                'Response': self.response, 'Cached': False})
+
+    def tearDown(self):
+        close_all()
+        self.tmp_dir.cleanup()
+
+    def create_job(self, data_dir):
+        """Create a job saving to a data directory
+
+        Args:
+            data_dir (str): Data directory
+
+        Returns:
+            :obj:`Job`: Job
+        """
+        return Job(Collector(config={
+            'Name': 'OpenWeather', 'URL': 'https://example.com/',
+            'Archive Directory': self.archive_dir,
+            'Data Directory': data_dir}), self.config_dir)
+
+    def test_create_tasks(self):
+        """Test responses are partitioned by output file"""
+        tasks = create_tasks([self.create_job(self.tmp_dir.name)])
+        names = [os.path.basename(task.data_path) for task in tasks]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(tasks), 8)
+        current = [task for task in tasks
+                   if os.path.basename(task.data_path) ==
+                   'Current_2020_11_09.csv']
+        self.assertEqual(len(current[0].records), 2)
+
+    def test_reprocess(self):
+        """Test reprocessing gives the same files as replaying"""
+        replayed = os.path.join(self.tmp_dir.name, 'replayed')
+        self.create_job(replayed).collector.replay(self.config_dir, replayed)
+        close_all()
+
+        reprocessed = os.path.join(self.tmp_dir.name, 'reprocessed')
+        for _ in range(2):
+            report = reprocess([self.create_job(reprocessed)], processes=2,
+                               overwrite=True)
+        self.assertEqual(report.files, 8)
+        self.assertEqual(report.responses, 9)
+
+        files = sorted(os.listdir(replayed))
+        self.assertEqual(sorted(os.listdir(reprocessed)), files)
+        for name in files:
+            with open(os.path.join(replayed, name), 'r') as file:
+                expected = file.read()
+            with open(os.path.join(reprocessed, name), 'r') as file:
+                self.assertEqual(file.read(), expected, msg=name)
+
+    def test_overwrite(self):
+        """Test existing files are only replaced if asked to"""
+        data_dir = os.path.join(self.tmp_dir.name, 'data')
+        os.makedirs(data_dir)
+        path = os.path.join(data_dir, 'Current_2020_11_09.csv')
+        with open(path, 'w') as file:
+            file.write('Date/Time,Temp\n2020-11-08,1\n')
+        with self.assertRaises(FileExistsError):
+            reprocess([self.create_job(data_dir)], processes=1)
+        with open(path, 'r') as file:
+            self.assertIn('2020-11-08', file.read())
+
+        reprocess([self.create_job(data_dir)], processes=1, overwrite=True)
+        with open(path, 'r') as file:
+            self.assertNotIn('2020-11-08', file.read())
+        self.assertFalse([name for name in os.listdir(data_dir)
+                          if name.startswith('.')])
+
+    def test_locations(self):
+        """Test reprocessing templates with nested objects at locations"""
+        config = os.path.join(self.tmp_dir.name, 'config.json')
+        data_dir = os.path.join(self.tmp_dir.name, 'located')
+        with open(config, 'w') as file:
+            json.dump({'Name': 'OpenWeather',
+                       'URL': 'https://example.com/?lat={lat}&lon={lon}',
+                       'Rate Limit': {'Calls': 60, 'Period': 60},
+                       'Archive Directory': self.archive_dir,
+                       'Data Directory': data_dir}, file)
+        locations = os.path.join(self.tmp_dir.name, 'locations.json')
+        with open(locations, 'w') as file:
+            json.dump([{'Name': '', 'Latitude': 1, 'Longitude': 2}], file)
+        jobs = create_jobs([config], load_locations(locations))
+        jobs = [Job(job.collector, self.config_dir) for job in jobs]
+        report = reprocess(jobs, processes=1)
+        self.assertEqual(report.files, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
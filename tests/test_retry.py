@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Tests retries and circuit breakers
+"""
+import unittest
+from unittest import mock
+
+from weather_collector.caller import Caller
+from weather_collector.retry import (
+    CircuitBreaker,
+    RetryPolicy,
+    parse_retry_after,
+)
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test retry policy"""
+
+    def test_parse_retry_after(self):
+        """Test parsing Retry-After headers"""
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(
+            parse_retry_after('Mon, 09 Nov 2020 21:00:00 GMT', 1604955590),
+            10)
+        self.assertIsNone(parse_retry_after('blah'))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_from_config(self):
+        """Test the retry policy of a configuration"""
+        self.assertEqual(RetryPolicy.from_config({}), RetryPolicy(0, 1, 60))
+        self.assertEqual(
+            RetryPolicy.from_config({'Number of Retries': 3}).retries, 3)
+
+    def test_delay(self):
+        """Test exponential backoff with jitter"""
+        policy = RetryPolicy(3, 1, 3)
+        for attempt, limit in enumerate([1, 2, 3]):
+            self.assertTrue(0 <= policy.delay(attempt) <= limit)
+        self.assertIsNone(policy.delay(3))
+        self.assertEqual(policy.delay(0, retry_after=2), 2)
+        self.assertIsNone(policy.delay(0, retry_after=10))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test circuit breaker"""
+
+    def test_open_and_close(self):
+        """Test opening the circuit and closing it after a probe"""
+        breaker = CircuitBreaker(threshold=2, timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        # Single probe once the timeout passed
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+    def test_open_blocks_calls(self):
+        """Test calls are not allowed while the circuit is open"""
+        breaker = CircuitBreaker(threshold=1, timeout=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+
+class TestRetryCaller(unittest.TestCase):
+    """Test retrying API calls"""
+
+    def call(self, url, outputs, **config):
+        """Call the API with fake responses
+
+        Args:
+            url (str): URL
+            outputs (list): Status codes and headers of the responses
+            **config: API configuration
+
+        Returns:
+            tuple: Output of the caller, session mock and sleep mock
+        """
+        responses = []
+        for status_code, headers in outputs:
+            output = mock.Mock(status_code=status_code, headers=headers)
+            output.json.return_value = {'a': 1}
+            responses.append(output)
+        config.update({'URL': url, 'Name': 'Test'})
+        with mock.patch('weather_collector.caller.get_session') as session, \
+                mock.patch('weather_collector.caller.time.sleep') as sleep:
+            session.return_value.get.side_effect = responses
+            data = Caller(config=config).call_api()
+        return data, session.return_value.get, sleep
+
+    def test_retry(self):
+        """Test retrying failed calls"""
+        data, get, sleep = self.call(
+            'https://retry.example.com/a',
+            [(503, {}), (429, {'Retry-After': '2'}), (200, {})],
+            **{'Number of Retries': 2})
+        self.assertEqual(data['Response'], {'a': 1})
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(sleep.call_args_list[-1], mock.call(2.0))
+
+    def test_no_retry(self):
+        """Test calls are not retried for client errors or if disabled"""
+        data, get, _ = self.call('https://retry.example.com/b',
+                                 [(404, {})], **{'Number of Retries': 2})
+        self.assertIsNone(data)
+        self.assertEqual(get.call_count, 1)
+
+        data, get, _ = self.call('https://retry.example.com/c',
+                                 [(503, {})])
+        self.assertIsNone(data)
+        self.assertEqual(get.call_count, 1)
+
+    def test_circuit_open(self):
+        """Test the API is not called while the circuit is open"""
+        config = {'Circuit Breaker Threshold': 1,
+                  'Circuit Breaker Timeout': 60}
+        self.call('https://open.example.com/a', [(500, {})], **config)
+        data, get, _ = self.call('https://open.example.com/b', [], **config)
+        self.assertIsNone(data)
+        get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
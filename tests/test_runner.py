@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests runners
+"""
+import threading
+import time
+import unittest
+from weather_collector.runner import ScheduledJob, Scheduler
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestScheduledJob(unittest.TestCase):
+    """Test scheduled job"""
+
+    def test_aligned_schedule(self):
+        """Test the job fires at wall-clock aligned times"""
+        job = ScheduledJob(60, print)
+        self.assertEqual(job.schedule(1000.5), 1020)
+        self.assertEqual(job.schedule(1020), 1080)
+        # Missed runs are skipped
+        self.assertEqual(job.schedule(1201), 1260)
+
+    def test_jitter(self):
+        """Test the jitter offsets the aligned times"""
+        job = ScheduledJob(60, print, jitter=10)
+        self.assertTrue(0 <= job.offset <= 10)
+        self.assertAlmostEqual(job.schedule(1000), 1020 + job.offset)
+        self.assertAlmostEqual(job.schedule(1020 + job.offset),
+                               1080 + job.offset)
+
+
+class TestScheduler(unittest.TestCase):
+    """Test scheduler"""
+
+    def test_bad_overrun_policy(self):
+        """Test unknown overrun policy"""
+        with self.assertRaises(ValueError):
+            Scheduler(overrun='blah')
+
+    def test_run_jobs(self):
+        """Test running many jobs from a single scheduler"""
+        counts = [0, 0, 0]
+        lock = threading.Lock()
+
+        def count(index):
+            with lock:
+                counts[index] += 1
+
+        scheduler = Scheduler(workers=2)
+        for index in range(3):
+            scheduler.add_job(0.05, count, index)
+        scheduler.start()
+        time.sleep(0.3)
+        scheduler.stop()
+        for cnt in counts:
+            self.assertGreaterEqual(cnt, 3)
+
+    def test_overrun_skip(self):
+        """Test skipping runs while the job is running"""
+        scheduler = Scheduler()
+        job = scheduler.add_job(0.05, time.sleep, 0.22)
+        with self.assertLogs('weather_collector.runner', 'WARNING') as logs:
+            scheduler.start()
+            time.sleep(0.4)
+            scheduler.stop()
+        self.assertIn(f'Job {job.name} is still running', logs.output[0])
+        self.assertGreater(job.overruns, 0)
+        self.assertLessEqual(job.runs, 2)
+
+    def test_overrun_coalesce(self):
+        """Test coalescing runs while the job is running"""
+        scheduler = Scheduler(overrun='coalesce')
+        job = scheduler.add_job(0.05, time.sleep, 0.15)
+        scheduler.start()
+        time.sleep(0.45)
+        scheduler.stop()
+        self.assertGreater(job.overruns, 1)
+        self.assertGreaterEqual(job.runs, 2)
+        self.assertFalse(job.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests HTTP sessions
+"""
+import unittest
+from unittest import mock
+
+from weather_collector.sessions import (
+    close_sessions,
+    get_host,
+    get_session,
+    get_timeout,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+)
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestSessions(unittest.TestCase):
+    """Test HTTP sessions"""
+
+    def tearDown(self):
+        close_sessions()
+
+    def test_get_host(self):
+        """Test getting the host of a URL"""
+        self.assertEqual(get_host('https://api.weather.gov/points/1,2?a=1'),
+                         'https://api.weather.gov')
+
+    def test_session_per_host(self):
+        """Test sessions are shared by host"""
+        session = get_session('https://api.weather.gov/a')
+        self.assertIs(get_session('https://api.weather.gov/b'), session)
+        self.assertIsNot(get_session('https://api.openweathermap.org/a'),
+                         session)
+
+    def test_pool_size(self):
+        """Test the connection pool size only grows"""
+        url = 'https://api.weather.gov/a'
+        session = get_session(url, pool_size=4)
+        old = session.get_adapter(url)
+        with mock.patch.object(old, 'close') as close:
+            self.assertIs(get_session(url, pool_size=20), session)
+        close.assert_called_once_with()
+        # pylint: disable=protected-access
+        self.assertEqual(session.get_adapter(url)._pool_maxsize, 20)
+        get_session(url, pool_size=2)
+        self.assertEqual(session.get_adapter(url)._pool_maxsize, 20)
+
+    def test_timeout(self):
+        """Test timeouts from the configuration"""
+        self.assertEqual(get_timeout({}),
+                         (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+        self.assertEqual(
+            get_timeout({'Connect Timeout': 1, 'Read Timeout': 2}), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Tests forecast store
+"""
+import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytz
+from weather_collector.caller import Collector
+from weather_collector.store import (INDEX_FILE, ForecastStore,
+                                     StoreBackend, decode_delta,
+                                     encode_delta)
+from weather_collector.writers import Table, get_backend
+
+from tests.helpers import get_example_response, get_example_unit_config
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+def create_vintage(issued, hours=4, value=0.0):
+    """Create a vintage of an hourly forecast
+
+    Args:
+        issued (:obj:`datetime.datetime`): Issue time
+        hours (int): Number of hours
+        value (float): Offset of the values
+
+    Returns:
+        :obj:`Table`: Vintage
+    """
+    index = [issued.replace(tzinfo=None, minute=0) + dt.timedelta(hours=h)
+             for h in range(1, hours + 1)]
+    return Table(index, {'Temperature#K': [280.0 + h + value
+                                           for h in range(hours)],
+                         'Collection Time': issued})
+
+
+class TestForecastStore(unittest.TestCase):
+    """Test forecast store"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ForecastStore(self.tmp_dir.name)
+        self.issued = [dt.datetime(2020, 11, 9, hour, 4, tzinfo=pytz.utc)
+                       for hour in [22, 23]] + \
+            [dt.datetime(2020, 11, 10, 0, 4, tzinfo=pytz.utc)]
+        for i, issued in enumerate(self.issued):
+            self.store.write('hourly', issued, create_vintage(issued,
+                                                              value=i))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_layout(self):
+        """Test vintages are partitioned by issue day"""
+        self.assertEqual(self.store.sources(), ['hourly'])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tmp_dir.name, 'hourly'))),
+            ['2020-11-09.jsonl.gz', '2020-11-10.jsonl.gz', INDEX_FILE])
+
+    def test_query_valid(self):
+        """Test querying the forecasts of a valid time"""
+        valid = dt.datetime(2020, 11, 10, 1)
+        data = self.store.query('hourly', valid, valid)
+        self.assertEqual(data.index, [valid] * 3)
+        self.assertEqual(data.columns['Issued'], self.issued)
+        self.assertEqual(data.columns['Temperature#K'],
+                         [282.0, 282.0, 282.0])
+        self.assertEqual(data.columns['Collection Time'], self.issued)
+
+    def test_query_issued(self):
+        """Test querying the forecasts issued in a period"""
+        data = self.store.query(
+            'hourly', issued_between=(self.issued[1], None))
+        self.assertEqual(len(data), 8)
+        entries = self.store.select(
+            'hourly', issued_between=(None, self.issued[0]))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(len(self.store.query('missing')), 0)
+
+    def test_select_reads_index(self):
+        """Test only the vintages that match are selected"""
+        entries = self.store.select('hourly',
+                                    valid_from=dt.datetime(2020, 11, 10, 3))
+        self.assertEqual([entry.segment for entry in entries],
+                         ['2020-11-09.jsonl.gz', '2020-11-10.jsonl.gz'])
+
+    def test_incremental_index(self):
+        """Test the index is re-read when vintages are added"""
+        store = ForecastStore(self.tmp_dir.name)
+        self.assertEqual(len(store.read_index('hourly')), 3)
+        issued = dt.datetime(2020, 11, 10, 1, 4, tzinfo=pytz.utc)
+        self.store.write('hourly', issued, create_vintage(issued))
+        self.assertEqual(len(store.read_index('hourly')), 4)
+
+    def test_partial_index_line(self):
+        """Test a partially written index line is ignored"""
+        path = os.path.join(self.tmp_dir.name, 'hourly', INDEX_FILE)
+        with open(path, 'a') as index:
+            index.write('{"Segment": ')
+        store = ForecastStore(self.tmp_dir.name)
+        self.assertEqual(len(store.read_index('hourly')), 3)
+        issued = dt.datetime(2020, 11, 10, 1, 4, tzinfo=pytz.utc)
+        store.write('hourly', issued, create_vintage(issued))
+        self.assertEqual(len(ForecastStore(self.tmp_dir.name)
+                             .read_index('hourly')), 4)
+
+
+class TestDeltaEncoding(unittest.TestCase):
+    """Test delta encoding of vintages"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ForecastStore(self.tmp_dir.name)
+        self.vintages = []
+        for hour in range(6):
+            issued = dt.datetime(2020, 11, 9, 12 + hour, 4, tzinfo=pytz.utc)
+            vintage = create_vintage(issued, hours=48)
+            # Only the next hour changes
+            vintage.columns['Temperature#K'] = [
+                280.0 + valid.hour / 10 for valid in vintage.index]
+            vintage.columns['Temperature#K'][0] += hour
+            self.vintages.append(vintage)
+            self.store.write('hourly', issued, vintage, keyframe_interval=4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_encode(self):
+        """Test a delta only stores the changed cells"""
+        base = {'Index': ['a', 'b', 'c'], 'Datetimes': [],
+                'Columns': {'x': [1.0, 2.0, float('nan')],
+                            'y': [1, 1, 1]}}
+        vintage = {'Index': ['b', 'c', 'd'], 'Datetimes': [],
+                   'Columns': {'x': [2.0, float('nan'), 4.0],
+                               'z': [5, 5, 5]}}
+        delta = encode_delta(base, vintage)
+        self.assertEqual(delta['Index'], [[1, 3], 'd'])
+        self.assertEqual(delta['Changes'],
+                         {'x': {'Rows': [2], 'Values': [4.0]},
+                          'z': {'Fill': 5}})
+        decoded = decode_delta(base, delta)
+        self.assertEqual(decoded['Index'], vintage['Index'])
+        self.assertEqual(decoded['Columns']['x'][::2], [2.0, 4.0])
+        self.assertEqual(decoded['Columns']['z'], [5, 5, 5])
+        self.assertEqual(list(decoded['Columns']), ['x', 'z'])
+
+    def test_keyframes(self):
+        """Test a full vintage is stored every keyframe interval"""
+        self.assertEqual(
+            [entry.kind for entry in self.store.read_index('hourly')],
+            ['key', 'delta', 'delta', 'delta', 'key', 'delta'])
+        entries = self.store.read_index('hourly')
+        self.assertLess(entries[1].length, entries[0].length)
+
+    def test_read(self):
+        """Test every vintage is reconstructed"""
+        entries = self.store.read_index('hourly')
+        for entry, vintage in zip(entries, self.vintages):
+            data = self.store.read_vintage('hourly', entry)
+            self.assertEqual(data.index, vintage.index)
+            self.assertEqual(data.columns['Temperature#K'],
+                             vintage.columns['Temperature#K'])
+            self.assertEqual(data.columns['Collection Time'],
+                             [vintage.columns['Collection Time']] * 48)
+        data = ForecastStore(self.tmp_dir.name).query(
+            'hourly', issued_between=(
+                self.vintages[2].columns['Collection Time'], None))
+        self.assertEqual(len(data), 4 * 48)
+
+    def test_reopen(self):
+        """Test deltas continue from the vintages of another store"""
+        store = ForecastStore(self.tmp_dir.name)
+        issued = dt.datetime(2020, 11, 9, 18, 4, tzinfo=pytz.utc)
+        vintage = create_vintage(issued, hours=48)
+        store.write('hourly', issued, vintage, keyframe_interval=4)
+        entries = store.read_index('hourly')
+        self.assertEqual(entries[-1].kind, 'delta')
+        self.assertEqual(
+            self.store.read_vintage('hourly', entries[-1]).columns[
+                'Temperature#K'], vintage.columns['Temperature#K'])
+
+    def test_segment_keyframe(self):
+        """Test every segment starts with a full vintage"""
+        issued = dt.datetime(2020, 11, 10, 0, 4, tzinfo=pytz.utc)
+        self.store.write('hourly', issued, create_vintage(issued, hours=48),
+                         keyframe_interval=4)
+        self.assertEqual(self.store.read_index('hourly')[-1].kind, 'key')
+
+
+class TestStoreBackend(unittest.TestCase):
+    """Test saving collections to the forecast store"""
+
+    def test_collect(self):
+        """Test data files with the store format"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_dir = os.path.join(tmp_dir, 'config')
+            os.makedirs(config_dir)
+            shutil.copy(get_example_unit_config(), config_dir)
+            with open(os.path.join(config_dir, 'hourly.json'), 'w') as file:
+                json.dump({'Filename': 'hourly', 'Format': 'store',
+                           'Data': {'hourly': 'OpenWeather Weather Object'}},
+                          file)
+            call_time = dt.datetime(2020, 11, 9, 21, 4, tzinfo=pytz.utc)
+            data_dir = os.path.join(tmp_dir, 'data')
+            Collector(config={'Name': 'OW', 'URL': 'https://a/'}).process(
+                {'CallTime': call_time, 'Response': get_example_response()},
+                config_dir, data_dir)
+
+            data = ForecastStore.get_store(data_dir).query('hourly')
+            self.assertEqual(len(data), 48)
+            self.assertEqual(data.columns['Issued'][0], call_time)
+            self.assertIn('OpenWeather Weather Object.Temperature#K',
+                          data.columns)
+
+    def test_date_codes(self):
+        """Test a Filename with date codes is rejected"""
+        with self.assertRaises(ValueError):
+            get_backend({'Filename': 'Hourly_#<date>%Y_%m_%d#',
+                         'Format': 'store'})
+        self.assertIsInstance(
+            get_backend({'Filename': 'hourly', 'Format': 'store-delta'}),
+            StoreBackend)
+
+
+if __name__ == '__main__':
+    unittest.main()
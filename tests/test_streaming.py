@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests streaming JSON decoding
+"""
+import io
+import os
+import unittest
+from unittest import mock
+
+from weather_collector.caller import Caller
+from weather_collector.streaming import decode_paths, get_paths
+from tests.helpers import MY_DIR, get_example_response
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+def get_example_stream():
+    """Get the example response as a stream
+
+    Returns:
+        :obj:`io.BytesIO`: Example weather response
+    """
+    path = os.path.join(MY_DIR, 'data/example_weather.json')
+    with open(path, 'rb') as json_file:
+        return io.BytesIO(json_file.read())
+
+
+class TestStreaming(unittest.TestCase):
+    """Test streaming JSON decoding"""
+
+    def test_get_paths(self):
+        """Test getting the paths used by data files"""
+        specs = {'a.json': {'Data': {'!now': 'Time', 'hourly': 'Weather'}},
+                 'b.json': {'Data': {'current.weather': 'Weather'}}}
+        self.assertEqual(get_paths(specs),
+                         frozenset(['hourly', 'current.weather']))
+
+    def test_decode_paths(self):
+        """Test only the paths are decoded"""
+        expected = get_example_response()
+        data = decode_paths(get_example_stream(),
+                            ['hourly', 'current', 'daily'])
+        self.assertEqual(data, {key: expected[key]
+                                for key in ['hourly', 'current', 'daily']})
+
+        data = decode_paths(get_example_stream(),
+                            ['current.weather', 'lat', 'missing'])
+        self.assertEqual(data, {
+            'current': {'weather': expected['current']['weather']},
+            'lat': expected['lat'],
+        })
+
+    def test_decode_nested_paths(self):
+        """Test decoding a path inside another decoded path"""
+        data = decode_paths(io.BytesIO(b'{"a": {"b": [1, 2.5]}}'),
+                            ['a', 'a.b'])
+        self.assertEqual(data, {'a': {'b': [1, 2.5]}})
+
+    def test_stops_reading(self):
+        """Test the rest of the document is not read"""
+        stream = io.BytesIO(b'{"a": 1, "b": [' + b'1, ' * 100000 + b'1]}')
+        self.assertEqual(decode_paths(stream, ['a']), {'a': 1})
+        self.assertLess(stream.tell(), len(stream.getvalue()))
+
+    def test_call_api_stream(self):
+        """Test streaming the response of an API"""
+        config = {'URL': 'https://stream.example.com/a', 'Name': 'Test',
+                  'Stream': True}
+        with mock.patch('weather_collector.caller.get_session') as session:
+            output = session.return_value.get.return_value
+            output.status_code = 200
+            output.raw = get_example_stream()
+            data = Caller(config=config,
+                          paths=frozenset(['current'])).call_api()
+            self.assertTrue(session.return_value.get.call_args[1]['stream'])
+        output.json.assert_not_called()
+        output.close.assert_called()
+        self.assertEqual(data['Response'],
+                         {'current': get_example_response()['current']})
+
+
+if __name__ == '__main__':
+    unittest.main()
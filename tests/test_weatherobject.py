@@ -2,8 +2,13 @@
 """
 Tests weather key object
 """
+import math
+import os
+import shutil
+import tempfile
 import unittest
-from weather_collector.caller import WeatherObjects
+from weather_collector.caller import (PointExtractor, WeatherObjects,
+                                      compile_types, extract_column)
 
 from tests.helpers import (
     get_path_to_types,
@@ -120,6 +125,86 @@ class TestWeatherObject(unittest.TestCase):
         data = obj.parse_object_type(self.response[forecast_type], typ, key='')
         self.standard_verify(data, forecast_type, expected_fields)
 
+    def test_compiled_plans(self):
+        """Test compiling the weather types into parse plans"""
+        obj = WeatherObjects(self.key_file)
+        self.assertEqual(set(obj.plans.keys()), set(obj.types.keys()))
+        plan = obj.plans['OpenWeather Weather Object']
+        names = [pnt.name for pnt in plan.points]
+        self.assertEqual(
+            names, list(obj.types['OpenWeather Weather Object']['Points']))
+        temp = names.index('Temperature')
+        self.assertIs(plan.points[temp].sub_plan,
+                      obj.plans['OpenWeather Temperature Object'])
+        self.assertIsNone(obj.plans['Pressure'].points)
+
+    def test_undefined_point_type(self):
+        """Test parsing a point whose type is not defined"""
+        plans = compile_types({
+            'Group': {'Points': {'Missing': 'a'}},
+        })
+        self.assertIsNone(plans['Group'].points[0].leaf_plan)
+        obj = WeatherObjects(self.key_file)
+        obj.plans = plans
+        with self.assertRaises(KeyError):
+            obj.parse_object_type([{'a': 1}], 'Group')
+
+    def test_missing_points(self):
+        """Test required and optional points missing from the data"""
+        obj = WeatherObjects(self.key_file)
+        obj.plans = compile_types({
+            'Group': {'Points': {
+                'A': 'a',
+                'B': {'Key': 'b', 'Optional': True},
+                'C': {'Key': 'c', 'Optional': True},
+                'D': {'Key': 'd', 'Optional': True, 'Type': 'Sub'},
+            }},
+            'Sub': {'Points': {'E': {'Key': 'e', 'Optional': True}}},
+            'A': {}, 'B': {}, 'C': {}, 'D': {}, 'E': {},
+        })
+        data = obj.parse_object_type(
+            [{'a': 1, 'b': 2, 'd': {'e': 3}}, {'a': 4}], 'Group', key='')
+        self.assertEqual(data['A'], [1, 4])
+        self.assertEqual(data['B'][0], 2)
+        self.assertTrue(math.isnan(data['B'][1]))
+        self.assertNotIn('C', data)
+        self.assertEqual(data['D.E'][0], 3)
+        self.assertTrue(math.isnan(data['D.E'][1]))
+
+        with self.assertRaises(ValueError):
+            obj.parse_object_type([{'a': 1}, {'b': 2}], 'Group')
+
+    def test_missing_groups(self):
+        """Test missing groups are new empty groups"""
+        pnt = PointExtractor('D', 'd', optional=True)
+        data = [{'d': {'e': 3}}, {}, {}]
+        column = extract_column(pnt, data)
+        self.assertEqual(column, [{'e': 3}, {}, {}])
+        column[1]['e'] = 4
+        self.assertEqual(column[2], {})
+        self.assertEqual(extract_column(pnt, data)[1], {})
+
+    def test_parse_does_not_modify(self):
+        """Test parsing does not modify the response"""
+        obj = WeatherObjects(self.key_file)
+        response = get_example_response()
+        obj.parse_object_type(response['daily'], 'OpenWeather Weather Object')
+        self.assertEqual(response, self.response)
+
+    def test_get_obj_cached(self):
+        """Test the weather objects are shared until the file changes"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'WeatherTypes.json')
+            shutil.copy(self.key_file, path)
+            obj = WeatherObjects.get_obj(path)
+            self.assertIs(WeatherObjects.get_obj(path), obj)
+
+            with open(path, 'w') as file:
+                file.write('{"Pressure": {"Type": "Pressure"}}')
+            new_obj = WeatherObjects.get_obj(path)
+            self.assertIsNot(new_obj, obj)
+            self.assertEqual(list(new_obj.types.keys()), ['Pressure'])
+
     def standard_verify(self, data, forecast_type, expected_fields):
         """Standard verification function
 
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+Tests writers
+"""
+import datetime as dt
+import importlib.util
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import pandas as pd
+import pytz
+from weather_collector.writers import (
+    AppendWriter,
+    BufferPolicy,
+    CSVBackend,
+    ParquetBackend,
+    RecentRows,
+    Table,
+    close_all,
+    get_backend,
+    read_units,
+    to_csv_text,
+)
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+__author__ = "Matt Ellis"
+__copyright__ = "Matt Ellis"
+__license__ = "mit"
+
+
+class TestAppendWriter(unittest.TestCase):
+    """Test append writer"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'out.csv')
+        self.writer = AppendWriter(max_open=2)
+
+    def tearDown(self):
+        self.writer.close()
+        self.tmp_dir.cleanup()
+
+    def read(self, path=None):
+        """Read the output file
+
+        Args:
+            path (str): Path of file (defaults to the test file)
+
+        Returns:
+            str: Content of the file
+        """
+        with open(path or self.path, 'r') as file:
+            return file.read()
+
+    def test_policy_from_spec(self):
+        """Test the buffering policy of a data file specification"""
+        self.assertEqual(BufferPolicy.from_spec({}),
+                         BufferPolicy(1, 0, 0, 'never'))
+        policy = BufferPolicy.from_spec(
+            {'Buffer': {'Rows': 10, 'Latency': 60, 'Fsync': 'flush'}})
+        self.assertEqual(policy, BufferPolicy(10, 0, 60, 'flush'))
+        with self.assertRaises(ValueError):
+            BufferPolicy.from_spec({'Buffer': {'Fsync': 'blah'}})
+        self.assertTrue(BufferPolicy.from_spec({'Dedup': True}).dedup)
+
+    def test_header(self):
+        """Test the header is only written to new files"""
+        self.writer.append(self.path, '1,a\n', header='i,v\n')
+        self.writer.append(self.path, '2,b\n', header='i,v\n')
+        self.assertEqual(self.read(), 'i,v\n1,a\n2,b\n')
+
+        self.writer.close()
+        self.writer.append(self.path, '3,c\n', header='i,v\n')
+        self.assertEqual(self.read(), 'i,v\n1,a\n2,b\n3,c\n')
+
+    def test_buffer_rows(self):
+        """Test rows are written in batches"""
+        policy = BufferPolicy(3, 0, 0, 'flush')
+        for i in range(2):
+            self.writer.append(self.path, f'{i}\n', policy=policy)
+        self.assertEqual(self.read(), '')
+        self.writer.append(self.path, '2\n', policy=policy)
+        self.assertEqual(self.read(), '0\n1\n2\n')
+
+    def test_buffer_bytes(self):
+        """Test rows are written once the buffer is large enough"""
+        policy = BufferPolicy(100, 6, 0, 'never')
+        self.writer.append(self.path, 'abc\n', policy=policy)
+        self.assertEqual(self.read(), '')
+        self.writer.append(self.path, 'def\n', policy=policy)
+        self.assertEqual(self.read(), 'abc\ndef\n')
+
+    def test_buffer_latency(self):
+        """Test rows are written after the maximum latency"""
+        policy = BufferPolicy(100, 0, 0.05, 'never')
+        self.writer.append(self.path, 'abc\n', policy=policy)
+        self.writer.flush_expired()
+        self.assertEqual(self.read(), '')
+        time.sleep(0.06)
+        self.writer.flush_expired()
+        self.assertEqual(self.read(), 'abc\n')
+
+    def test_max_open(self):
+        """Test the least recently used file is closed"""
+        policy = BufferPolicy(100, 0, 0, 'close')
+        paths = [os.path.join(self.tmp_dir.name, f'{i}.csv')
+                 for i in range(3)]
+        for path in paths:
+            self.writer.append(path, 'a\n', policy=policy)
+        self.assertEqual(self.read(paths[0]), 'a\n')
+        self.assertEqual(self.read(paths[2]), '')
+        self.writer.flush()
+        self.assertEqual(self.read(paths[2]), 'a\n')
+
+    def test_partial_row(self):
+        """Test a partial row left by a crash is removed"""
+        with open(self.path, 'w') as file:
+            file.write('h\na\nb')
+        self.writer.append(self.path, 'c\n', header='h\n')
+        self.assertEqual(self.read(), 'h\na\nc\n')
+
+    def test_replaced(self):
+        """Test a rotated, replaced or removed file is reopened"""
+        self.writer.append(self.path, 'a\n', header='h\n')
+        os.rename(self.path, self.path + '.1')
+        self.writer.append(self.path, 'b\n', header='h\n')
+        self.assertEqual(self.read(self.path + '.1'), 'h\na\n')
+        self.assertEqual(self.read(), 'h\nb\n')
+
+        with open(self.path + '.new', 'w') as file:
+            file.write('h\nx\n')
+        os.replace(self.path + '.new', self.path)
+        self.writer.append(self.path, 'c\n', header='h\n')
+        self.assertEqual(self.read(), 'h\nx\nc\n')
+
+        os.remove(self.path)
+        self.writer.append(self.path, 'd\n', header='h\n')
+        self.assertEqual(self.read(), 'h\nd\n')
+
+    def test_no_newline(self):
+        """Test a file without a complete row is not truncated"""
+        with open(self.path, 'w') as file:
+            file.write('h')
+        with self.assertLogs('weather_collector.writers', 'WARNING'):
+            self.writer.append(self.path, 'a\n', header='h\n')
+        self.writer.flush()
+        self.assertTrue(self.read().startswith('h'))
+
+    def test_failed_append(self):
+        """Test a failed append leaves the file as it was"""
+        self.writer.append(self.path, 'a\n', header='h\n')
+
+        real_write = os.write
+
+        def write(fileno, data):
+            real_write(fileno, bytes(data[:1]))
+            raise OSError(28, 'No space left on device')
+
+        with mock.patch('weather_collector.writers.os.write', write):
+            with self.assertRaises(OSError):
+                self.writer.append(self.path, 'bc\n')
+        self.assertEqual(self.read(), 'h\na\n')
+        self.writer.flush()
+        self.assertEqual(self.read(), 'h\na\nbc\n')
+
+
+class TestRecentRows(unittest.TestCase):
+    """Test skipping appended rows that did not change"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'current.csv')
+        self.header = ',Temperature#K,Collection Time'
+
+    def tearDown(self):
+        close_all()
+        self.tmp_dir.cleanup()
+
+    def test_filter(self):
+        """Test only the rows that changed are kept"""
+        recent = RecentRows(rows=2)
+        rows = ['1,280.0,00:00\n', '2,281.0,00:00\n']
+        self.assertEqual(recent.filter(self.path, self.header, rows), rows)
+        self.assertEqual(
+            recent.filter(self.path, self.header,
+                          ['2,281.0,00:10\n', '2,281.5,00:20\n']),
+            ['2,281.5,00:20\n'])
+        # Only the 2 most recent keys are kept
+        recent.filter(self.path, self.header, ['3,282.0,00:30\n'])
+        self.assertEqual(
+            recent.filter(self.path, self.header, ['1,280.0,00:40\n']),
+            ['1,280.0,00:40\n'])
+
+    def test_tail(self):
+        """Test the index is rebuilt from the tail of the file"""
+        with open(self.path, 'w') as file:
+            file.write(self.header + '\n')
+            for i in range(1000):
+                file.write(f'{i},280.0,00:00\n')
+        recent = RecentRows(tail_bytes=100)
+        self.assertEqual(
+            recent.filter(self.path, self.header,
+                          ['999,280.0,00:10\n', '0,280.0,00:10\n']),
+            ['0,280.0,00:10\n'])
+
+    def test_tail_boundary(self):
+        """Test a tail starting exactly at a row keeps that row"""
+        with open(self.path, 'w') as file:
+            file.write(self.header + '\n')
+            for i in range(1000):
+                file.write(f'{i:03d},280.0,00:00\n')
+        recent = RecentRows(tail_bytes=2 * len('000,280.0,00:00\n'))
+        self.assertEqual(
+            recent.filter(self.path, self.header,
+                          ['998,280.0,00:10\n', '999,280.0,00:10\n']),
+            [])
+
+    def test_backend(self):
+        """Test appending unchanged rows with dedup"""
+        policy = BufferPolicy(1, 0, 0, 'never', True)
+        index = [dt.datetime(2020, 11, 9, 21, 4)]
+        for minute in range(3):
+            data = Table(index, {
+                'Temperature#K': [280.0],
+                'Collection Time': dt.datetime(2020, 11, 9, 21, minute)})
+            self.assertEqual(CSVBackend.save(data, self.path, True, policy),
+                             int(minute == 0))
+        close_all()
+        data.columns['Temperature#K'] = [281.0]
+        self.assertEqual(CSVBackend.save(data, self.path, True, policy), 1)
+        self.assertEqual(CSVBackend.save(data, self.path, True, policy), 0)
+        close_all()
+        with open(self.path, 'r') as file:
+            self.assertEqual(len(file.readlines()), 3)
+
+
+class TestBackends(unittest.TestCase):
+    """Test storage backends"""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        index = [dt.datetime(2020, 11, 9, i) for i in range(3)]
+        self.data = Table(index, {
+            'Weather.Temperature#K': [286.22, 285.1, 284.0],
+            'Weather.Pressure#hPa': [1022, 1021, 1020],
+            'Weather.UV Index': [2.5, 1.0, 0.0],
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_overwrite(self):
+        """Test overwriting a file replaces it atomically"""
+        path = os.path.join(self.tmp_dir.name, 'out.csv')
+        CSVBackend.save(self.data, path, False)
+        with open(path, 'r') as file:
+            text = file.read()
+        with mock.patch('weather_collector.writers.to_csv_text',
+                        return_value='new\n'):
+            with mock.patch('builtins.open', side_effect=OSError(28, '')):
+                with self.assertRaises(OSError):
+                    CSVBackend.save(self.data, path, False)
+            with open(path, 'r') as file:
+                self.assertEqual(file.read(), text)
+            CSVBackend.save(self.data, path, False)
+        with open(path, 'r') as file:
+            self.assertEqual(file.read(), 'new\n')
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['out.csv'])
+
+    def test_overwrite_synced(self):
+        """Test an overwritten file and its directory are synced"""
+        path = os.path.join(self.tmp_dir.name, 'out.csv')
+        with mock.patch('weather_collector.writers.os.fsync') as fsync:
+            CSVBackend.save(self.data, path, False)
+        self.assertEqual(fsync.call_count, 2)
+
+    def test_stale_tmp(self):
+        """Test temporary files left by crashed writers are removed"""
+        path = os.path.join(self.tmp_dir.name, 'out.csv')
+        live = f'out.csv.{os.getppid()}.1.tmp'
+        for name in ['out.csv.999999999.1.tmp', live]:
+            with open(os.path.join(self.tmp_dir.name, name), 'w') as file:
+                file.write('partial')
+        CSVBackend.save(self.data, path, False)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                         ['out.csv', live])
+
+    def test_get_backend(self):
+        """Test the backend of a data file specification"""
+        self.assertIsInstance(get_backend({}), CSVBackend)
+        self.assertIsInstance(get_backend({'Format': 'Parquet'}),
+                              ParquetBackend)
+        with self.assertRaises(KeyError):
+            get_backend({'Format': 'blah'})
+
+    @unittest.skipUnless(HAS_PYARROW, 'requires pyarrow')
+    def test_parquet_types(self):
+        """Test Parquet files have typed columns and units"""
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        table = ParquetBackend().to_table(self.data)
+        self.assertEqual(table.column_names, ['Date/Time',
+                                              'Weather.Temperature',
+                                              'Weather.Pressure',
+                                              'Weather.UV Index'])
+        self.assertTrue(
+            pyarrow.types.is_timestamp(table.schema.field(0).type))
+        self.assertEqual(table.schema.field(1).type, pyarrow.float64())
+        self.assertEqual(table.schema.field(2).type, pyarrow.int64())
+        table = get_backend({'Format': 'parquet-float32'}).to_table(
+            self.data)
+        self.assertEqual(table.schema.field(1).type, pyarrow.float32())
+
+        path = os.path.join(self.tmp_dir.name, 'out.parquet')
+        ParquetBackend().save(self.data, path, False)
+        self.assertEqual(read_units(path), {'Weather.Temperature': 'K',
+                                            'Weather.Pressure': 'hPa'})
+
+    @unittest.skipUnless(HAS_PYARROW, 'requires pyarrow')
+    def test_parquet_append(self):
+        """Test appending to a Parquet file"""
+        path = os.path.join(self.tmp_dir.name, 'out.parquet')
+        backend = ParquetBackend()
+        backend.save(self.data, path, True)
+        backend.save(self.data, path, True)
+        self.assertEqual(len(pd.read_parquet(path)), 6)
+        backend.save(self.data, path, False)
+        self.assertEqual(len(pd.read_parquet(path)), 3)
+
+
+class TestCSVText(unittest.TestCase):
+    """Test serializing tables to CSV text"""
+
+    def assert_same_as_pandas(self, table):
+        """Assert the CSV text is identical to pandas
+
+        Args:
+            table (:obj:`Table`): Table
+        """
+        self.assertEqual(to_csv_text(table), table.to_frame().to_csv())
+
+    def test_numbers(self):
+        """Test formatting numbers"""
+        self.assert_same_as_pandas(Table([1, 2, 3], {
+            'int': [1, 2, 3],
+            'float': [0.1 + 0.2, 1e16, -1.5],
+            'mixed': [1, 2.5, 3],
+            'missing': [1, None, float('nan')],
+            'all missing': [None, None, None],
+        }))
+
+    def test_datetimes(self):
+        """Test formatting date/times"""
+        utc = pytz.utc
+        self.assert_same_as_pandas(Table(
+            [dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 2)], {
+                'seconds': [dt.datetime(2020, 1, 1, 3, 4, 5),
+                            dt.datetime(2020, 1, 2)],
+                'micro': [dt.datetime(2020, 1, 1),
+                          dt.datetime(2020, 1, 2, 0, 0, 0, 5)],
+                'missing': [dt.datetime(2020, 1, 1, 3), None],
+                'aware': [dt.datetime(2020, 1, 1, tzinfo=utc),
+                          dt.datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=utc)],
+                'scalar': dt.datetime(2020, 1, 1, 1, 2, 3, 4, tzinfo=utc),
+            }))
+
+    def test_strings(self):
+        """Test formatting strings and other objects"""
+        self.assert_same_as_pandas(Table([1, 2], {
+            'str': ['a,b', 'c"d'],
+            'str missing': ['x', None],
+            'bool': [True, False],
+            'mixed': ['x', 1],
+        }))
+
+    def test_bad_length(self):
+        """Test a column with the wrong number of values"""
+        with self.assertRaises(ValueError):
+            to_csv_text(Table([1, 2], {'a': [1]}))
+
+    def test_from_frame(self):
+        """Test creating a table from a data frame"""
+        table = Table([1, 2], {'a': [1.5, 2.5], 'b': ['x', 'y']})
+        self.assertEqual(Table.from_frame(table.to_frame()), table)
+
+
+if __name__ == '__main__':
+    unittest.main()